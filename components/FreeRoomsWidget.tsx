@@ -214,15 +214,17 @@ export default function FreeRoomsWidget() {
     // FIX: Added schema option to prevent HTTP 300 errors from Supabase/PostgREST ambiguity
     const rpcOptions = { head: false, schema: 'public' }
 
+    // The *_daily RPCs read the precomputed Free_Intervals table and fall
+    // back to free_rooms_per_building / free_rooms_list when it can't answer
     const { data: perBuildingData, error: perBuildingErr } =
-      await supabase.rpc("free_rooms_per_building", {
+      await supabase.rpc("free_rooms_per_building_daily", {
         p_start: startTs,
         p_end: endTs,
       }, rpcOptions) 
 
     // FIX: Added schema option to prevent HTTP 300 errors from Supabase/PostgREST ambiguity
     const { data: freeRoomsData, error: freeRoomsErr } =
-      await supabase.rpc("free_rooms_list", {
+      await supabase.rpc("free_rooms_list_daily", {
         p_start: startTs,
         p_end: endTs,
       }, rpcOptions) 
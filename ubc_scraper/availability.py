@@ -0,0 +1,226 @@
+# ==========================================
+# Room availability bitmaps
+# Turns bookings into a rooms x days occupancy bitmap over the
+# timetable's 30 half-hour slots (07:00-22:00), queried with NumPy
+# ==========================================
+#
+# occupancy[room, day] is a uint32 whose bit s is set when the room is
+# booked during slot s (07:00 + 30 min * s). free_run[room, day, s] is the
+# number of free slots starting at s, so "free for the whole window" for
+# every room and every window of the term is a single comparison.
+#
+# Usage:
+#   python availability.py --output-dir output --out output/availability.npz
+#   python availability.py --output-dir output --free "2025-12-02 10:00" "2025-12-02 11:30"
+#   python availability.py --output-dir output --check   # compare with room_index
+
+import csv
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from parse_common import MINUTES_PER_DAY, SLOT_MINUTES, to_minutes
+from room_index import RoomIndex, _minutes
+from snapshot_diff import latest_snapshots
+
+DAY_START = 7 * 60       # 07:00, the first slot of dlPeriod "0-30"
+SLOTS_PER_DAY = 30       # up to 22:00
+DAY_END = DAY_START + SLOTS_PER_DAY * SLOT_MINUTES
+
+
+class Availability:
+    """Occupancy bitmap for a set of rooms over consecutive days."""
+
+    def __init__(self, rooms, first_day, occupancy):
+        self.rooms = rooms            # (room_number, building) per bitmap row
+        self.first_day = first_day    # parse_common.EPOCH day of column 0
+        self.occupancy = occupancy    # uint32 [rooms, days]
+        self._free_run = None
+
+    @classmethod
+    def build(cls, rooms, bookings):
+        """
+        rooms: (room_number, building, ...) tuples; bookings: (room_number,
+        building, start, end) with start/end in minutes since EPOCH.
+
+        Slots partly covered by a booking count as occupied, and bookings
+        for rooms not in rooms are ignored.
+        """
+        rooms = sorted((room[0], room[1]) for room in rooms)
+        row_of = {room: i for i, room in enumerate(rooms)}
+        bookings = [b for b in bookings if (b[0], b[1]) in row_of]
+
+        if bookings:
+            first_day = min(b[2] for b in bookings) // MINUTES_PER_DAY
+            last_day = max(b[3] - 1 for b in bookings) // MINUTES_PER_DAY
+        else:
+            first_day = last_day = 0
+        occupancy = np.zeros((len(rooms), last_day - first_day + 1), dtype=np.uint32)
+
+        room_rows, day_cols, masks = [], [], []
+        for room_number, building, start, end in bookings:
+            for day in range(start // MINUTES_PER_DAY, (end - 1) // MINUTES_PER_DAY + 1):
+                midnight = day * MINUTES_PER_DAY
+                first = max(start - midnight - DAY_START, 0) // SLOT_MINUTES
+                stop = -(-(min(end - midnight, DAY_END) - DAY_START) // SLOT_MINUTES)
+                if stop <= first:
+                    continue
+                room_rows.append(row_of[(room_number, building)])
+                day_cols.append(day - first_day)
+                masks.append(((1 << (stop - first)) - 1) << first)
+
+        np.bitwise_or.at(occupancy, (np.array(room_rows, dtype=np.intp), np.array(day_cols, dtype=np.intp)),
+                         np.array(masks, dtype=np.uint32))
+        return cls(rooms, first_day, occupancy)
+
+    @classmethod
+    def from_csv(cls, rooms_csv, bookings_csv):
+        with open(rooms_csv, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # header
+            rooms = [tuple(r[:2]) for r in reader]
+        with open(bookings_csv, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # header
+            bookings = [(r[0], r[1], _minutes(r[2]), _minutes(r[3])) for r in reader if r[2] and r[3]]
+        return cls.build(rooms, bookings)
+
+    @property
+    def free_run(self):
+        """uint8 [rooms, days, SLOTS_PER_DAY]: free slots in a row starting at each slot."""
+        if self._free_run is None:
+            run = np.zeros(self.occupancy.shape + (SLOTS_PER_DAY + 1,), dtype=np.uint8)
+            for slot in range(SLOTS_PER_DAY - 1, -1, -1):
+                booked = (self.occupancy >> np.uint32(slot)) & np.uint32(1)
+                run[:, :, slot] = np.where(booked, 0, run[:, :, slot + 1] + 1)
+            self._free_run = run[:, :, :SLOTS_PER_DAY]
+        return self._free_run
+
+    def _day_column(self, moment_minutes):
+        day = moment_minutes // MINUTES_PER_DAY - self.first_day
+        return day if 0 <= day < self.occupancy.shape[1] else None
+
+    def free_mask(self, p_start, p_end):
+        """
+        Boolean array over self.rooms: True where the room has no booking
+        overlapping [p_start, p_end). Windows may span several days.
+        """
+        start, end = to_minutes(p_start), to_minutes(p_end)
+        free = np.ones(len(self.rooms), dtype=bool)
+        for day in range(start // MINUTES_PER_DAY, (end - 1) // MINUTES_PER_DAY + 1):
+            column = self._day_column(day * MINUTES_PER_DAY)
+            if column is None:
+                continue
+            midnight = day * MINUTES_PER_DAY
+            first = max(start - midnight - DAY_START, 0) // SLOT_MINUTES
+            stop = -(-(min(end - midnight, DAY_END) - DAY_START) // SLOT_MINUTES)
+            if stop <= first:
+                continue
+            mask = np.uint32(((1 << (stop - first)) - 1) << first)
+            free &= (self.occupancy[:, column] & mask) == 0
+        return free
+
+    def free_rooms(self, p_start, p_end):
+        """(room_number, building) of every room free for the whole window."""
+        return [self.rooms[i] for i in np.flatnonzero(self.free_mask(p_start, p_end))]
+
+    def longest_free_from(self, moment):
+        """
+        Minutes each room stays free from moment (a slot boundary) until its
+        next booking or 22:00, as an int array over self.rooms.
+        """
+        minutes = to_minutes(moment)
+        column = self._day_column(minutes)
+        slot = (minutes % MINUTES_PER_DAY - DAY_START) // SLOT_MINUTES
+        if not 0 <= slot < SLOTS_PER_DAY:
+            return np.zeros(len(self.rooms), dtype=np.int32)
+        if column is None:
+            return np.full(len(self.rooms), (SLOTS_PER_DAY - slot) * SLOT_MINUTES, dtype=np.int32)
+        return self.free_run[:, column, slot].astype(np.int32) * SLOT_MINUTES
+
+    def save(self, path):
+        """Write occupancy, free_run and the room list to a compressed .npz (no pickle needed to load)."""
+        np.savez_compressed(
+            path,
+            room_number=np.array([room[0] for room in self.rooms], dtype=str),
+            building=np.array([room[1] for room in self.rooms], dtype=str),
+            first_day=np.array(self.first_day),
+            occupancy=self.occupancy,
+            free_run=self.free_run,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            availability = cls(list(zip(data['room_number'].tolist(), data['building'].tolist())),
+                               int(data['first_day']), data['occupancy'])
+            availability._free_run = data['free_run']
+        return availability
+
+
+def check_against_index(rooms_csv, bookings_csv):
+    """Compare free_mask with room_index for every slot-aligned window of every day; returns mismatches."""
+    availability = Availability.from_csv(rooms_csv, bookings_csv)
+    index = RoomIndex.from_csv(rooms_csv, bookings_csv)
+    index_rooms = [(room[0], room[1]) for room in index.rooms]
+
+    mismatches = windows = 0
+    for column in range(availability.occupancy.shape[1]):
+        midnight = (availability.first_day + column) * MINUTES_PER_DAY
+        for first in range(SLOTS_PER_DAY):
+            for stop in range(first + 1, SLOTS_PER_DAY + 1):
+                start, end = midnight + DAY_START + first * SLOT_MINUTES, midnight + DAY_START + stop * SLOT_MINUTES
+                expected = sorted(index_rooms[i] for i in index._free_rooms(start, end))
+                runs = availability.free_run[:, column, first]
+                got = sorted(availability.rooms[i] for i in np.flatnonzero(runs >= stop - first))
+                windows += 1
+                if got != expected:
+                    mismatches += 1
+    print(f"{windows - mismatches}/{windows} windows identical")
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Room occupancy bitmaps with vectorized free-room queries')
+    parser.add_argument('--output-dir', type=str, default='output',
+                        help='Use the newest rooms/bookings CSV pair in this directory (default: output)')
+    parser.add_argument('--rooms-csv', type=str)
+    parser.add_argument('--bookings-csv', type=str)
+    parser.add_argument('--out', type=str, help='Save the bitmaps to this .npz file')
+    parser.add_argument('--free', nargs=2, metavar=('START', 'END'), help='List rooms free for the whole window')
+    parser.add_argument('--check', action='store_true', help='Compare every window with room_index')
+    args = parser.parse_args()
+
+    if args.rooms_csv and args.bookings_csv:
+        rooms_csv, bookings_csv = args.rooms_csv, args.bookings_csv
+    else:
+        snapshots = latest_snapshots(args.output_dir, count=1)
+        if not snapshots:
+            raise SystemExit(f"No snapshots found in {args.output_dir}")
+        rooms_csv, bookings_csv = snapshots[0]
+
+    if args.check:
+        raise SystemExit(1 if check_against_index(rooms_csv, bookings_csv) else 0)
+
+    began = time.perf_counter()
+    availability = Availability.from_csv(rooms_csv, bookings_csv)
+    free_run = availability.free_run
+    elapsed = time.perf_counter() - began
+    n_rooms, n_days, _ = free_run.shape
+    print(f"{n_rooms} rooms x {n_days} days x {SLOTS_PER_DAY} slots "
+          f"({n_days * SLOTS_PER_DAY * (SLOTS_PER_DAY + 1) // 2} windows per room) built in {elapsed * 1000:.1f} ms")
+
+    if args.out:
+        availability.save(args.out)
+        print(f"Saved to {args.out}")
+
+    if args.free:
+        p_start, p_end = (datetime.fromisoformat(value) for value in args.free)
+        began = time.perf_counter()
+        free = availability.free_rooms(p_start, p_end)
+        elapsed = time.perf_counter() - began
+        for room_number, building in free:
+            print(f"  {building} {room_number}")
+        print(f"{len(free)} rooms free, answered in {elapsed * 1e6:.0f} µs")
@@ -0,0 +1,299 @@
+# ==========================================
+# Scraper pipeline benchmark
+# Times Phase 2 (every parser engine x executor) and Phase 3 (every
+# exporter) on synthetic week pages and saves the results as JSON
+# ==========================================
+#
+# Pages come from synthetic_timetable.py, so no VPN or live site is
+# needed. Every case runs in a fresh spawned process, so its peak RSS is
+# its own (process-pool workers are reported separately), and is repeated
+# --repeat times; the JSON keeps every run and the median.
+#
+# Cases:
+#   parse/<engine>/<executor>   parse_all_weeks_parallel over every page
+#   export/csv                  export_to_csv
+#   export/columnar             columnar_export.ColumnarWriter
+#   export/sql-<style>          SQLFileHandler, rooms then bookings
+#
+# --baseline compares against an earlier JSON and exits non-zero when a
+# case got slower than --tolerance, for use on build boxes.
+#
+# Usage:
+#   python bench_pipeline.py --rooms 100 --weeks 4 --out bench.json
+#   python bench_pipeline.py --rooms 100 --weeks 4 --out bench_new.json --baseline bench.json
+#   python bench_pipeline.py --parsers lxml --executors process --exporters csv sql-copy
+
+import io
+import os
+import json
+import time
+import pickle
+import shutil
+import platform
+import tempfile
+import argparse
+import statistics
+import subprocess
+import multiprocessing
+from contextlib import redirect_stdout
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from parse_common import Booking
+from html_store import CODECS
+from run_metrics import peak_rss_mb
+from sql_file_handler import SQLFileHandler, SQL_STYLES
+from synthetic_timetable import generate_cache, DEFAULT_FILL
+
+EXPORTERS = ('csv', 'columnar') + tuple(f"sql-{style}" for style in SQL_STYLES)
+EXECUTORS = ('thread', 'process')
+DEFAULT_TOLERANCE = 0.15
+
+
+def available_engines():
+    """Parser engines whose dependencies are installed."""
+    from optimized_scraper import PARSER_ENGINES
+
+    engines = []
+    for engine in PARSER_ENGINES:
+        if engine == 'lxml':
+            try:
+                import lxml  # noqa: F401
+            except ImportError:
+                print("lxml is not installed; skipping the lxml engine")
+                continue
+        engines.append(engine)
+    return engines
+
+# ==========================================
+# CASES (run in a spawned worker process)
+# ==========================================
+
+def run_parse_case(files, engine, executor_kind, workers):
+    from optimized_scraper import parse_all_weeks_parallel
+
+    began = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        bookings, rooms = parse_all_weeks_parallel(files, False, engine, executor_kind, workers)
+    parse_seconds = time.perf_counter() - began
+    return {
+        'bookings': len(bookings),
+        'rooms': len(rooms),
+        'phases': {'parse': parse_seconds},
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_rss_children_mb': peak_rss_mb('children'),
+    }
+
+
+def run_export_case(exporter, parsed_file, workdir):
+    from optimized_scraper import export_to_csv
+
+    began = time.perf_counter()
+    with open(parsed_file, 'rb') as f:
+        rows, rooms = pickle.load(f)
+    bookings = [Booking(*row) for row in rows]
+    load_seconds = time.perf_counter() - began
+
+    began = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        if exporter == 'csv':
+            outputs = [os.path.join(workdir, 'rooms.csv'), os.path.join(workdir, 'bookings.csv')]
+            export_to_csv(bookings, rooms, *outputs)
+        elif exporter == 'columnar':
+            from columnar_export import ColumnarWriter
+
+            columns_dir = os.path.join(workdir, 'columns')
+            writer = ColumnarWriter(columns_dir)
+            writer.write_bookings(bookings)
+            writer.close(rooms)
+            outputs = [os.path.join(columns_dir, name) for name in os.listdir(columns_dir)]
+        else:
+            outputs = [os.path.join(workdir, f"{exporter}.sql")]
+            with SQLFileHandler(outputs[0], exporter[len('sql-'):]) as sql:
+                sql.export_rooms_to_sql(sorted(rooms))
+                sql.export_bookings_to_sql(bookings)
+    export_seconds = time.perf_counter() - began
+
+    output_bytes = sum(os.path.getsize(filename) for filename in outputs)
+    for filename in outputs:
+        os.remove(filename)
+    return {
+        'bookings': len(bookings),
+        'output_bytes': output_bytes,
+        'phases': {'load': load_seconds, 'export': export_seconds},
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_isolated(function, *args):
+    """Run function(*args) in a fresh spawned process and return its result."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(function, *args).result()
+
+
+def measure(name, repeat, timed_phase, function, *args):
+    """Run one case repeat times; returns its JSON record (seconds is the median of timed_phase)."""
+    runs = [run_isolated(function, *args) for _ in range(repeat)]
+    seconds = statistics.median(run['phases'][timed_phase] for run in runs)
+    record = dict(runs[-1])
+    record.update({
+        'name': name,
+        'seconds': seconds,
+        'runs': [run['phases'][timed_phase] for run in runs],
+        'bookings_per_second': record['bookings'] / seconds if seconds else None,
+        'phases': {phase: statistics.median(run['phases'][phase] for run in runs) for phase in record['phases']},
+    })
+    for key in ('peak_rss_mb', 'peak_rss_children_mb'):
+        if record.get(key) is not None:
+            record[key] = max(run[key] for run in runs)
+    return record
+
+# ==========================================
+# REPORTING
+# ==========================================
+
+def host_info():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'commit': commit,
+    }
+
+
+def print_case(record):
+    rss = f"{record['peak_rss_mb']:8.1f} MB" if record.get('peak_rss_mb') is not None else "       n/a"
+    print(f"  {record['name']:<24} {record['seconds']:8.3f} s  {record['bookings_per_second']:>11,.0f} bookings/s  {rss}")
+
+
+def compare_results(baseline, results, tolerance):
+    """Print each case against a baseline JSON; returns the names of cases slower than tolerance allows."""
+    previous = {case['name']: case for case in baseline['cases']}
+    if baseline.get('config') != results['config']:
+        print("WARNING: baseline was run with a different configuration:", baseline.get('config'))
+
+    regressions = []
+    print(f"\nAgainst baseline ({baseline.get('host', {}).get('commit') or baseline.get('created')}):")
+    for case in results['cases']:
+        old = previous.get(case['name'])
+        if old is None:
+            print(f"  {case['name']:<24} (new case)")
+            continue
+        change = case['seconds'] / old['seconds'] - 1 if old['seconds'] else 0.0
+        flag = ''
+        if change > tolerance:
+            flag = '  REGRESSION'
+            regressions.append(case['name'])
+        print(f"  {case['name']:<24} {old['seconds']:8.3f} s -> {case['seconds']:8.3f} s  ({change:+.1%}){flag}")
+    return regressions
+
+
+def run_benchmark(cache_dir, workdir, n_rooms, n_weeks, fill, seed, codec, engines, executors, exporters,
+                  workers, repeat):
+    """Generate the pages, run every case and return the results document."""
+    began = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        files = generate_cache(cache_dir, n_rooms, n_weeks, fill, seed, codec)
+    generate_seconds = time.perf_counter() - began
+    html_bytes = sum(os.path.getsize(f[0]) for f in files if os.path.exists(f[0]))
+    print(f"Generated {n_weeks} weeks of {n_rooms} rooms in {generate_seconds:.2f} s"
+          + (f" ({html_bytes / 1e6:.1f} MB of HTML)" if html_bytes else ""))
+
+    cases = []
+    counts = set()
+    for engine in engines:
+        for executor_kind in executors:
+            record = measure(f"parse/{engine}/{executor_kind}", repeat, 'parse',
+                             run_parse_case, files, engine, executor_kind, workers)
+            record.update({'engine': engine, 'executor': executor_kind, 'workers': workers})
+            if html_bytes:
+                record['html_mb_per_second'] = html_bytes / 1e6 / record['seconds']
+            counts.add(record['bookings'])
+            cases.append(record)
+            print_case(record)
+    if len(counts) > 1:
+        print(f"WARNING: parse cases disagree on the booking count: {sorted(counts)}")
+
+    if exporters:
+        # Exporters all start from the same parsed term, written once
+        from optimized_scraper import parse_all_weeks_parallel
+
+        with redirect_stdout(io.StringIO()):
+            bookings, rooms = parse_all_weeks_parallel(files, False, engines[-1], 'thread', workers)
+        parsed_file = os.path.join(workdir, 'parsed.pickle')
+        with open(parsed_file, 'wb') as f:
+            pickle.dump(([booking.astuple() for booking in bookings], sorted(rooms)), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        del bookings
+
+        for exporter in exporters:
+            record = measure(f"export/{exporter}", repeat, 'export', run_export_case, exporter, parsed_file, workdir)
+            record['exporter'] = exporter
+            cases.append(record)
+            print_case(record)
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'host': host_info(),
+        'config': {'rooms': n_rooms, 'weeks': n_weeks, 'fill': fill, 'seed': seed, 'codec': codec,
+                   'workers': workers, 'repeat': repeat},
+        'html_bytes': html_bytes,
+        'phases': {'generate': generate_seconds},
+        'booking_counts_consistent': len(counts) <= 1,
+        'cases': cases,
+    }
+
+
+if __name__ == "__main__":
+    from optimized_scraper import MAX_WORKERS, PARSER_ENGINES
+
+    parser = argparse.ArgumentParser(description='Benchmark the scraper parsers and exporters on synthetic pages')
+    parser.add_argument('--rooms', type=int, default=100, help='Rooms per week page (default: 100)')
+    parser.add_argument('--weeks', type=int, default=4, help='Week pages (default: 4)')
+    parser.add_argument('--fill', type=float, default=DEFAULT_FILL)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--codec', choices=CODECS, default='none',
+                        help='Cache codec of the generated pages (default: none)')
+    parser.add_argument('--parsers', nargs='+', choices=PARSER_ENGINES, default=None,
+                        help='Parser engines (default: every installed one)')
+    parser.add_argument('--executors', nargs='+', choices=EXECUTORS, default=list(EXECUTORS))
+    parser.add_argument('--exporters', nargs='*', choices=EXPORTERS, default=list(EXPORTERS))
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS,
+                        help=f'Phase 2 workers (default: {MAX_WORKERS})')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case; the median is reported (default: 3)')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='Generate the pages here and keep them (default: a temporary directory)')
+    parser.add_argument('--out', type=str, default='bench_pipeline.json', help='Results JSON (default: bench_pipeline.json)')
+    parser.add_argument('--baseline', type=str, default=None, help='Earlier results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f'Slowdown against --baseline that counts as a regression (default: {DEFAULT_TOLERANCE})')
+    args = parser.parse_args()
+
+    engines = [engine for engine in available_engines() if args.parsers is None or engine in args.parsers]
+    if not engines:
+        parser.error("none of the selected parser engines is installed")
+
+    workdir = tempfile.mkdtemp(prefix='ubc_bench_')
+    try:
+        results = run_benchmark(
+            args.cache_dir or os.path.join(workdir, 'html_cache'), workdir, args.rooms, args.weeks, args.fill,
+            args.seed, args.codec, engines, args.executors, args.exporters, args.workers, args.repeat
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved results to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_results(json.load(f), results, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} case(s) slower than the baseline by more than {args.tolerance:.0%}")
+            raise SystemExit(1)
@@ -0,0 +1,340 @@
+# ==========================================
+# Free-room query benchmark
+# Loads the scraper CSVs into a local PostgreSQL twice, once with the
+# previous Bookings indexes and RPC bodies and once with
+# supabase_setup.sql, then compares query plans, latency and results
+# ==========================================
+#
+# The legacy RPCs probe Bookings once per room (twice in free_rooms_list);
+# the current ones collect the busy rooms with one GiST scan of
+# Bookings.period and anti-join Rooms against that set once, and the
+# *_daily variants read the precomputed Free_Intervals table.
+#
+# Needs psycopg2 and a role allowed to create databases. Two scratch
+# databases (ubc_bench_legacy, ubc_bench_current) are created and dropped.
+#
+# Usage:
+#   python bench_queries.py --dsn "host=localhost user=postgres" --weeks 16
+#   python bench_queries.py --dsn "..." --weeks 16 --room-copies 10 --explain
+
+import io
+import re
+import csv
+import time
+import random
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+from parse_common import BOOKING_FIELDS
+from sql_file_handler import ROOMS_TABLE, ROOM_COLUMNS, BOOKINGS_TABLE
+from snapshot_diff import latest_snapshots
+from free_intervals import (
+    FREE_INTERVALS_TABLE, FREE_INTERVAL_COLUMNS, FREE_INTERVAL_DAYS_TABLE,
+    busy_by_day, covered_days, interval_rows, day_text
+)
+
+SETUP_SQL = 'supabase_setup.sql'
+DATABASES = ('ubc_bench_legacy', 'ubc_bench_current')
+FUNCTIONS = ('free_rooms_per_building', 'free_rooms_list')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Indexes and RPC bodies as they were before the tsrange/GiST rewrite
+LEGACY_SQL = """
+DROP INDEX IF EXISTS idx_bookings_period;
+DROP INDEX IF EXISTS idx_bookings_start_time;
+CREATE INDEX IF NOT EXISTS idx_bookings_overlap
+ON public.bookings (building, room_number, start_time, end_time);
+
+CREATE OR REPLACE FUNCTION public.free_rooms_per_building(p_start timestamp, p_end timestamp)
+RETURNS TABLE(building text, free_room_count bigint)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $function$
+BEGIN
+  RETURN QUERY
+  SELECT
+    r.building::text,
+    COUNT(*)::bigint AS free_room_count
+  FROM Rooms r
+  WHERE NOT EXISTS (
+    SELECT 1
+    FROM Bookings b
+    WHERE b.room_number = r.room_number
+      AND b.building = r.building
+      AND b.start_time < p_end
+      AND b.end_time > p_start
+  )
+  GROUP BY r.building
+  ORDER BY free_room_count DESC, building ASC;
+END;
+$function$;
+
+CREATE OR REPLACE FUNCTION public.free_rooms_list(p_start timestamp, p_end timestamp)
+RETURNS TABLE(room_number text, building text, capacity int, features text, earliest_booking timestamp)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  RETURN QUERY
+  WITH free_count AS (
+    SELECT
+      r.building,
+      COUNT(*) AS free_room_count
+    FROM Rooms r
+    WHERE NOT EXISTS (
+      SELECT 1
+      FROM Bookings b
+      WHERE b.room_number = r.room_number
+        AND b.building = r.building
+        AND b.start_time < p_end
+        AND b.end_time > p_start
+    )
+    GROUP BY r.building
+  )
+  SELECT
+    r.room_number::text,
+    r.building::text,
+    r.capacity,
+    r.features::text,
+    (
+      SELECT MIN(b.start_time)
+      FROM Bookings b
+      WHERE b.room_number = r.room_number
+        AND b.building = r.building
+        AND b.start_time >= p_end
+        AND DATE(b.start_time) = DATE(p_start)
+    ) AS earliest_booking
+  FROM Rooms r
+  JOIN free_count fc ON r.building = fc.building
+  WHERE NOT EXISTS (
+    SELECT 1
+    FROM Bookings b
+    WHERE b.room_number = r.room_number
+      AND b.building = r.building
+      AND b.start_time < p_end
+      AND b.end_time > p_start
+  )
+  ORDER BY fc.free_room_count DESC, r.building ASC, earliest_booking ASC NULLS FIRST, r.room_number ASC;
+END;
+$$;
+"""
+
+
+def _dsn_for(dsn, dbname):
+    return f"{dsn} dbname={dbname}"
+
+
+def _read_csv(filename):
+    with open(filename, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        return [tuple(row) for row in reader]
+
+
+def scale_snapshot(rooms, bookings, weeks=1, room_copies=1):
+    """
+    Grow a snapshot into a bigger benchmark data set.
+
+    Bookings are repeated for `weeks` consecutive weeks (a term is about 16)
+    and every room, with its bookings, is cloned room_copies - 1 times
+    under a suffixed building code.
+    """
+    scaled_rooms = []
+    scaled_bookings = []
+    for copy in range(room_copies):
+        suffix = f"_{copy}" if copy else ""
+        scaled_rooms.extend((r[0], r[1] + suffix) + r[2:] for r in rooms)
+        for week in range(weeks):
+            shift = timedelta(days=7 * week)
+            for b in bookings:
+                start = datetime.strptime(b[2], TIMESTAMP_FORMAT) + shift
+                end = datetime.strptime(b[3], TIMESTAMP_FORMAT) + shift
+                scaled_bookings.append((b[0], b[1] + suffix, start.strftime(TIMESTAMP_FORMAT),
+                                        end.strftime(TIMESTAMP_FORMAT)) + b[4:])
+    return scaled_rooms, scaled_bookings
+
+
+def _copy_rows(cursor, table, columns, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def create_database(psycopg2, dsn, dbname, setup_sql, rooms, bookings, legacy=False):
+    """
+    (Re)create dbname, apply the schema and load the rows, plus the free
+    intervals unless legacy; returns (connection, load time in seconds).
+    """
+    admin = psycopg2.connect(_dsn_for(dsn, 'postgres'))
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute(f"DROP DATABASE IF EXISTS {dbname}")
+        cursor.execute(f"CREATE DATABASE {dbname}")
+    admin.close()
+
+    conn = psycopg2.connect(_dsn_for(dsn, dbname))
+    began = time.perf_counter()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(setup_sql)
+            if legacy:
+                cursor.execute(LEGACY_SQL)
+            _copy_rows(cursor, ROOMS_TABLE, ROOM_COLUMNS, rooms)
+            _copy_rows(cursor, BOOKINGS_TABLE, BOOKING_FIELDS, bookings)
+            if not legacy:
+                days = covered_days(bookings)
+                _copy_rows(cursor, FREE_INTERVALS_TABLE, FREE_INTERVAL_COLUMNS,
+                           interval_rows([room[:2] for room in rooms], busy_by_day(bookings), days))
+                _copy_rows(cursor, FREE_INTERVAL_DAYS_TABLE, ('day',), ((day_text(day),) for day in days))
+        conn.commit()
+    except Exception:
+        conn.close()
+        raise
+    elapsed = time.perf_counter() - began
+
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute("VACUUM ANALYZE")
+    return conn, elapsed
+
+
+def drop_database(psycopg2, dsn, dbname):
+    admin = psycopg2.connect(_dsn_for(dsn, 'postgres'))
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute(f"DROP DATABASE IF EXISTS {dbname}")
+    admin.close()
+
+# ==========================================
+# QUERIES
+# ==========================================
+
+def sample_windows(bookings, count, seed=0):
+    """Random 30 minute to 3 hour windows on booked days, aligned to half hours between 07:00 and 22:00."""
+    days = sorted({b[2][:10] for b in bookings})
+    rng = random.Random(seed)
+    windows = []
+    for _ in range(count):
+        midnight = datetime.strptime(rng.choice(days), '%Y-%m-%d')
+        slot = rng.randrange(14, 44)
+        length = rng.choice((1, 2, 3, 6))
+        start = midnight + timedelta(minutes=30 * slot)
+        windows.append((start, start + timedelta(minutes=30 * length)))
+    return windows
+
+
+def time_function(conn, function, windows, repeat):
+    """Call the RPC for every window; returns (latencies in ms, results per window)."""
+    latencies = []
+    results = []
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT * FROM public.{function}(%s, %s)", windows[0])  # warm the plan cache
+        cursor.fetchall()
+        for window in windows:
+            for attempt in range(repeat):
+                began = time.perf_counter()
+                cursor.execute(f"SELECT * FROM public.{function}(%s, %s)", window)
+                rows = cursor.fetchall()
+                latencies.append((time.perf_counter() - began) * 1000)
+            results.append(rows)
+    return latencies, results
+
+
+def explain_function(conn, function, window):
+    """
+    EXPLAIN ANALYZE the query inside a plpgsql RPC.
+
+    Calling the function only shows a Function Scan, so the RETURN QUERY
+    body is read from pg_proc and prepared with p_start/p_end as parameters.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT prosrc FROM pg_proc WHERE proname = %s", (function,))
+        source = cursor.fetchone()[0]
+        # The last RETURN QUERY is the main query (the *_daily fallbacks come first)
+        body = source.rsplit('RETURN QUERY', 1)[1].rsplit('END;', 1)[0].strip().rstrip(';')
+        body = re.sub(r'\bp_start\b', '$1', re.sub(r'\bp_end\b', '$2', body))
+        cursor.execute(f"PREPARE bench_body(timestamp, timestamp) AS {body}")
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS) EXECUTE bench_body(%s, %s)", window)
+        plan = "\n".join(row[0] for row in cursor.fetchall())
+        cursor.execute("DEALLOCATE bench_body")
+    return plan
+
+
+def _summary(latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"median {statistics.median(ordered):7.3f} ms   p95 {p95:7.3f} ms   max {ordered[-1]:7.3f} ms"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the legacy and current free-room RPCs on a local PostgreSQL')
+    parser.add_argument('--dsn', type=str, default='host=localhost user=postgres',
+                        help='libpq connection string without dbname (default: "host=localhost user=postgres")')
+    parser.add_argument('--output-dir', type=str, default='output',
+                        help='Load the newest rooms/bookings CSV pair in this directory (default: output)')
+    parser.add_argument('--rooms-csv', type=str)
+    parser.add_argument('--bookings-csv', type=str)
+    parser.add_argument('--weeks', type=int, default=16, help='Repeat the bookings over this many weeks (default: 16)')
+    parser.add_argument('--room-copies', type=int, default=1, help='Clone every room this many times (default: 1)')
+    parser.add_argument('--windows', type=int, default=200, help='Number of random query windows (default: 200)')
+    parser.add_argument('--repeat', type=int, default=3, help='Calls per window (default: 3)')
+    parser.add_argument('--explain', action='store_true', help='Print EXPLAIN ANALYZE of both query bodies')
+    parser.add_argument('--keep', action='store_true', help='Keep the benchmark databases afterwards')
+    args = parser.parse_args()
+
+    try:
+        import psycopg2
+    except ImportError:
+        raise SystemExit("bench_queries.py needs psycopg2 (pip install psycopg2-binary)")
+
+    if args.rooms_csv and args.bookings_csv:
+        rooms_csv, bookings_csv = args.rooms_csv, args.bookings_csv
+    else:
+        snapshots = latest_snapshots(args.output_dir, count=1)
+        if not snapshots:
+            raise SystemExit(f"No snapshots found in {args.output_dir}")
+        rooms_csv, bookings_csv = snapshots[0]
+
+    rooms, bookings = scale_snapshot(_read_csv(rooms_csv), _read_csv(bookings_csv), args.weeks, args.room_copies)
+    print(f"Loaded {bookings_csv}: {len(rooms)} rooms, {len(bookings)} bookings after scaling")
+    with open(SETUP_SQL, 'r', encoding='utf-8') as f:
+        setup_sql = f.read()
+    windows = sample_windows(bookings, args.windows)
+
+    connections = {}
+    try:
+        for dbname in DATABASES:
+            conn, elapsed = create_database(psycopg2, args.dsn, dbname, setup_sql, rooms, bookings,
+                                            legacy=dbname == DATABASES[0])
+            connections[dbname] = conn
+            print(f"{dbname}: schema + load in {elapsed:.2f} s")
+
+        mismatches = 0
+        for function in FUNCTIONS:
+            print(f"\n{function} ({len(windows)} windows x {args.repeat} calls)")
+            variants = [(DATABASES[0], function), (DATABASES[1], function), (DATABASES[1], function + '_daily')]
+            results = {}
+            for dbname, variant in variants:
+                latencies, results[(dbname, variant)] = time_function(connections[dbname], variant, windows,
+                                                                      args.repeat)
+                print(f"  {dbname + ' ' + variant:<50} {_summary(latencies)}")
+            expected = results[variants[0]]
+            for variant in variants[1:]:
+                differing = sum(1 for a, b in zip(expected, results[variant]) if a != b)
+                mismatches += differing
+                print(f"  {variant[1]} results identical to legacy for {len(windows) - differing}/{len(windows)} windows")
+
+            if args.explain:
+                for dbname, variant in variants:
+                    print(f"\n--- {dbname} {variant} [{windows[0][0]}, {windows[0][1]}) ---")
+                    print(explain_function(connections[dbname], variant, windows[0]))
+    finally:
+        for conn in connections.values():
+            conn.close()
+        if not args.keep:
+            for dbname in DATABASES:
+                drop_database(psycopg2, args.dsn, dbname)
+
+    raise SystemExit(1 if mismatches else 0)
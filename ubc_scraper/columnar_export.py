@@ -0,0 +1,259 @@
+# ==========================================
+# Columnar bookings export
+# Writes bookings as one memory-mappable .npy file per column, so a term
+# reloads with np.load(mmap_mode='r') instead of a full CSV parse
+# ==========================================
+#
+# Layout of a columns directory:
+#   start.npy, end.npy      int32 minutes since parse_common.EPOCH
+#   <field>.npy             int32 codes into the field's dictionary, for
+#                           room_number, building, course_code, instructor
+#                           and booking_type
+#   columns.json            row count, dictionaries and the rooms table,
+#                           written last: a directory without it is
+#                           incomplete
+#
+# Columns are appended as weeks are parsed (the .npy headers reserve room
+# for the final shape and are rewritten on close), so the writer holds no
+# more than FLUSH_ROWS bookings and needs only the standard library.
+# Loading needs numpy; every column is a read-only memmap of its file.
+#
+# Usage:
+#   python optimized_scraper.py --bookings-csv output/bookings.csv --columnar-dir output/bookings_columns
+#   python columnar_export.py --bookings-csv output/bookings.csv --rooms-csv output/rooms.csv --out output/bookings_columns
+#   python columnar_export.py --load output/bookings_columns --bookings-csv output/bookings.csv   # compare load times
+
+import os
+import csv
+import sys
+import json
+import time
+import struct
+import argparse
+from array import array
+
+from parse_common import EPOCH, BOOKING_FIELDS, Booking
+
+FORMAT_VERSION = 1
+MANIFEST = 'columns.json'
+TIME_COLUMNS = ('start', 'end')
+CODED_COLUMNS = ('room_number', 'building', 'course_code', 'instructor', 'booking_type')
+DTYPE = '<i4'
+FLUSH_ROWS = 1 << 16  # bookings buffered before the columns are appended to
+
+# .npy version 1.0 header padded to a fixed size, so it can be rewritten in place with the final row count
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+NPY_HEADER_BYTES = 128
+
+
+def _npy_header(rows):
+    header = f"{{'descr': '{DTYPE}', 'fortran_order': False, 'shape': ({rows},), }}"
+    padding = NPY_HEADER_BYTES - len(NPY_MAGIC) - 2 - len(header) - 1
+    return NPY_MAGIC + struct.pack('<H', NPY_HEADER_BYTES - len(NPY_MAGIC) - 2) + (header + ' ' * padding + '\n').encode('latin-1')
+
+
+class ColumnarWriter:
+    """
+    Appends Booking records to a columns directory.
+
+    write_bookings() can be called once per parsed week; close(rooms)
+    finishes the files and writes the manifest.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        manifest = os.path.join(directory, MANIFEST)
+        if os.path.exists(manifest):
+            os.remove(manifest)  # rewriting: the old manifest must not describe the new files
+
+        self.rows = 0
+        self.codes = {name: {} for name in CODED_COLUMNS}
+        self.buffers = {name: array('i') for name in TIME_COLUMNS + CODED_COLUMNS}
+        self.files = {}
+        for name in self.buffers:
+            f = open(os.path.join(directory, f"{name}.npy"), 'wb')
+            f.write(_npy_header(0))
+            self.files[name] = f
+
+    def add(self, booking):
+        """Buffer one Booking; the columns are appended to every FLUSH_ROWS bookings."""
+        buffers = self.buffers
+        buffers['start'].append(booking.start)
+        buffers['end'].append(booking.end)
+        for name in CODED_COLUMNS:
+            codes = self.codes[name]
+            value = getattr(booking, name)
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(codes)
+            buffers[name].append(code)
+        if len(buffers['start']) >= FLUSH_ROWS:
+            self.flush()
+
+    def write_bookings(self, bookings):
+        """Append a batch (e.g. one parsed week) of Booking records."""
+        for booking in bookings:
+            self.add(booking)
+        self.flush()
+
+    def tee(self, bookings):
+        """Yield bookings unchanged while appending them to the columns."""
+        for booking in bookings:
+            self.add(booking)
+            yield booking
+        self.flush()
+
+    def flush(self):
+        rows = len(self.buffers['start'])
+        if not rows:
+            return
+        for name, values in self.buffers.items():
+            if sys.byteorder == 'big':
+                values.byteswap()
+            values.tofile(self.files[name])
+            self.files[name].flush()
+            del values[:]
+        self.rows += rows
+
+    def close(self, rooms=()):
+        """Finish the column files and write the manifest with the dictionaries and rooms."""
+        self.flush()
+        for f in self.files.values():
+            f.seek(0)
+            f.write(_npy_header(self.rows))
+            f.close()
+
+        manifest = {
+            'format': FORMAT_VERSION,
+            'epoch': EPOCH.isoformat(),
+            'rows': self.rows,
+            'fields': list(BOOKING_FIELDS),
+            'dtype': DTYPE,
+            # Code i of a column is the i-th entry of its dictionary
+            'dictionaries': {name: list(codes) for name, codes in self.codes.items()},
+            'rooms': [list(room) for room in sorted(rooms)],
+        }
+        temporary = os.path.join(self.directory, MANIFEST + '.tmp')
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(temporary, os.path.join(self.directory, MANIFEST))
+        print(f"Exported {self.rows} bookings to {self.directory} (columnar)")
+        return self.rows
+
+
+class BookingColumns:
+    """
+    A columns directory loaded for reading.
+
+    columns[name] is a read-only numpy memmap (or an in-memory array with
+    mmap=False); dictionaries[name] maps codes back to strings.
+    """
+
+    def __init__(self, directory, mmap=True):
+        import numpy as np
+
+        with open(os.path.join(directory, MANIFEST), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != FORMAT_VERSION:
+            raise ValueError(f"{directory}: unsupported columnar format {manifest.get('format')}")
+
+        self.directory = directory
+        self.rows = manifest['rows']
+        self.dictionaries = manifest['dictionaries']
+        self.rooms = [tuple(room) for room in manifest['rooms']]
+        self.columns = {}
+        for name in TIME_COLUMNS + CODED_COLUMNS:
+            column = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r' if mmap else None)
+            if column.shape != (self.rows,):
+                raise ValueError(f"{directory}: {name}.npy has {column.shape[0]} rows, expected {self.rows}")
+            self.columns[name] = column
+        self._lookup = {}
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def code(self, name, value):
+        """Code of value in a dictionary-encoded column, or -1 if it never occurs."""
+        lookup = self._lookup.get(name)
+        if lookup is None:
+            lookup = self._lookup[name] = {text: i for i, text in enumerate(self.dictionaries[name])}
+        return lookup.get(value, -1)
+
+    def intervals(self):
+        """(room_number, building, start, end) tuples, as RoomIndex and Availability.build take them."""
+        room_numbers = self.dictionaries['room_number']
+        buildings = self.dictionaries['building']
+        return zip([room_numbers[code] for code in self.columns['room_number'].tolist()],
+                   [buildings[code] for code in self.columns['building'].tolist()],
+                   self.columns['start'].tolist(), self.columns['end'].tolist())
+
+    def bookings(self):
+        """Decode every row back into a Booking record, in file order."""
+        decoded = {name: [self.dictionaries[name][code] for code in self.columns[name].tolist()]
+                   for name in CODED_COLUMNS}
+        for room_number, building, start, end, course_code, instructor, booking_type in zip(
+                decoded['room_number'], decoded['building'], self.columns['start'].tolist(),
+                self.columns['end'].tolist(), decoded['course_code'], decoded['instructor'],
+                decoded['booking_type']):
+            yield Booking(room_number, building, start, end, course_code, instructor, booking_type)
+
+
+def read_rooms_csv(rooms_csv):
+    with open(rooms_csv, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        return [(room_number, building, int(capacity), features)
+                for room_number, building, capacity, features in reader]
+
+
+def export_csv_to_columns(bookings_csv, rooms_csv, directory):
+    """Convert an existing bookings CSV (and its rooms CSV, if given) to a columns directory."""
+    from recurrence import read_bookings_csv
+
+    writer = ColumnarWriter(directory)
+    writer.write_bookings(read_bookings_csv(bookings_csv))
+    return writer.close(read_rooms_csv(rooms_csv) if rooms_csv else ())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Write or load the columnar bookings export')
+    parser.add_argument('--bookings-csv', type=str, default=None, help='Bookings CSV to convert (or to time against --load)')
+    parser.add_argument('--rooms-csv', type=str, default=None, help='Rooms CSV to store with the columns')
+    parser.add_argument('--out', type=str, default=None, help='Columns directory to write')
+    parser.add_argument('--load', type=str, default=None, help='Columns directory to load and check')
+    args = parser.parse_args()
+
+    if args.out:
+        if not args.bookings_csv:
+            parser.error("--out needs --bookings-csv")
+        export_csv_to_columns(args.bookings_csv, args.rooms_csv, args.out)
+
+    if args.load:
+        import numpy  # noqa: F401  imported first: its import time is not load time
+        began = time.perf_counter()
+        columns = BookingColumns(args.load)
+        load_seconds = time.perf_counter() - began
+        size = sum(os.path.getsize(os.path.join(args.load, name)) for name in os.listdir(args.load))
+        print(f"Loaded {len(columns)} bookings, {len(columns.rooms)} rooms from {args.load} "
+              f"in {load_seconds * 1000:.2f} ms ({size / 1e6:.1f} MB on disk)")
+        for name in CODED_COLUMNS:
+            print(f"  {name:<14} {len(columns.dictionaries[name]):8d} distinct values")
+        if len(columns):
+            from parse_common import format_minutes
+            print(f"  bookings from {format_minutes(int(columns['start'].min()))} "
+                  f"to {format_minutes(int(columns['end'].max()))}")
+
+        if args.bookings_csv:
+            from recurrence import read_bookings_csv
+
+            began = time.perf_counter()
+            from_csv = list(read_bookings_csv(args.bookings_csv))
+            csv_seconds = time.perf_counter() - began
+            print(f"  CSV parse of {args.bookings_csv}: {csv_seconds * 1000:.0f} ms")
+            if from_csv != list(columns.bookings()):
+                raise SystemExit("Columns and CSV differ")
+            print("  columns match the CSV row for row")
@@ -0,0 +1,257 @@
+# ==========================================
+# Fast Phase 2 parser engine (lxml)
+# Drop-in replacement for parse_week_html_bs4 that produces
+# row-for-row identical bookings and rooms
+# ==========================================
+#
+# The BeautifulSoup engine calls table.get_text() on every <table>, and an
+# outer table's text contains all of its nested tables, so the work grows
+# with nesting depth. Here the document text is laid out once, in a single
+# walk, and every table/row/cell/span only records its range into it.
+#
+# Parity check against the BeautifulSoup engine:
+#   python fast_parser.py --compare html_cache
+
+import os
+import glob
+import argparse
+from itertools import accumulate
+
+import lxml.html
+from lxml import etree
+
+from week_cache import load_metadata, is_cached, open_week_html
+from parse_common import (
+    ROOM_PATTERN, WEEK_PATTERN, CAPACITY_PATTERN, WEEKDAYS,
+    week_start_from_match, split_features, decode_grid
+)
+
+HTML_PARSER = lxml.html.HTMLParser(encoding='utf-8')
+
+# get_text() leaves out the contents of these elements
+SKIPPED_TEXT_TAGS = frozenset(('script', 'style'))
+
+# Elements whose text is looked up while parsing
+INDEXED_TAGS = frozenset(('table', 'tr', 'td', 'span'))
+
+# Same match as parse_common.FEATURES_SELECTOR under soupsieve: the span is
+# searched among the table's descendants, but its ancestor chain is checked
+# without stopping at the table
+FEATURES_XPATH = etree.XPath(
+    './/span[parent::td[not(preceding-sibling::td)]'
+    '/parent::tr/parent::tbody/parent::table/parent::td'
+    '/parent::tr[count(preceding-sibling::tr)=3]/parent::tbody]'
+)
+
+
+class TextIndex:
+    """
+    Document text in get_text() order, built in one walk of the tree.
+
+    chunks holds every text node; ranges maps each indexed element to the
+    [start, stop) slice of chunks it contains.
+    """
+
+    def __init__(self, root):
+        chunks = []
+        starts = {}
+        ranges = {}
+
+        stack = [(root, False)]
+        while stack:
+            node, leaving = stack.pop()
+            tag = node.tag
+
+            if not isinstance(tag, str):
+                # Comment / processing instruction: only its tail is text
+                if node.tail:
+                    chunks.append(node.tail)
+                continue
+
+            if leaving:
+                if tag in INDEXED_TAGS:
+                    ranges[node] = (starts.pop(node), len(chunks))
+                if node.tail and node is not root:
+                    chunks.append(node.tail)
+                continue
+
+            if tag in INDEXED_TAGS:
+                starts[node] = len(chunks)
+            if node.text and tag not in SKIPPED_TEXT_TAGS:
+                chunks.append(node.text)
+
+            stack.append((node, True))
+            if tag not in SKIPPED_TEXT_TAGS:
+                stack.extend((child, False) for child in reversed(node))
+
+        self.chunks = chunks
+        self.ranges = ranges
+        self.offsets = list(accumulate(map(len, chunks), initial=0))
+        self.text = ''.join(chunks)
+
+    def contains(self, element, needle):
+        """Equivalent of `needle in element.get_text()` without building the text."""
+        start, stop = self.ranges[element]
+        return self.text.find(needle, self.offsets[start], self.offsets[stop]) != -1
+
+    def stripped(self, element):
+        """Equivalent of element.get_text(strip=True)."""
+        start, stop = self.ranges[element]
+        return ''.join([chunk.strip() for chunk in self.chunks[start:stop]])
+
+
+def parse_week_html_lxml(file_tuple, debug, stats=None):
+    """
+    Parse a single week's HTML file using lxml.
+
+    stats, if given, is a dict that receives the tables and grid cells visited.
+    """
+
+    cache_filename, metadata_filename = file_tuple
+
+    # Load metadata
+    metadata = load_metadata(metadata_filename)
+
+    week_text = metadata['week_text']
+
+    if debug:
+        print(f"\nParsing: {week_text}")
+
+    bookings = []
+    rooms_set = set()
+
+    # Load HTML, streaming it through the decompressor for stored pages
+    with open_week_html(cache_filename, metadata) as f:
+        root = etree.parse(f, HTML_PARSER).getroot()
+    if root is None:
+        return bookings, rooms_set
+
+    index = TextIndex(root)
+
+    current_room = None
+    week_start_date = None
+    n_tables = n_cells = 0
+
+    for table in root.iter('table'):
+        n_tables += 1
+
+        # --- Extract Room Details ---
+        if index.contains(table, "Location Timetable:"):
+            current_room = None
+            capacity = None
+            features = []
+            features_done = False
+
+            for row in table.iter('tr'):
+                row_text = index.stripped(row)
+                if not row_text:
+                    continue
+
+                # Extract room code
+                match_room = ROOM_PATTERN.search(row_text)
+                if match_room:
+                    building = match_room.group(1)
+                    room_number = match_room.group(2)
+                    current_room = (building, room_number)
+                    if debug:
+                        print(f"  Found room: {building} {room_number}")
+
+                # Extract week date
+                match_week = WEEK_PATTERN.search(row_text)
+                if match_week:
+                    week_start_date = week_start_from_match(match_week, week_text, debug)
+
+                # Extract capacity
+                match_capacity = CAPACITY_PATTERN.search(row_text)
+                if match_capacity:
+                    try:
+                        capacity = int(match_capacity.group(1))
+                    except ValueError:
+                        capacity = None
+
+                # Extract features (same for every row, so look up once per table)
+                if not features_done:
+                    features_done = True
+                    spans = FEATURES_XPATH(table)
+                    if spans:
+                        features_text = index.stripped(spans[0])
+                        if features_text:
+                            features = split_features(features_text)
+
+            # Store room data - ONLY if capacity is not None
+            if current_room and capacity is not None:
+                features_string = ", ".join(features)
+                room_tuple = (current_room[1], current_room[0], capacity, features_string)
+                rooms_set.add(room_tuple)
+
+        # --- Extract Bookings from Timetable Grid ---
+        elif any(index.contains(table, day) for day in WEEKDAYS):
+            if not current_room or not week_start_date:
+                continue
+
+            # Only get direct child <td> cells
+            rows = (row.findall('td') for row in table.iter('tr'))
+            n_cells += decode_grid(
+                rows,
+                index.stripped,
+                lambda cell: int(cell.get('rowspan', 1)),
+                current_room, week_start_date, bookings, debug
+            )
+
+    if debug:
+        print(f"\n  → Total: {len(bookings)} bookings, {len(rooms_set)} rooms")
+    if stats is not None:
+        stats.update(tables=n_tables, cells=n_cells)
+
+    return bookings, rooms_set
+
+# ==========================================
+# PARITY CHECK
+# ==========================================
+
+def compare_engines(cache_dir):
+    """
+    Parse every cached week with both engines and report any difference.
+
+    Returns the number of files whose bookings or rooms differ.
+    """
+    from optimized_scraper import parse_week_html_bs4
+
+    mismatches = 0
+    metadata_files = sorted(glob.glob(os.path.join(cache_dir, 'week_*.json')))
+
+    for metadata_filename in metadata_files:
+        file_tuple = (metadata_filename[:-len('.json')] + '.html', metadata_filename)
+        if not is_cached(*file_tuple):
+            continue
+
+        expected_bookings, expected_rooms = parse_week_html_bs4(file_tuple, False)
+        bookings, rooms = parse_week_html_lxml(file_tuple, False)
+
+        name = os.path.basename(file_tuple[0])
+        if bookings == expected_bookings and rooms == expected_rooms:
+            print(f"OK    {name}: {len(bookings)} bookings, {len(rooms)} rooms")
+            continue
+
+        mismatches += 1
+        print(f"DIFF  {name}")
+        for row, (got, want) in enumerate(zip(bookings, expected_bookings)):
+            if got != want:
+                print(f"  first differing booking row {row}:\n    lxml: {got}\n    bs4:  {want}")
+                break
+        if len(bookings) != len(expected_bookings):
+            print(f"  booking count: lxml {len(bookings)}, bs4 {len(expected_bookings)}")
+        if rooms != expected_rooms:
+            print(f"  rooms only in lxml: {sorted(rooms - expected_rooms)[:5]}")
+            print(f"  rooms only in bs4:  {sorted(expected_rooms - rooms)[:5]}")
+
+    print(f"\n{len(metadata_files) - mismatches}/{len(metadata_files)} files identical")
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='lxml parser engine for the UBC timetable scraper')
+    parser.add_argument('--compare', type=str, metavar='CACHE_DIR', required=True,
+                        help='Check the lxml engine against BeautifulSoup on every cached week')
+    args = parser.parse_args()
+    raise SystemExit(1 if compare_engines(args.compare) else 0)
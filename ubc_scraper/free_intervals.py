@@ -0,0 +1,236 @@
+# ==========================================
+# Daily free intervals
+# Precomputes, for every room and day, the gaps between its bookings so
+# the free-room RPCs can answer with an indexed range read
+# ==========================================
+#
+# A room's free intervals on a day are the maximal stretches of
+# [00:00, 24:00) not covered by any booking (bookings crossing midnight
+# are split per day). A room is free for a window inside one day iff one
+# of its intervals on that day contains the window, and the interval's end
+# is the room's next booking that day (or midnight).
+#
+# Free_Interval_Days lists the days whose rows are complete; the
+# *_daily RPCs in supabase_setup.sql fall back to the regular RPCs for
+# any other day and for windows crossing midnight.
+#
+# Usage:
+#   python free_intervals.py --output-dir output --out output/free_intervals.csv
+#   python free_intervals.py --output-dir output --sql-out free_intervals.sql --style copy
+
+import csv
+import argparse
+from datetime import datetime
+from collections import defaultdict
+
+from parse_common import MINUTES_PER_DAY, format_minutes, to_minutes
+from sql_file_handler import SQLFileHandler, SQL_STYLES, DEFAULT_SQL_STYLE, DEFAULT_BATCH_SIZE
+
+FREE_INTERVALS_TABLE = "Free_Intervals"
+FREE_INTERVAL_COLUMNS = ("room_number", "building", "day", "free_start", "free_end")
+FREE_INTERVAL_DAYS_TABLE = "Free_Interval_Days"
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _minutes(text):
+    return to_minutes(datetime.strptime(text, TIMESTAMP_FORMAT))
+
+
+def day_text(day):
+    return format_minutes(day * MINUTES_PER_DAY)[:10]
+
+
+def booking_days(start, end):
+    """Days (since EPOCH) a [start, end) booking in minutes touches; a zero-length booking touches its own day."""
+    return range(start // MINUTES_PER_DAY, max(end - 1, start) // MINUTES_PER_DAY + 1)
+
+
+def busy_by_day(bookings):
+    """
+    Group bookings per room and day.
+
+    bookings: (room_number, building, start_time, end_time, ...) rows with
+    'YYYY-MM-DD HH:MM:SS' times, as in the bookings CSV. Returns
+    {(room_number, building): {day: sorted [(start, end)]}} in minutes,
+    each booking clipped to the day.
+    """
+    busy = defaultdict(lambda: defaultdict(list))
+    for row in bookings:
+        if not (row[2] and row[3]):
+            continue
+        start = _minutes(row[2])
+        end = max(_minutes(row[3]), start)
+        room_days = busy[(row[0], row[1])]
+        for day in booking_days(start, end):
+            midnight = day * MINUTES_PER_DAY
+            room_days[day].append((max(start, midnight), min(end, midnight + MINUTES_PER_DAY)))
+    for room_days in busy.values():
+        for intervals in room_days.values():
+            intervals.sort()
+    return busy
+
+
+def day_gaps(day, intervals):
+    """Free (start, end) stretches of a day around sorted busy intervals, in minutes."""
+    cursor = day * MINUTES_PER_DAY
+    gaps = []
+    for start, end in intervals:
+        if start < end:
+            if start > cursor:
+                gaps.append((cursor, start))
+            cursor = max(cursor, end)
+    if cursor < (day + 1) * MINUTES_PER_DAY:
+        gaps.append((cursor, (day + 1) * MINUTES_PER_DAY))
+
+    # The RPCs count a zero-length booking as busy for windows strictly around
+    # it, so it splits the gap it falls in
+    points = [start for start, end in intervals if start == end]
+    if points:
+        split = []
+        for start, end in gaps:
+            for point in points:
+                if start < point < end:
+                    split.append((start, point))
+                    start = point
+            split.append((start, end))
+        gaps = split
+    return gaps
+
+
+def interval_rows(rooms, busy, days):
+    """Yield FREE_INTERVAL_COLUMNS rows for every room on every day in days."""
+    empty = {}
+    for day in days:
+        date = day_text(day)
+        for room_number, building in rooms:
+            for start, end in day_gaps(day, busy.get((room_number, building), empty).get(day, ())):
+                yield (room_number, building, date, format_minutes(start), format_minutes(end))
+
+
+def touched_days(*booking_lists):
+    """Days touched by any of the given booking rows (e.g. a delta's deleted and inserted rows)."""
+    days = set()
+    for rows in booking_lists:
+        for row in rows:
+            if row[2] and row[3]:
+                start = _minutes(row[2])
+                days.update(booking_days(start, max(_minutes(row[3]), start)))
+    return days
+
+
+def covered_days(bookings):
+    """Every day from the first to the last booked day, as days since EPOCH."""
+    days = touched_days(bookings)
+    return range(min(days), max(days) + 1) if days else range(0)
+
+
+def busy_covered_days(busy):
+    """covered_days() of the bookings a busy_by_day() result was built from."""
+    days = [day for room_days in busy.values() for day in room_days]
+    return range(min(days), max(days) + 1) if days else range(0)
+
+# ==========================================
+# OUTPUT
+# ==========================================
+
+def write_free_intervals_csv(rows, filename):
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(FREE_INTERVAL_COLUMNS)
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    print(f"Exported {count} free intervals to {filename}")
+    return count
+
+
+def export_free_intervals_csv(rooms_csv, bookings_csv, filename):
+    """Compute the free intervals of a rooms/bookings CSV pair and write them to filename."""
+    booking_rows = _read_rows(bookings_csv)
+    rooms = [(row[0], row[1]) for row in _read_rows(rooms_csv)]
+    return write_free_intervals_csv(interval_rows(rooms, busy_by_day(booking_rows), covered_days(booking_rows)),
+                                    filename)
+
+
+def write_refresh_sql(sql, rooms, busy, days, added_rooms=(), all_days=()):
+    """
+    Replace the Free_Intervals rows of `days` for every room, and mark those
+    days complete in Free_Interval_Days.
+
+    added_rooms (rooms new since the last load) also get rows for the rest
+    of all_days, so days that are already complete stay complete.
+    """
+    days = sorted(days)
+    added_rooms = sorted(added_rooms)
+    other_days = sorted(set(all_days) - set(days)) if added_rooms else []
+    day_array = "'{" + ",".join(day_text(day) for day in days) + "}'::date[]"
+
+    sql.write_sql(f"\n-- Free intervals for {len(days)} days")
+    if days:
+        sql.write_sql(f"DELETE FROM {FREE_INTERVAL_DAYS_TABLE} WHERE day = ANY({day_array});")
+        sql.write_sql(f"DELETE FROM {FREE_INTERVALS_TABLE} WHERE day = ANY({day_array});")
+    if added_rooms and other_days:
+        values = ",\n".join(sql.sql_values(('room_number', 'building'), room) for room in added_rooms)
+        sql.write_sql(
+            f"DELETE FROM {FREE_INTERVALS_TABLE} f USING (VALUES\n{values}\n) AS d(room_number, building)\n"
+            f"WHERE f.room_number = d.room_number AND f.building = d.building;"
+        )
+
+    count = sql.write_rows(FREE_INTERVALS_TABLE, FREE_INTERVAL_COLUMNS, interval_rows(rooms, busy, days))
+    count += sql.write_rows(FREE_INTERVALS_TABLE, FREE_INTERVAL_COLUMNS, interval_rows(added_rooms, busy, other_days))
+    sql.write_rows(FREE_INTERVAL_DAYS_TABLE, ('day',), ((day_text(day),) for day in days))
+    print(f"✅ Exported {count} Free Intervals for {len(days)} days to '{sql.filename}'")
+    return count
+
+
+def write_snapshot_sql(sql, room_rows, busy):
+    """
+    Full refresh: free intervals for every day the snapshot covers.
+
+    busy is busy_by_day() of the snapshot's bookings, so they can be
+    streamed in rather than held as rows.
+    """
+    rooms = [(row[0], row[1]) for row in room_rows]
+    return write_refresh_sql(sql, rooms, busy, busy_covered_days(busy))
+
+
+def _read_rows(filename):
+    with open(filename, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        return [tuple(row) for row in reader]
+
+
+if __name__ == "__main__":
+    # Imported here: snapshot_diff imports this module for delta refreshes
+    from snapshot_diff import latest_snapshots
+
+    parser = argparse.ArgumentParser(description='Precompute per-room, per-day free intervals from scraper CSVs')
+    parser.add_argument('--output-dir', type=str, default='output',
+                        help='Use the newest rooms/bookings CSV pair in this directory (default: output)')
+    parser.add_argument('--rooms-csv', type=str)
+    parser.add_argument('--bookings-csv', type=str)
+    parser.add_argument('--out', type=str, help='Write the free intervals to this CSV')
+    parser.add_argument('--sql-out', type=str, help='Write a SQL file that refreshes Free_Intervals for every covered day')
+    parser.add_argument('--style', choices=SQL_STYLES, default=DEFAULT_SQL_STYLE,
+                        help=f'--sql-out format (default: {DEFAULT_SQL_STYLE})')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.rooms_csv and args.bookings_csv:
+        rooms_csv, bookings_csv = args.rooms_csv, args.bookings_csv
+    else:
+        snapshots = latest_snapshots(args.output_dir, count=1)
+        if not snapshots:
+            raise SystemExit(f"No snapshots found in {args.output_dir}")
+        rooms_csv, bookings_csv = snapshots[0]
+    if not (args.out or args.sql_out):
+        parser.error("nothing to do: give --out and/or --sql-out")
+
+    if args.out:
+        export_free_intervals_csv(rooms_csv, bookings_csv, args.out)
+    if args.sql_out:
+        with SQLFileHandler(args.sql_out, args.style, args.batch_size) as sql:
+            write_snapshot_sql(sql, _read_rows(rooms_csv), busy_by_day(_read_rows(bookings_csv)))
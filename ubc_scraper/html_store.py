@@ -0,0 +1,193 @@
+# ==========================================
+# Content-addressed HTML store
+# Week pages are stored compressed under the SHA-256 of their content,
+# so identical pages are kept once and old downloads stay cheap on disk
+# ==========================================
+#
+# Layout inside the HTML cache directory:
+#   blobs/ab/abcdef....html.gz    compressed page (or .html.zst)
+#   history.jsonl                 one line per download: week, time, blob
+#   week_NNN.json                 current metadata, with 'blob' and 'codec'
+#
+# Usage:
+#   python html_store.py stats --cache-dir html_cache
+#   python html_store.py gc --cache-dir html_cache [--keep-days 60]
+
+import os
+import glob
+import gzip
+import json
+import hashlib
+import threading
+import argparse
+from datetime import datetime, timedelta
+
+try:
+    import zstandard
+except ImportError:  # optional: gzip is always available
+    zstandard = None
+
+CODECS = ('none', 'gzip', 'zstd')
+DEFAULT_CODEC = 'gzip'
+CODEC_EXTENSIONS = {'gzip': '.html.gz', 'zstd': '.html.zst'}
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+
+BLOB_DIR = 'blobs'
+HISTORY_FILE = 'history.jsonl'
+
+
+def content_digest(data):
+    """SHA-256 hex digest of a page's UTF-8 bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def blob_path(cache_dir, digest, codec):
+    return os.path.join(cache_dir, BLOB_DIR, digest[:2], digest + CODEC_EXTENSIONS[codec])
+
+
+def check_codec(codec):
+    """Fail early if a codec's optional dependency is missing."""
+    if codec == 'zstd' and zstandard is None:
+        raise RuntimeError("zstd codec requires the 'zstandard' package (pip install zstandard)")
+
+
+def put_blob(cache_dir, data, codec):
+    """
+    Store page bytes under their content hash and return the digest.
+
+    An existing blob is left untouched, which deduplicates identical pages.
+    """
+    check_codec(codec)
+    digest = content_digest(data)
+    path = blob_path(cache_dir, digest, codec)
+    if os.path.exists(path):
+        return digest
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if codec == 'zstd':
+        compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    else:
+        compressed = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+    # Write then rename, so concurrent downloaders never see a partial blob
+    # (temp name per thread: HTTP download sessions share one process)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(compressed)
+    os.replace(tmp_path, path)
+    return digest
+
+
+def open_blob(cache_dir, digest, codec):
+    """Open a blob as a binary stream that decompresses while it is read."""
+    path = blob_path(cache_dir, digest, codec)
+    if codec == 'zstd':
+        check_codec(codec)
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return gzip.open(path, 'rb')
+
+
+def record_history(cache_dir, metadata):
+    """Append a download to the history log so gc can keep older pages."""
+    with open(os.path.join(cache_dir, HISTORY_FILE), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(metadata, separators=(',', ':')) + "\n")
+
+# ==========================================
+# MAINTENANCE
+# ==========================================
+
+def _all_blobs(cache_dir):
+    blobs = {}
+    for path in glob.glob(os.path.join(cache_dir, BLOB_DIR, '*', '*')):
+        name = os.path.basename(path)
+        if name.endswith('.tmp'):
+            continue
+        blobs[name.split('.', 1)[0], '.' + name.split('.', 1)[1]] = path
+    return blobs
+
+
+def _current_references(cache_dir):
+    references = set()
+    for metadata_filename in glob.glob(os.path.join(cache_dir, 'week_*.json')):
+        with open(metadata_filename, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        if metadata.get('blob'):
+            references.add((metadata['blob'], CODEC_EXTENSIONS[metadata['codec']]))
+    return references
+
+
+def gc(cache_dir, keep_days=None, dry_run=False):
+    """
+    Delete blobs no longer referenced by any week metadata or kept history.
+
+    History entries older than keep_days are dropped first (all history is
+    kept when keep_days is None). Returns (blobs removed, bytes freed).
+    """
+    references = _current_references(cache_dir)
+
+    history_filename = os.path.join(cache_dir, HISTORY_FILE)
+    kept_history = []
+    if os.path.exists(history_filename):
+        cutoff = datetime.now() - timedelta(days=keep_days) if keep_days is not None else None
+        with open(history_filename, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if cutoff and datetime.fromisoformat(entry['download_time']) < cutoff:
+                    continue
+                kept_history.append(line)
+                references.add((entry['blob'], CODEC_EXTENSIONS[entry['codec']]))
+
+    removed = 0
+    freed = 0
+    for key, path in _all_blobs(cache_dir).items():
+        if key in references:
+            continue
+        removed += 1
+        freed += os.path.getsize(path)
+        if not dry_run:
+            os.remove(path)
+
+    if not dry_run and os.path.exists(history_filename):
+        tmp_filename = history_filename + '.tmp'
+        with open(tmp_filename, 'w', encoding='utf-8') as f:
+            f.writelines(kept_history)
+        os.replace(tmp_filename, history_filename)
+
+    return removed, freed
+
+
+def stats(cache_dir):
+    """Return blob count, compressed bytes and download count for a cache directory."""
+    blobs = _all_blobs(cache_dir)
+    compressed = sum(os.path.getsize(path) for path in blobs.values())
+    downloads = 0
+    history_filename = os.path.join(cache_dir, HISTORY_FILE)
+    if os.path.exists(history_filename):
+        with open(history_filename, 'r', encoding='utf-8') as f:
+            downloads = sum(1 for line in f if line.strip())
+    return {'blobs': len(blobs), 'compressed_bytes': compressed, 'downloads': downloads}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Maintain the compressed HTML cache')
+    parser.add_argument('command', choices=['gc', 'stats'])
+    parser.add_argument('--cache-dir', type=str, default='html_cache',
+                        help='HTML cache directory (default: html_cache)')
+    parser.add_argument('--keep-days', type=int, default=None,
+                        help='gc: keep pages downloaded in the last N days (default: keep all history)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='gc: report what would be removed without deleting')
+    args = parser.parse_args()
+
+    if args.command == 'gc':
+        removed, freed = gc(args.cache_dir, args.keep_days, args.dry_run)
+        verb = "Would remove" if args.dry_run else "Removed"
+        print(f"{verb} {removed} unreferenced blobs ({freed / 1e6:.1f} MB)")
+    else:
+        info = stats(args.cache_dir)
+        print(f"{info['blobs']} blobs, {info['compressed_bytes'] / 1e6:.1f} MB compressed, "
+              f"{info['downloads']} downloads in history")
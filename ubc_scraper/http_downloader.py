@@ -0,0 +1,293 @@
+# ==========================================
+# UBC Online Timetable - HTTP Downloader
+# Browserless Phase 1 backend: replays the ASP.NET form postbacks
+# over pooled HTTP sessions instead of driving Chrome
+# ==========================================
+
+import re
+import time
+import queue
+import threading
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from bs4 import BeautifulSoup
+
+from week_cache import (
+    is_week_option, WeekPlan, room_shards, week_label, cache_paths, write_week_cache,
+    discard_stale_shards
+)
+from html_store import DEFAULT_CODEC
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+
+DOWNLOAD_CONCURRENCY = 4  # Weeks fetched at once (one HTTP session each)
+REQUEST_TIMEOUT = 120     # Seconds; full-term timetable pages are large
+MAX_RETRIES = 3
+
+ALL_DAY_PERIOD = "0-30"   # dlPeriod value for "All Day 07:00 - 22:00"
+
+# The timetable is opened in a popup by client-side script after the postback
+WINDOW_OPEN_PATTERN = re.compile(r'''window\.open\(\s*['"]([^'"]+)['"]''')
+
+# Form controls that are set explicitly for every timetable request
+TIMETABLE_CONTROLS = ('lbWeeks', 'dlObject', 'dlPeriod', 'bGetTimetable')
+
+# ==========================================
+# FORM STATE
+# ==========================================
+
+def extract_form_state(html):
+    """
+    Read the ASP.NET form on a page.
+
+    Returns (action, fields, selects) where fields is a list of (name, value)
+    pairs the browser would post (hidden inputs incl. __VIEWSTATE, text
+    inputs, checked boxes and selected options) and selects maps each
+    <select> name to its [(value, text), ...] options.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    form = soup.find('form') or soup
+
+    fields = []
+    selects = {}
+
+    for tag in form.find_all('input'):
+        name = tag.get('name')
+        if not name:
+            continue
+        input_type = (tag.get('type') or 'text').lower()
+        if input_type in ('submit', 'button', 'image', 'reset', 'file'):
+            continue
+        if input_type in ('checkbox', 'radio') and not tag.has_attr('checked'):
+            continue
+        fields.append((name, tag.get('value', '')))
+
+    for tag in form.find_all('select'):
+        name = tag.get('name')
+        if not name:
+            continue
+        options = []
+        for option in tag.find_all('option'):
+            value = option.get('value', option.get_text(strip=True))
+            options.append((value, option.get_text(strip=True)))
+            if option.has_attr('selected'):
+                fields.append((name, value))
+        selects[name] = options
+
+    action = form.get('action') if form is not soup else None
+    return action, fields, selects
+
+
+def _find_submit_value(html, control_id):
+    """Return the value attribute of a submit button, if present."""
+    soup = BeautifulSoup(html, 'html.parser')
+    button = soup.find(id=control_id)
+    if button is None:
+        return None
+    return button.get('value', '')
+
+
+class TimetableSession:
+    """
+    One HTTP session against the SWS site.
+
+    ASP.NET keeps the selected timetable in server-side session state between
+    the bGetTimetable postback and the popup page, so each concurrent request
+    needs its own session (cookie jar).
+    """
+
+    def __init__(self, base_url, timeout=REQUEST_TIMEOUT):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.http = requests.Session()
+        self.form_url = None
+        self.fields = None
+        self.selects = None
+        self.button_value = None
+
+    def _update_form(self, response):
+        action, fields, selects = extract_form_state(response.text)
+        self.form_url = urljoin(response.url, action) if action else response.url
+        self.fields = fields
+        self.selects = selects
+
+    def _postback(self, event_target):
+        data = [(k, v) for k, v in self.fields
+                if k not in ('__EVENTTARGET', '__EVENTARGUMENT')]
+        data += [('__EVENTTARGET', event_target), ('__EVENTARGUMENT', '')]
+        response = self.http.post(self.form_url, data=data, timeout=self.timeout)
+        response.raise_for_status()
+        return response
+
+    def open(self):
+        """Load the start page and switch to General Teaching Spaces."""
+        response = self.http.get(self.base_url, timeout=self.timeout)
+        response.raise_for_status()
+        self._update_form(response)
+
+        # Click General Teaching Spaces
+        response = self._postback('LinkBtn_locationByZone')
+        self._update_form(response)
+        self.button_value = _find_submit_value(response.text, 'bGetTimetable')
+
+        if 'lbWeeks' not in self.selects or 'dlObject' not in self.selects:
+            raise RuntimeError("Timetable form not found after LinkBtn_locationByZone postback")
+        return self
+
+    def week_options(self):
+        return self.selects['lbWeeks']
+
+    def room_values(self, debug):
+        values = [value for value, _ in self.selects['dlObject']]
+        # Select first 30 rooms for debug mode
+        return values[:30] if debug else values
+
+    def fetch_week(self, week_value, room_values):
+        """Submit the timetable form for one week and return the timetable HTML."""
+        data = [(k, v) for k, v in self.fields
+                if k not in TIMETABLE_CONTROLS and k not in ('__EVENTTARGET', '__EVENTARGUMENT')]
+        data += [('__EVENTTARGET', ''), ('__EVENTARGUMENT', '')]
+        data.append(('lbWeeks', week_value))
+        data += [('dlObject', value) for value in room_values]
+        data.append(('dlPeriod', ALL_DAY_PERIOD))
+        data.append(('bGetTimetable', self.button_value or ''))
+
+        response = self.http.post(self.form_url, data=data, timeout=self.timeout)
+        response.raise_for_status()
+
+        # Keep the latest viewstate for the next postback on this session
+        popup = WINDOW_OPEN_PATTERN.search(response.text)
+        if popup:
+            self._update_form(response)
+            response = self.http.get(urljoin(response.url, popup.group(1)), timeout=self.timeout)
+            response.raise_for_status()
+
+        return response.text
+
+    def close(self):
+        self.http.close()
+
+# ==========================================
+# PHASE 1: HTML DOWNLOAD (HTTP)
+# ==========================================
+
+def download_week_htmls_http(cache_dir, debug, base_url, concurrency=DOWNLOAD_CONCURRENCY, room_shard_size=0,
+                             on_week_saved=None, codec=DEFAULT_CODEC, plan=None):
+    """
+    Download all week HTMLs by replaying the form postbacks over HTTP.
+
+    With room_shard_size set, each week is requested as several smaller
+    timetables of that many rooms, each saved as its own cache pair.
+
+    on_week_saved(file_tuple), if given, is called for every cached or newly
+    saved week as soon as it is on disk (possibly from worker threads).
+
+    plan (a week_cache.WeekPlan) selects the weeks and the refresh policy.
+    """
+
+    print("=" * 60)
+    print(f"PHASE 1: Downloading HTML pages (HTTP, {concurrency} sessions)")
+    print("=" * 60)
+
+    first = TimetableSession(base_url).open()
+    week_options = first.week_options()
+    room_values = first.room_values(debug)
+    shards = room_shards(len(room_values), room_shard_size)
+    print(f"Selected {len(room_values)} rooms{' (DEBUG mode)' if debug else ''}"
+          + (f" in {len(shards)} shards" if shards[0] is not None else ""))
+
+    if plan is None:
+        plan = WeekPlan(debug)
+
+    downloaded = {}
+    pending = []
+
+    for i, (week_value, week_text) in enumerate(week_options):
+        # Skip non-week entries
+        if not is_week_option(week_text):
+            continue
+        if not plan.selects(i, week_text):
+            continue
+
+        discard_stale_shards(cache_dir, i, shards)
+        for shard in shards:
+            label = week_label(i, shard)
+            cache_filename, metadata_filename = cache_paths(cache_dir, i, shard)
+
+            # Skip if cached and the refresh policy keeps it
+            download, reason = plan.needs_download(cache_filename, metadata_filename, week_text)
+            if not download:
+                print(f"[{label}] Cached ({reason}): {week_text}")
+                downloaded[(i, shard)] = (cache_filename, metadata_filename)
+                if on_week_saved:
+                    on_week_saved(downloaded[(i, shard)])
+                continue
+
+            if reason != "not cached":
+                print(f"[{label}] Refreshing ({reason}): {week_text}")
+            pending.append((i, week_value, week_text, shard))
+
+    # Session pool: each worker borrows a session for one week at a time
+    sessions = queue.Queue()
+    sessions.put(first)
+    opened = [first]
+    opened_lock = threading.Lock()
+
+    def borrow_session():
+        try:
+            return sessions.get_nowait()
+        except queue.Empty:
+            session = TimetableSession(base_url).open()
+            with opened_lock:
+                opened.append(session)
+            return session
+
+    def fetch(i, week_value, week_text, shard):
+        label = week_label(i, shard)
+        shard_rooms = room_values if shard is None else room_values[shard[1]:shard[2]]
+        last_error = None
+        for attempt in range(1, MAX_RETRIES + 1):
+            session = borrow_session()
+            try:
+                print(f"[{label}] Downloading: {week_text}" + (f" (retry {attempt - 1})" if attempt > 1 else ""))
+                began = time.perf_counter()
+                html = session.fetch_week(week_value, shard_rooms)
+                download_seconds = time.perf_counter() - began
+                break
+            except (requests.RequestException, RuntimeError) as e:
+                # Drop the session; its server-side state may be inconsistent
+                last_error = e
+                session.close()
+        else:
+            raise RuntimeError(f"{label} failed after {MAX_RETRIES} attempts: {last_error}")
+
+        # Saving is not retried and does not close the session: a cache or
+        # on_week_saved error says nothing about the connection
+        try:
+            file_tuple = write_week_cache(cache_dir, i, week_text, html, shard, codec, download_seconds)
+            if on_week_saved:
+                on_week_saved(file_tuple)
+        finally:
+            sessions.put(session)
+        return file_tuple
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            futures = {executor.submit(fetch, *job): (job[0], job[3]) for job in pending}
+            for future in as_completed(futures):
+                i, shard = futures[future]
+                try:
+                    downloaded[(i, shard)] = future.result()
+                except Exception as e:
+                    print(f"[{week_label(i, shard)}] Error downloading week: {e}")
+    finally:
+        for session in opened:
+            session.close()
+
+    downloaded_files = [downloaded[key] for key in sorted(downloaded, key=lambda k: (k[0], k[1] or ()))]
+    print(f"\nDownloaded {len(downloaded_files)} {'week shards' if shards[0] is not None else 'weeks'}")
+    return downloaded_files
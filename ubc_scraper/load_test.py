@@ -0,0 +1,137 @@
+# ==========================================
+# Query service load test
+# Fires free-room RPC calls at query_service.py (or any PostgREST
+# endpoint with the same functions) and reports latency and throughput
+# ==========================================
+#
+# Each worker keeps one HTTP/1.1 connection open and sends requests back
+# to back. Windows are drawn from the snapshot's booked days; --distinct
+# bounds how many different windows are used, so it sets how often the
+# service's cache is hit.
+#
+# Usage:
+#   python load_test.py --url http://127.0.0.1:8766 --requests 5000 --concurrency 32
+#   python load_test.py --url http://127.0.0.1:8766 --distinct 100000 --rpc free_rooms_list
+#   python load_test.py --url https://<project>.supabase.co --apikey $SUPABASE_ANON_KEY --requests 200
+
+import json
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+from snapshot_diff import latest_snapshots
+
+RPC_PREFIX = '/rest/v1/rpc/'
+RPCS = ('free_rooms_per_building', 'free_rooms_list')
+
+
+def booked_days(bookings_csv):
+    days = set()
+    with open(bookings_csv, 'r', encoding='utf-8') as f:
+        next(f, None)  # header
+        for line in f:
+            fields = line.split(',', 3)
+            if len(fields) > 2 and fields[2]:
+                days.add(fields[2][:10])
+    return sorted(days)
+
+
+def make_windows(days, count, seed=0):
+    """count distinct-ish windows: half-hour aligned, 30 minutes to 3 hours, 07:00-22:00."""
+    rng = random.Random(seed)
+    windows = []
+    for _ in range(count):
+        midnight = datetime.strptime(rng.choice(days), '%Y-%m-%d')
+        start = midnight + timedelta(minutes=30 * rng.randrange(14, 44))
+        end = start + timedelta(minutes=30 * rng.choice((1, 2, 3, 6)))
+        windows.append((start.strftime('%Y-%m-%d %H:%M:%S'), end.strftime('%Y-%m-%d %H:%M:%S')))
+    return windows
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def _open(url):
+    port = url.port or (443 if url.scheme == 'https' else 80)
+    return await asyncio.open_connection(url.hostname, port, ssl=url.scheme == 'https')
+
+
+async def worker(url, headers, jobs, latencies, errors):
+    """Send requests from jobs over one keep-alive connection, reconnecting if the server closes it."""
+    reader, writer = await _open(url)
+    try:
+        while jobs:
+            rpc, (p_start, p_end) = jobs.pop()
+            body = json.dumps({'p_start': p_start, 'p_end': p_end}).encode('utf-8')
+            request = (f"POST {url.path.rstrip('/')}{RPC_PREFIX}{rpc} HTTP/1.1\r\n"
+                       f"Host: {url.netloc}\r\n{headers}"
+                       f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode('latin-1') + body
+
+            began = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            status_line, _, header_text = head.decode('latin-1').partition('\r\n')
+            response_headers = {}
+            for line in header_text.split('\r\n'):
+                name, _, value = line.partition(':')
+                response_headers[name.strip().lower()] = value.strip()
+            await reader.readexactly(int(response_headers.get('content-length', 0)))
+            latencies.append(time.perf_counter() - began)
+
+            if status_line.split()[1] != '200':
+                errors.append(status_line)
+            if response_headers.get('connection', '').lower() == 'close':
+                writer.close()
+                reader, writer = await _open(url)
+    finally:
+        writer.close()
+
+
+async def run_load(url, headers, jobs, concurrency):
+    latencies = []
+    errors = []
+    began = time.perf_counter()
+    await asyncio.gather(*(worker(url, headers, jobs, latencies, errors) for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - began
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load-test the free-room query service')
+    parser.add_argument('--url', type=str, default='http://127.0.0.1:8766', help='Service base URL')
+    parser.add_argument('--output-dir', type=str, default='output',
+                        help='Take booked days from the newest bookings CSV here (default: output)')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=32, help='Open connections (default: 32)')
+    parser.add_argument('--distinct', type=int, default=500,
+                        help='Different windows to draw requests from (default: 500)')
+    parser.add_argument('--rpc', choices=RPCS, default=None,
+                        help='Only call this function (default: alternate both, like the widget)')
+    parser.add_argument('--apikey', type=str, default=None, help='Send apikey/Authorization headers (Supabase)')
+    args = parser.parse_args()
+
+    snapshots = latest_snapshots(args.output_dir, count=1)
+    if not snapshots:
+        raise SystemExit(f"No snapshots found in {args.output_dir}")
+    windows = make_windows(booked_days(snapshots[0][1]), args.distinct)
+
+    rng = random.Random(1)
+    rpcs = (args.rpc,) if args.rpc else RPCS
+    jobs = [(rpcs[i % len(rpcs)], rng.choice(windows)) for i in range(args.requests)]
+    headers = f"apikey: {args.apikey}\r\nAuthorization: Bearer {args.apikey}\r\n" if args.apikey else ""
+
+    print(f"{args.requests} requests, {args.concurrency} connections, {len(windows)} distinct windows "
+          f"-> {args.url}")
+    latencies, errors, elapsed = asyncio.run(run_load(urlsplit(args.url), headers, jobs, args.concurrency))
+
+    ordered = sorted(latencies)
+    print(f"  throughput  {len(latencies) / elapsed:9.0f} req/s ({elapsed:.2f} s)")
+    print(f"  p50         {percentile(ordered, 0.50) * 1000:9.3f} ms")
+    print(f"  p99         {percentile(ordered, 0.99) * 1000:9.3f} ms")
+    print(f"  max         {ordered[-1] * 1000:9.3f} ms")
+    print(f"  errors      {len(errors):9d}" + (f"  (first: {errors[0]})" if errors else ""))
+    raise SystemExit(1 if errors else 0)
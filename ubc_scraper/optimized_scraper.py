@@ -4,37 +4,57 @@
 # Modified to export CSV instead of SQL
 # Version: 2.3 (with enhanced debugging)
 # ==========================================
+#
+# Stages (each can also run on its own, see parse_arguments):
+#   download   Phase 1: week pages into the HTML cache (selenium_downloader.py
+#              or http_downloader.py, imported only when they run)
+#   parse      Phase 2: cached pages into the parse cache (parse_cache.py)
+#   export     Phase 3: the parse cache into the CSVs and optional outputs
+#   query      free-room queries from an export (room_index.py)
+#
+# Usage:
+#   python optimized_scraper.py --rooms-csv output/rooms.csv --bookings-csv output/bookings.csv
+#   python optimized_scraper.py download --downloader http --weeks 17-30
+#   python optimized_scraper.py parse --weeks 17-30 --parser lxml
+#   python optimized_scraper.py export --weeks 17-30 --rooms-csv output/rooms.csv --bookings-csv output/bookings.csv
+#   python optimized_scraper.py query --start "2025-12-02 10:00" --end "2025-12-02 11:00"
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import Select
-from selenium.webdriver.support.ui import WebDriverWait
-from bs4 import BeautifulSoup
-import re
-from datetime import datetime, timedelta
+from datetime import datetime, date
 import os
-import json
 import csv
+import json
+import time
+import shutil
 import argparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from week_cache import (
+    WeekPlan, REFRESH_POLICIES, DEFAULT_REFRESH_POLICY, load_metadata, read_week_html, html_digest,
+    cached_weeks
+)
+from html_store import CODECS, DEFAULT_CODEC, check_codec
+from sql_file_handler import SQL_STYLES, DEFAULT_SQL_STYLE, export_csvs_to_sql
+import parse_cache
+from run_metrics import RunMetrics, report_path, print_summary
+from parse_common import (
+    ROOM_PATTERN, WEEK_PATTERN, CAPACITY_PATTERN, WEEKDAYS, FEATURES_SELECTOR, BOOKING_FIELDS, Booking,
+    week_start_from_match, split_features, decode_grid
+)
 
 # ==========================================
 # CONFIGURATION
 # ==========================================
 
-MAX_WORKERS = 8  # Parallel processing threads
-
-# Compile regex patterns once (significant speedup)
-ROOM_PATTERN = re.compile(r'Location Timetable:\s*([A-Z]+)\s*([A-Z]?\d+[A-Z]?)')
-WEEK_PATTERN = re.compile(r'Exported Weeks:\d+,\s*(\d{2}/\d{2}/\d{2})')
-CAPACITY_PATTERN = re.compile(r'Capacity:\s*(\d+)', re.IGNORECASE)
-DETAILS_PATTERN = re.compile(
-    r'(.+?)\s*/([A-Z0-9]+)\s*/(\d+)\s*\n([^\n]*)\n([A-Z]+)\n(\d+-\d+)',
-    re.DOTALL | re.MULTILINE
-)
-TIME_PATTERN = re.compile(r'^\d{1,2}:\d{2}$')
+MAX_WORKERS = os.cpu_count() or 8  # Parallel parsing workers (default: one per core)
+PARSE_EXECUTORS = ('thread', 'process')  # process escapes the GIL for CPU-bound parsing
+PARSE_CHUNK_SIZE = 2  # Weeks per process-pool task
+MAX_DOWNLOAD_WORKERS = 8  # Upper bound on concurrent Chrome drivers
 
-WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+PARSER_ENGINES = ('bs4', 'lxml')  # Phase 2 backends (lxml needs the lxml package)
+DEFAULT_PARSER = 'bs4'
 
 # Change the following to have the correct year
 WEB_URL = 'https://sws-van.as.it.ubc.ca/SWS_2025/'
@@ -43,9 +63,9 @@ WEB_URL = 'https://sws-van.as.it.ubc.ca/SWS_2025/'
 # ARGUMENT PARSING
 # ==========================================
 
-def parse_arguments():
-    """Parse command line arguments."""
-    parser = argparse.ArgumentParser(description='UBC Timetable Scraper - CSV Export')
+def week_options():
+    """Options shared by every stage that reads the HTML cache: where it is and which weeks."""
+    parser = argparse.ArgumentParser(add_help=False)
     parser.add_argument(
         '--cache-dir',
         type=str,
@@ -57,6 +77,127 @@ def parse_arguments():
         action='store_true',
         help='Enable debug mode (limits weeks and rooms for testing)'
     )
+    parser.add_argument(
+        '--weeks',
+        type=str,
+        default=None,
+        help='lbWeeks indices to scrape, e.g. 17-30,35 or 20- (default: the built-in week limiters)'
+    )
+    parser.add_argument(
+        '--from-date',
+        type=date.fromisoformat,
+        default=None,
+        help='Only scrape weeks overlapping this date onwards, YYYY-MM-DD'
+    )
+    parser.add_argument(
+        '--to-date',
+        type=date.fromisoformat,
+        default=None,
+        help='Only scrape weeks starting on or before this date, YYYY-MM-DD'
+    )
+    return parser
+
+
+def download_options():
+    """Phase 1 options."""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        '--cache-codec',
+        choices=CODECS,
+        default=DEFAULT_CODEC,
+        help=f'Store downloaded pages compressed and deduplicated by content, or as plain week_NNN.html (default: {DEFAULT_CODEC})'
+    )
+    parser.add_argument(
+        '--download-workers',
+        type=int,
+        default=1,
+        help=f'Parallel Chrome drivers for the selenium downloader (default: 1, max: {MAX_DOWNLOAD_WORKERS})'
+    )
+    parser.add_argument(
+        '--room-shard-size',
+        type=int,
+        default=0,
+        help='Request each week in chunks of this many rooms, one cache file per chunk (default: 0, all rooms at once)'
+    )
+    parser.add_argument(
+        '--downloader',
+        choices=['selenium', 'http'],
+        default='selenium',
+        help='Phase 1 backend: drive Chrome, or replay the form postbacks over HTTP (default: selenium)'
+    )
+    parser.add_argument(
+        '--download-concurrency',
+        type=int,
+        default=None,
+        help='Weeks fetched at once by the http downloader (default: DOWNLOAD_CONCURRENCY in http_downloader.py)'
+    )
+    parser.add_argument(
+        '--url',
+        type=str,
+        default=WEB_URL,
+        help=f'Timetable start page (default: {WEB_URL})'
+    )
+    parser.add_argument(
+        '--refresh-policy',
+        choices=REFRESH_POLICIES,
+        default=DEFAULT_REFRESH_POLICY,
+        help='cached: only download missing weeks; changing: also re-download current and future weeks '
+             'older than --week-ttl (past weeks never change); all: re-download everything '
+             f'(default: {DEFAULT_REFRESH_POLICY})'
+    )
+    parser.add_argument(
+        '--week-ttl',
+        type=float,
+        default=0,
+        help='Hours a current/future week stays fresh under --refresh-policy changing (default: 0, always refresh)'
+    )
+    return parser
+
+
+def parse_cache_options():
+    """Where parsed weeks are kept: the parse stage writes them, the export stage reads them."""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        '--parse-cache-dir',
+        type=str,
+        default=parse_cache.DEFAULT_PARSE_CACHE_DIR,
+        help=f'Reuse parse results for unchanged week HTML (default: {parse_cache.DEFAULT_PARSE_CACHE_DIR})'
+    )
+    return parser
+
+
+def parse_options():
+    """Phase 2 options."""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        '--parser',
+        choices=PARSER_ENGINES,
+        default=DEFAULT_PARSER,
+        help=f'Phase 2 parser engine; lxml is much faster and gives identical output (default: {DEFAULT_PARSER})'
+    )
+    parser.add_argument(
+        '--executor',
+        choices=PARSE_EXECUTORS,
+        default='thread',
+        help='Phase 2 worker pool; process uses every core for parsing (default: thread)'
+    )
+    parser.add_argument(
+        '--parse-workers',
+        type=int,
+        default=MAX_WORKERS,
+        help=f'Phase 2 worker count (default: {MAX_WORKERS}, the number of cores)'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Run Phase 2 under cProfile (parse cache off); saves a .prof next to the run report and lists the hottest functions'
+    )
+    return parser
+
+
+def export_options():
+    """Phase 3 options: the CSVs and every optional output built from them."""
+    parser = argparse.ArgumentParser(add_help=False)
     parser.add_argument(
         '--rooms-csv',
         type=str,
@@ -69,160 +210,174 @@ def parse_arguments():
         default='bookings.csv',
         help='Output CSV file for bookings data (default: bookings.csv)'
     )
-    return parser.parse_args()
+    parser.add_argument(
+        '--columnar-dir',
+        type=str,
+        default=None,
+        help='Also write the bookings as memory-mappable .npy columns, week by week (see columnar_export.py)'
+    )
+    parser.add_argument(
+        '--recurrences-csv',
+        type=str,
+        default=None,
+        help='Also write the bookings compacted into weekly recurrence rules (see recurrence.py)'
+    )
+    parser.add_argument(
+        '--free-intervals-csv',
+        type=str,
+        default=None,
+        help='Also write every room\'s free intervals per day (see free_intervals.py)'
+    )
+    parser.add_argument(
+        '--room-features-csv',
+        type=str,
+        default=None,
+        help='Also write each room\'s feature bitmask; feature IDs are kept in features.csv next to it (see room_features.py)'
+    )
+    parser.add_argument(
+        '--sql-out',
+        type=str,
+        default=None,
+        help='Also write a SQL load file for Supabase/PostgreSQL built from the exported CSVs'
+    )
+    parser.add_argument(
+        '--sql-style',
+        choices=SQL_STYLES,
+        default=DEFAULT_SQL_STYLE,
+        help=f'--sql-out format: insert, batch (multi-row INSERTs) or copy (COPY FROM stdin, psql only) (default: {DEFAULT_SQL_STYLE})'
+    )
+    return parser
 
-# ==========================================
-# PHASE 1: HTML DOWNLOAD (Selenium)
-# ==========================================
 
-def download_week_htmls(cache_dir, debug):
-    """Download all week HTMLs using Selenium. This cannot be parallelized."""
-    
-    print("=" * 60)
-    print("PHASE 1: Downloading HTML pages")
-    print("=" * 60)
-    
-    driver = webdriver.Chrome()
-    
-    try:
-        # Open website
-        driver.get(WEB_URL)
-        print(f"Opened: {driver.title}")
-
-        # Click General Teaching Spaces
-        gts_button = driver.find_element(by='xpath', value='//*[@id="LinkBtn_locationByZone"]')
-        driver.execute_script("arguments[0].click();", gts_button)
-
-        # Get possible weeks
-        week_list = driver.find_element(by='xpath', value='//*[@id="lbWeeks"]')
-        week_options = week_list.find_elements(By.TAG_NAME, "option")
-
-        # Select all rooms
-        room_list = driver.find_element(By.ID, "dlObject")
-        if debug:
-            # Select first 30 rooms for debug mode
-            driver.execute_script("""
-                var select = arguments[0];
-                for (var i = 0; i < Math.min(30, select.options.length); i++) {
-                    select.options[i].selected = true;
-                }
-            """, room_list)
-            print("Selected 30 rooms (DEBUG mode)")
-        else:
-            driver.execute_script("""
-                var select = arguments[0];
-                for (var i = 0; i < select.options.length; i++) {
-                    select.options[i].selected = true;
-                }
-            """, room_list)
-            print("Selected all rooms")
-
-        # Select "All Day" period
-        period_dropdown = driver.find_element(By.ID, "dlPeriod")
-        period_select = Select(period_dropdown)
-        period_select.select_by_value("0-30")
-        print("Selected 'All Day 07:00 - 22:00'")
-
-        # Download each week
-        downloaded_files = []
-        
-        for i in range(len(week_options)):
-            # Refetch to avoid stale references
-            week_list = driver.find_element(By.XPATH, '//*[@id="lbWeeks"]')
-            week_select = Select(week_list)
-            week_options = week_list.find_elements(By.TAG_NAME, "option")
-            
-            week = week_options[i]
-            
-            # Skip non-week entries
-            if "w/c" not in week.text.lower():
-                continue
-            
-            # WEEK LIMITERS
-            # Change these indices to adjust what weeks are scraped
-            if debug and (i != 18):
-                continue            
-            if not debug and i < 17:
-                continue
-            
-            week_text = week.text
-            cache_filename = os.path.join(cache_dir, f"week_{i:03d}.html")
-            metadata_filename = os.path.join(cache_dir, f"week_{i:03d}.json")
-            
-            # Skip if already cached
-            if os.path.exists(cache_filename):
-                print(f"[{i}] Cached: {week_text}")
-                downloaded_files.append((cache_filename, metadata_filename))
-                continue
-            
-            print(f"[{i}] Downloading: {week_text}")
-            
-            week_select.deselect_all()
-            week_select.select_by_visible_text(week_text)
-            WebDriverWait(driver, 2).until(lambda d: True)
-            
-            # Click "Get Timetable"
-            get_button = driver.find_element(By.XPATH, '//*[@id="bGetTimetable"]')
-            driver.execute_script("arguments[0].click();", get_button)
-            
-            # Wait for new window
-            WebDriverWait(driver, 5).until(lambda d: len(d.window_handles) > 1)
-            
-            # Switch to new window
-            main_window = driver.current_window_handle
-            new_window = [w for w in driver.window_handles if w != main_window][0]
-            driver.switch_to.window(new_window)
-            
-            # Get HTML
-            html = driver.page_source
-            
-            # Save HTML to cache
-            with open(cache_filename, 'w', encoding='utf-8') as f:
-                f.write(html)
-            
-            # Save metadata
-            metadata = {
-                'week_index': i,
-                'week_text': week_text,
-                'download_time': datetime.now().isoformat()
-            }
-            with open(metadata_filename, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=2)
-            
-            downloaded_files.append((cache_filename, metadata_filename))
-            
-            # Close new window and return to main
-            driver.close()
-            driver.switch_to.window(main_window)
-        
-        print(f"\nDownloaded {len(downloaded_files)} weeks")
-        return downloaded_files
-        
-    finally:
-        driver.quit()
+def report_options(default_help):
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        '--metrics-json',
+        type=str,
+        default=None,
+        help=f'Where to write the JSON run report (default: {default_help})'
+    )
+    return parser
+
+
+def parse_arguments():
+    """
+    Parse command line arguments.
+
+    Without a subcommand every phase runs, as it always has. The download,
+    parse and export subcommands each run one phase against the artifacts
+    the previous one left on disk (the HTML cache, then the parse cache),
+    and query answers free-room queries from an export.
+    """
+    weeks, download, parsed, parse, export = (
+        week_options(), download_options(), parse_cache_options(), parse_options(), export_options()
+    )
+    parser = argparse.ArgumentParser(
+        description='UBC Timetable Scraper - CSV Export',
+        parents=[weeks, download, parsed, parse, export, report_options('run_report*.json next to the bookings CSV')]
+    )
+    parser.add_argument(
+        '--no-parse-cache',
+        action='store_true',
+        help='Always re-parse every week'
+    )
+    parser.add_argument(
+        '--pipeline',
+        action='store_true',
+        help='Parse and export each week as soon as it is downloaded instead of after Phase 1'
+    )
+
+    stages = parser.add_subparsers(dest='command', metavar='{download,parse,export,query}',
+                                   help='Run one stage on its own (options go after the stage name)')
+    stages.add_parser(
+        'download', parents=[weeks, download, report_options('no file, summary only')],
+        help='Phase 1 only: fill the HTML cache (already cached weeks are kept, see --refresh-policy)'
+    )
+    parse_stage = stages.add_parser(
+        'parse', parents=[weeks, parsed, parse, report_options('no file, summary only')],
+        help='Phase 2 only: parse cached weeks into the parse cache, skipping weeks parsed before'
+    )
+    parse_stage.add_argument(
+        '--force',
+        action='store_true',
+        help='Parse every selected week again, even if its result is already stored'
+    )
+    stages.add_parser(
+        'export', parents=[weeks, parsed, export, report_options('run_report*.json next to the bookings CSV')],
+        help='Phase 3 only: write the CSVs and optional outputs from the parse cache (no parsing)'
+    )
+    query_stage = stages.add_parser(
+        'query',
+        help='Answer the free-room RPCs for a window from an export (see room_index.py)'
+    )
+    query_stage.add_argument('--start', type=str, required=True, help='Window start, YYYY-MM-DD HH:MM')
+    query_stage.add_argument('--end', type=str, required=True, help='Window end, YYYY-MM-DD HH:MM')
+    query_stage.add_argument('--columnar-dir', type=str, default=None,
+                             help='Load the bookings and rooms from this --columnar-dir export (fastest)')
+    query_stage.add_argument('--rooms-csv', type=str, default=None, help='Rooms CSV (with --bookings-csv)')
+    query_stage.add_argument('--bookings-csv', type=str, default=None, help='Bookings CSV (with --rooms-csv)')
+    query_stage.add_argument('--output-dir', type=str, default='output',
+                             help='Otherwise use the newest rooms/bookings CSV pair here (default: output)')
+    return parser.parse_args()
 
 # ==========================================
 # PHASE 2: HTML PARSING (BeautifulSoup + Parallel)
 # ==========================================
 
-def parse_week_html(file_tuple, debug):
-    """Parse a single week's HTML file using BeautifulSoup."""
+def parse_week_html(file_tuple, debug, engine=DEFAULT_PARSER, parse_cache_dir=None, stats=None):
+    """
+    Parse a single week's HTML file with the selected parser engine.
+
+    With parse_cache_dir set, results are reused for HTML whose content (and
+    PARSER_VERSION) has been parsed before, see parse_cache.py. stats, if
+    given, is a dict that receives cache_hit and the engine's counters.
+    """
+    if parse_cache_dir:
+        key = parse_cache.content_key(html_digest(file_tuple[0], load_metadata(file_tuple[1])))
+        cached = parse_cache.load(parse_cache_dir, key)
+        if cached is not None:
+            if debug:
+                print(f"\nParse cache hit: {file_tuple[0]}")
+            if stats is not None:
+                stats['cache_hit'] = True
+            return cached
+
+    if engine == 'lxml':
+        # Optional dependency: only needed when the fast engine is selected
+        from fast_parser import parse_week_html_lxml
+        bookings, rooms_set = parse_week_html_lxml(file_tuple, debug, stats)
+    else:
+        bookings, rooms_set = parse_week_html_bs4(file_tuple, debug, stats)
+    if stats is not None:
+        stats['cache_hit'] = False
+
+    if parse_cache_dir:
+        parse_cache.store(parse_cache_dir, key, bookings, rooms_set)
+    return bookings, rooms_set
+
+
+def parse_week_html_bs4(file_tuple, debug, stats=None):
+    """
+    Parse a single week's HTML file using BeautifulSoup.
+
+    stats, if given, is a dict that receives the tables and grid cells visited.
+    """
     
     cache_filename, metadata_filename = file_tuple
     
     # Load metadata
-    with open(metadata_filename, 'r', encoding='utf-8') as f:
-        metadata = json.load(f)
+    metadata = load_metadata(metadata_filename)
     
     week_text = metadata['week_text']
     
     if debug:
         print(f"\nParsing: {week_text}")
     
-    # Load HTML
-    with open(cache_filename, 'r', encoding='utf-8') as f:
-        html = f.read()
+    # Load HTML (raw file or compressed store)
+    html = read_week_html(cache_filename, metadata)
     
+    # Imported here: parse-free stages (and the lxml engine) run without bs4
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html, 'html.parser')
     
     bookings = []
@@ -230,6 +385,7 @@ def parse_week_html(file_tuple, debug):
     
     current_room = None
     week_start_date = None
+    n_cells = 0
     
     # Find all tables
     tables = soup.find_all('table')
@@ -262,15 +418,7 @@ def parse_week_html(file_tuple, debug):
                 # Extract week date
                 match_week = WEEK_PATTERN.search(row_text)
                 if match_week:
-                    date_from_text = datetime.strptime(match_week.group(1), "%m/%d/%y")
-                    days_since_monday = date_from_text.weekday()
-                    week_start_date = date_from_text - timedelta(days=days_since_monday)
-                    if week_start_date.weekday() != 0:
-                        print(f"  WARNING: week_start_date is {week_start_date.strftime('%A')}, not Monday!")
-                    if debug:
-                        print(f"  Week text: {week_text}")
-                        print(f"  Extracted date: {date_from_text.strftime('%Y-%m-%d %A')}")
-                        print(f"  Week start (Monday): {week_start_date.strftime('%Y-%m-%d %A')}")
+                    week_start_date = week_start_from_match(match_week, week_text, debug)
                                 
                 # Extract capacity
                 match_capacity = CAPACITY_PATTERN.search(row_text)
@@ -281,18 +429,11 @@ def parse_week_html(file_tuple, debug):
                         capacity = None
                 
                 # Extract features
-                features_span = table.select_one('tbody > tr:nth-of-type(4) > td > table > tbody > tr > td:nth-of-type(1) > span')
+                features_span = table.select_one(FEATURES_SELECTOR)
                 if features_span:
                     features_text = features_span.get_text(strip=True)
                     if features_text:
-                        raw_features = [f.strip() for f in features_text.split(',') if f.strip()]
-                        features = []
-                        for raw_feature in raw_features:
-                            parts = raw_feature.split(':', 1)
-                            if len(parts) > 1:
-                                features.append(parts[1].strip())
-                            else:
-                                features.append(raw_feature)
+                        features = split_features(features_text)
             
             # Store room data - ONLY if capacity is not None
             if current_room and capacity is not None:
@@ -306,170 +447,346 @@ def parse_week_html(file_tuple, debug):
             if not current_room or not week_start_date:
                 continue
             
-            rows = table.find_all('tr')
-            time_slots_list = []
-            active_rowspans = []
-            weekday_headers = []
-
-            for row_index, row in enumerate(rows):
-                # Only get direct child <td> cells
-                cells = row.find_all('td', recursive=False)
-                if not cells:
-                    continue
-
-                # First row is weekday headers
-                if row_index == 0:
-                    weekday_headers = [cell.get_text(strip=True) for cell in cells[1:]]
-                    active_rowspans = [0] * len(weekday_headers)
-                    if debug:
-                        print(f"  Found {len(weekday_headers)} weekday columns: {weekday_headers}")
-                    continue
-
-                # First cell is time slot
-                start_time_str = cells[0].get_text(strip=True)
-                if not TIME_PATTERN.match(start_time_str):
-                    continue
-
-                # Build row_data mapping: text and rowspan
-                row_data = []
-                for cell in cells[1:]:
-                    cell_text = cell.get_text(strip=True)
-                    rowspan = int(cell.get('rowspan', 1))
-                    row_data.append((cell_text, rowspan))
-
-                col_ptr = 0  # index in weekday_headers
-                cell_index = 0  # index in row_data
-
-                while col_ptr < len(weekday_headers):
-                    # If rowspan is active, just decrement and move on
-                    if active_rowspans[col_ptr] > 0:
-                        active_rowspans[col_ptr] -= 1
-                        col_ptr += 1
-                        continue
-
-                    # Get current cell data if it exists
-                    if cell_index < len(row_data):
-                        cell_text, rowspan = row_data[cell_index]
-                        cell_index += 1
-                    else:
-                        cell_text, rowspan = "", 1  # treat missing cell as empty
-
-                    has_content = bool(cell_text.strip())
-                    is_main_booking_cell = has_content or rowspan > 1
-
-                    if is_main_booking_cell:
-                        weekday_name = weekday_headers[col_ptr]
-                        try:
-                            weekday_offset = WEEKDAYS.index(weekday_name)
-                        except ValueError:
-                            weekday_offset = col_ptr
-
-                        booking_date = week_start_date + timedelta(days=weekday_offset)
-                        time_slot_obj = datetime.strptime(start_time_str, "%H:%M").time()
-                        start_datetime = datetime.combine(booking_date.date(), time_slot_obj)
-                        end_datetime = start_datetime + timedelta(minutes=30 * rowspan)
-
-                        # Extract booking details
-                        course_code = 'N/A'
-                        instructor = 'Unknown'
-                        booking_type = 'OTHER'
-                        match_details = DETAILS_PATTERN.search(cell_text)
-                        if match_details:
-                            full_course_id = match_details.group(1).strip()
-                            course_type_section = match_details.group(2).strip()
-                            course_code = f"{full_course_id}/{course_type_section}/{match_details.group(3).strip()}"
-                            instructor = match_details.group(4).strip() or 'Unknown'
-                            booking_type = match_details.group(5).strip()
-                        else:
-                            if 'MAINT' in cell_text.upper():
-                                booking_type = 'MAINT'
-                                course_code = cell_text[:100]
-                            elif 'LEC' in cell_text.upper():
-                                booking_type = 'LEC'
-                                course_code = cell_text[:100]
-
-                        bookings.append({
-                            "room_number": current_room[1],
-                            "building": current_room[0],
-                            "start_time": start_datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                            "end_time": end_datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                            "course_code": course_code,
-                            "instructor": instructor,
-                            "booking_type": booking_type
-                        })
-
-                        active_rowspans[col_ptr] = rowspan - 1
-
-                    col_ptr += 1
+            # Only get direct child <td> cells
+            rows = (row.find_all('td', recursive=False) for row in table.find_all('tr'))
+            n_cells += decode_grid(
+                rows,
+                lambda cell: cell.get_text(strip=True),
+                lambda cell: int(cell.get('rowspan', 1)),
+                current_room, week_start_date, bookings, debug
+            )
 
 
     if debug:
         print(f"\n  → Total: {len(bookings)} bookings, {len(rooms_set)} rooms")
+    if stats is not None:
+        stats.update(tables=len(tables), cells=n_cells)
     
     return bookings, rooms_set
 
 
-def parse_all_weeks_parallel(downloaded_files, debug):
-    """Parse all weeks in parallel using ThreadPoolExecutor."""
+def parse_week_job(file_tuple, debug, engine=DEFAULT_PARSER, parse_cache_dir=None, profile_dir=None):
+    """
+    Phase 2 task for one week: parse_week_html plus the week's figures.
+
+    Returns (bookings, rooms_set, [stats]); stats holds the parse time, page
+    size, bookings, tables and cells for the run report (see run_metrics.py).
+    With profile_dir set the parse runs under cProfile, saved per week there.
+    """
+    cache_filename, metadata_filename = file_tuple
+    stats = {'week': week_name(file_tuple)}
+    html_bytes = load_metadata(metadata_filename).get('html_bytes')
+    if html_bytes is None and os.path.exists(cache_filename):
+        html_bytes = os.path.getsize(cache_filename)  # cached before sizes were recorded
+    stats['html_bytes'] = html_bytes
+
+    began = time.perf_counter()
+    if profile_dir:
+        from run_metrics import profile_call
+        bookings, rooms_set = profile_call(
+            profile_dir, stats['week'], parse_week_html, file_tuple, debug, engine, parse_cache_dir, stats
+        )
+    else:
+        bookings, rooms_set = parse_week_html(file_tuple, debug, engine, parse_cache_dir, stats)
+    stats['seconds'] = time.perf_counter() - began
+    stats['bookings'] = len(bookings)
+    return bookings, rooms_set, [stats]
+
+
+def parse_week_chunk(file_tuples, debug, engine, parse_cache_dir=None, profile_dir=None):
+    """
+    Parse several weeks in a worker process.
+
+    Bookings come back in their compact tuple form (Booking.astuple) rather
+    than as objects, which keeps what has to be pickled back to the parent small.
+    Rooms come back per week, as [(week, rooms)], for merge_rooms.
+    """
+    rows = []
+    week_rooms_list = []
+    week_stats = []
+    for file_tuple in file_tuples:
+        try:
+            bookings, week_rooms, stats = parse_week_job(file_tuple, debug, engine, parse_cache_dir, profile_dir)
+        except Exception as e:
+            print(f"Error parsing file {file_tuple[0]}: {e}")
+            continue
+        rows.extend(booking.astuple() for booking in bookings)
+        week_rooms_list.append((stats[0]['week'], list(week_rooms)))
+        week_stats.extend(stats)
+    return rows, week_rooms_list, week_stats
+
+
+def week_name(file_tuple):
+    """A week's cache file stem, e.g. 'week_018' or 'week_018_s002'; sorts in week order."""
+    return os.path.basename(file_tuple[1])[:-len('.json')]
+
+
+def merge_rooms(rooms, week_rooms, week):
+    """
+    Add a week's room tuples to rooms, a dict keyed on (building, room_number).
+
+    Every week repeats the same rooms, so this stays as small as the room
+    list no matter how many weeks are parsed. When a room's capacity or
+    features differ, the latest week (by week_name) wins, and within a week
+    the largest tuple does, so the result does not depend on the order
+    weeks finish in or on set iteration order. Values are (week, room);
+    see room_tuples.
+    """
+    for room in week_rooms:
+        key = (room[1], room[0])
+        entry = (week, room)
+        current = rooms.get(key)
+        if current is None or entry > current:
+            rooms[key] = entry
+
+
+def room_tuples(rooms):
+    """The room tuples of a merge_rooms dict."""
+    return [room for _, room in rooms.values()]
+
+
+def _week_bookings(executor_kind, result):
+    """Normalize a worker result to (Booking records, [(week, rooms)], week stats)."""
+    if executor_kind == 'process':
+        rows, week_rooms_list, week_stats = result
+        return [Booking(*row) for row in rows], week_rooms_list, week_stats
+    bookings, week_rooms, week_stats = result
+    return bookings, [(week_stats[0]['week'], week_rooms)], week_stats
+
+
+def stream_parsed_weeks(downloaded_files, debug, rooms, engine=DEFAULT_PARSER,
+                        executor_kind='thread', workers=MAX_WORKERS, parse_cache_dir=None,
+                        metrics=None, profile_dir=None):
+    """
+    Parse weeks in parallel and yield their bookings as each week finishes.
+
+    Weeks are yielded in download order with at most two tasks per worker in
+    flight, so memory holds a handful of weeks rather than the whole term.
+    Bookings are parse_common.Booking records; rooms (a dict, see
+    merge_rooms) is filled in as weeks are consumed.
+
+    executor_kind 'thread' uses a ThreadPoolExecutor; 'process' uses a
+    ProcessPoolExecutor fed in chunks of PARSE_CHUNK_SIZE weeks, so parse
+    time scales with cores instead of taking turns on the GIL.
+    
+    metrics (a run_metrics.RunMetrics) receives every week's stats and the
+    time spent waiting on workers; profile_dir, see parse_week_job.
+    """
     
     print("\n" + "=" * 60)
-    print("PHASE 2: Parsing HTML (Parallel)")
+    print(f"PHASE 2: Parsing HTML (Parallel, {engine}, {workers} {executor_kind} workers)")
     print("=" * 60)
     
-    all_bookings = []
-    all_rooms_set = set()
+    if executor_kind == 'process':
+        executor = ProcessPoolExecutor(max_workers=workers)
+        jobs = (
+            (parse_week_chunk, downloaded_files[start:start + PARSE_CHUNK_SIZE], debug, engine, parse_cache_dir,
+             profile_dir)
+            for start in range(0, len(downloaded_files), PARSE_CHUNK_SIZE)
+        )
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        jobs = (
+            (parse_week_job, file_tuple, debug, engine, parse_cache_dir, profile_dir)
+            for file_tuple in downloaded_files
+        )
     
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(parse_week_html, file_tuple, debug): file_tuple for file_tuple in downloaded_files}
-        
-        for future in as_completed(futures):
-            try:
-                bookings, rooms_set = future.result()
-                all_bookings.extend(bookings)
-                all_rooms_set.update(rooms_set)
-            except Exception as e:
-                print(f"Error parsing file: {e}")
+    in_flight = deque()
+    n_bookings = 0
+    
+    def finished(future):
+        began = time.perf_counter()
+        try:
+            bookings, week_rooms_list, week_stats = _week_bookings(executor_kind, future.result())
+        except Exception as e:
+            print(f"Error parsing file: {e}")
+            bookings, week_rooms_list, week_stats = [], [], []
+        if metrics is not None:
+            metrics.add_time('parse_wait', time.perf_counter() - began)
+            metrics.add_parsed(week_stats)
+        return bookings, week_rooms_list
     
-    print(f"\nTotal bookings: {len(all_bookings)}")
-    print(f"Total unique rooms: {len(all_rooms_set)}")
+    with executor:
+        for job in jobs:
+            in_flight.append(executor.submit(*job))
+            if len(in_flight) < 2 * workers:
+                continue
+            bookings, week_rooms_list = finished(in_flight.popleft())
+            for week, week_rooms in week_rooms_list:
+                merge_rooms(rooms, week_rooms, week)
+            n_bookings += len(bookings)
+            yield from bookings
+        
+        while in_flight:
+            bookings, week_rooms_list = finished(in_flight.popleft())
+            for week, week_rooms in week_rooms_list:
+                merge_rooms(rooms, week_rooms, week)
+            n_bookings += len(bookings)
+            yield from bookings
     
-    return all_bookings, all_rooms_set
+    print(f"\nTotal bookings: {n_bookings}")
+    print(f"Total unique rooms: {len(rooms)}")
+
+
+def parse_all_weeks_parallel(downloaded_files, debug, engine=DEFAULT_PARSER,
+                             executor_kind='thread', workers=MAX_WORKERS, parse_cache_dir=None,
+                             metrics=None, profile_dir=None):
+    """
+    Parse all weeks in parallel and return (bookings, rooms_set) in memory.
+
+    Kept for callers that need every booking at once; the scraper itself
+    streams bookings straight into the CSV via stream_parsed_weeks.
+    """
+    rooms = {}
+    all_bookings = list(stream_parsed_weeks(
+        downloaded_files, debug, rooms, engine, executor_kind, workers, parse_cache_dir, metrics, profile_dir
+    ))
+    return all_bookings, set(room_tuples(rooms))
+
+
+class ParsePipeline:
+    """
+    Producer/consumer pipeline that overlaps Phase 2 with Phase 1.
+
+    Phase 1 calls submit() as soon as each week is saved; the week is parsed
+    right away in the worker pool and its bookings are appended to the
+    bookings CSV as soon as they are parsed. Weeks parsed before a Phase 1
+    failure are therefore already exported.
+
+    metrics and profile_dir are as in stream_parsed_weeks; the time spent
+    writing rows is recorded as the export_bookings phase. With columnar
+    (a columnar_export.ColumnarWriter) each week is appended to it too.
+    """
+
+    def __init__(self, bookings_csv, debug, engine=DEFAULT_PARSER,
+                 executor_kind='thread', workers=MAX_WORKERS, parse_cache_dir=None,
+                 metrics=None, profile_dir=None, columnar=None):
+        self.debug = debug
+        self.engine = engine
+        self.parse_cache_dir = parse_cache_dir
+        self.metrics = metrics
+        self.profile_dir = profile_dir
+        self.columnar = columnar
+        self.executor_kind = executor_kind
+        if executor_kind == 'process':
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+
+        self.lock = threading.Lock()
+        self.rooms = {}
+        self.n_weeks = 0
+        self.n_bookings = 0
+
+        self.bookings_csv = bookings_csv
+        self.bookings_file = open(bookings_csv, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.bookings_file)
+        self.writer.writerow(BOOKING_FIELDS)
+
+    def submit(self, file_tuple):
+        """Queue one saved week for parsing (safe to call from any thread)."""
+        if self.executor_kind == 'process':
+            future = self.executor.submit(
+                parse_week_chunk, [file_tuple], self.debug, self.engine, self.parse_cache_dir, self.profile_dir
+            )
+        else:
+            future = self.executor.submit(
+                parse_week_job, file_tuple, self.debug, self.engine, self.parse_cache_dir, self.profile_dir
+            )
+        future.add_done_callback(self._collect)
+
+    def _collect(self, future):
+        try:
+            bookings, week_rooms_list, week_stats = _week_bookings(self.executor_kind, future.result())
+        except Exception as e:
+            print(f"Error parsing file: {e}")
+            return
+
+        with self.lock:
+            began = time.perf_counter()
+            self.writer.writerows(booking.row() for booking in bookings)
+            self.bookings_file.flush()
+            if self.columnar is not None:
+                self.columnar.write_bookings(bookings)
+            if self.metrics is not None:
+                self.metrics.add_time('export_bookings', time.perf_counter() - began)
+                self.metrics.add_parsed(week_stats)
+            for week, week_rooms in week_rooms_list:
+                merge_rooms(self.rooms, week_rooms, week)
+            self.n_weeks += 1
+            self.n_bookings += len(bookings)
+
+    def close(self):
+        """Wait for queued weeks to finish parsing and return the rooms seen."""
+        self.executor.shutdown(wait=True)
+        self.bookings_file.close()
+
+        print(f"\nParsed {self.n_weeks} weeks while downloading")
+        print(f"Exported {self.n_bookings} bookings to {self.bookings_csv}")
+        print(f"Total unique rooms: {len(self.rooms)}")
+        return room_tuples(self.rooms)
 
 # ==========================================
 # PHASE 3: CSV EXPORT
 # ==========================================
 
-def export_to_csv(all_bookings, all_rooms_set, rooms_csv, bookings_csv):
-    """Export parsed data to CSV files."""
+def export_rooms_to_csv(all_rooms, rooms_csv):
+    """Export the unique rooms (room tuples) to a CSV file."""
+    all_rooms = sorted(all_rooms)
+    if all_rooms:
+        with open(rooms_csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            # Write header
+            writer.writerow(['room_number', 'building', 'capacity', 'features'])
+            # Write data
+            writer.writerows(all_rooms)
+        print(f"Exported {len(all_rooms)} rooms to {rooms_csv}")
+
+
+def export_bookings_to_csv(bookings, bookings_csv):
+    """
+    Write Booking records to a CSV as they arrive, formatting timestamps here.
+
+    The file is only created once the first row comes in, so an empty
+    stream leaves no bookings CSV behind.
+    """
+    count = 0
+    f = None
+    try:
+        for booking in bookings:
+            if f is None:
+                f = open(bookings_csv, 'w', newline='', encoding='utf-8')
+                writer = csv.writer(f)
+                # Write header
+                writer.writerow(BOOKING_FIELDS)
+            writer.writerow(booking.row())
+            count += 1
+    finally:
+        if f is not None:
+            f.close()
+    return count
+
+
+def export_to_csv(bookings, rooms, rooms_csv, bookings_csv):
+    """
+    Export parsed data to CSV files.
+
+    bookings (Booking records) may be a generator, see stream_parsed_weeks:
+    they are written while it runs, and rooms, which it fills in, after.
+    """
+    
+    # Export bookings to CSV (parsing happens as rows are pulled)
+    n_bookings = export_bookings_to_csv(bookings, bookings_csv)
     
     print("\n" + "=" * 60)
     print("PHASE 3: Exporting to CSV")
     print("=" * 60)
     
+    if n_bookings:
+        print(f"Exported {n_bookings} bookings to {bookings_csv}")
+    
     # Export rooms to CSV
-    if all_rooms_set:
-        with open(rooms_csv, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            # Write header
-            writer.writerow(['room_number', 'building', 'capacity', 'features'])
-            # Write data
-            for room in sorted(all_rooms_set):
-                writer.writerow(room)
-        print(f"Exported {len(all_rooms_set)} rooms to {rooms_csv}")
-    
-    # Export bookings to CSV
-    if all_bookings:
-        with open(bookings_csv, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=[
-                'room_number', 'building', 'start_time', 'end_time',
-                'course_code', 'instructor', 'booking_type'
-            ])
-            # Write header
-            writer.writeheader()
-            # Write data
-            for booking in all_bookings:
-                writer.writerow(booking)
-        print(f"Exported {len(all_bookings)} bookings to {bookings_csv}")
+    export_rooms_to_csv(room_tuples(rooms) if isinstance(rooms, dict) else rooms, rooms_csv)
     
     print(f"\nCSV files created:")
     print(f"  - {rooms_csv}")
@@ -479,36 +796,292 @@ def export_to_csv(all_bookings, all_rooms_set, rooms_csv, bookings_csv):
 # MAIN EXECUTION
 # ==========================================
 
-if __name__ == "__main__":
-    # Parse command line arguments
-    args = parse_arguments()
+def week_plan(args):
+    """The WeekPlan for the week-selection options (and, when present, the refresh policy)."""
+    return WeekPlan(
+        args.debug, args.weeks, args.from_date, args.to_date,
+        getattr(args, 'refresh_policy', DEFAULT_REFRESH_POLICY), getattr(args, 'week_ttl', 0)
+    )
+
+
+def run_download_phase(args, on_week_saved=None):
+    """Run Phase 1 with the backend selected on the command line."""
+    check_codec(args.cache_codec)
+    plan = week_plan(args)
+    # Backends are imported on use: each needs its own third-party packages
+    if args.downloader == 'http':
+        from http_downloader import download_week_htmls_http, DOWNLOAD_CONCURRENCY
+        return download_week_htmls_http(
+            args.cache_dir, args.debug, args.url, args.download_concurrency or DOWNLOAD_CONCURRENCY,
+            args.room_shard_size, on_week_saved, args.cache_codec, plan
+        )
+    from selenium_downloader import download_week_htmls
+    return download_week_htmls(
+        args.cache_dir, args.debug, args.url, min(args.download_workers, MAX_DOWNLOAD_WORKERS),
+        args.room_shard_size, on_week_saved, args.cache_codec, plan
+    )
+
+
+def selected_cached_weeks(args):
+    """The cached weeks the options select; exits if there are none."""
+    files = cached_weeks(args.cache_dir, week_plan(args))
+    if not files:
+        raise SystemExit(f"No cached weeks selected in {args.cache_dir}; run the download stage first")
+    return files
+
+
+def load_parsed_weeks(file_keys, parse_cache_dir, rooms):
+    """
+    Yield the bookings the parse stage stored for each (file_tuple, key), in order.
+
+    rooms is filled in as weeks are read, as in stream_parsed_weeks.
+    """
+    n_bookings = 0
+    for file_tuple, key in file_keys:
+        parsed = parse_cache.load(parse_cache_dir, key)
+        if parsed is None:
+            raise RuntimeError(f"Parse result for {file_tuple[0]} is missing or unreadable")
+        bookings, week_rooms = parsed
+        merge_rooms(rooms, week_rooms, week_name(file_tuple))
+        n_bookings += len(bookings)
+        yield from bookings
+    print(f"\nRead {n_bookings} bookings of {len(file_keys)} weeks from {parse_cache_dir}")
+    print(f"Total unique rooms: {len(rooms)}")
+
+
+def export_extras(args, metrics):
+    """The optional outputs built from the exported CSVs."""
+    if args.recurrences_csv and os.path.exists(args.bookings_csv):
+        # Optional stage: imported here so plain runs do not load it
+        from recurrence import compact, read_bookings_csv, write_recurrences_csv
+        with metrics.phase('recurrences'):
+            write_recurrences_csv(compact(read_bookings_csv(args.bookings_csv)), args.recurrences_csv)
+    
+    if args.free_intervals_csv and os.path.exists(args.rooms_csv) and os.path.exists(args.bookings_csv):
+        from free_intervals import export_free_intervals_csv
+        with metrics.phase('free_intervals'):
+            export_free_intervals_csv(args.rooms_csv, args.bookings_csv, args.free_intervals_csv)
+    
+    if args.room_features_csv and os.path.exists(args.rooms_csv):
+        from room_features import export_room_features, DEFAULT_VOCABULARY_CSV
+        with metrics.phase('room_features'):
+            export_room_features(
+                args.rooms_csv, args.room_features_csv,
+                os.path.join(os.path.dirname(args.room_features_csv), DEFAULT_VOCABULARY_CSV)
+            )
+    
+    if args.sql_out and os.path.exists(args.rooms_csv) and os.path.exists(args.bookings_csv):
+        with metrics.phase('sql'):
+            export_csvs_to_sql(args.rooms_csv, args.bookings_csv, args.sql_out, args.sql_style)
+
+
+def columnar_writer(args):
+    if not args.columnar_dir:
+        return None
+    # Optional output: imported here so plain runs do not load it
+    from columnar_export import ColumnarWriter
+    return ColumnarWriter(args.columnar_dir)
+
+
+def finish_run(args, metrics, report_file, profile_dir=None, outputs=()):
+    """Merge the profiles, then write (when report_file is set) and print the run report."""
+    if profile_dir:
+        from run_metrics import merge_profiles
+        prof_file = os.path.splitext(report_file)[0] + '.prof' if report_file else 'parse_profile.prof'
+        metrics.profile = merge_profiles(profile_dir, prof_file)
+        shutil.rmtree(profile_dir, ignore_errors=True)
     
+    print("\n" + "=" * 60)
+    print("RUN REPORT")
+    print("=" * 60)
+    outputs = [filename for filename in outputs if filename]
+    if report_file:
+        print_summary(metrics.write(report_file, vars(args), outputs))
+    else:
+        print_summary(metrics.report(vars(args), outputs))
+
+
+def run_download_stage(args):
+    """download: Phase 1 only; rerun it to resume, cached weeks are kept."""
+    metrics = RunMetrics()
+    os.makedirs(args.cache_dir, exist_ok=True)
+    with metrics.phase('download'):
+        downloaded_files = run_download_phase(args)
+    metrics.add_downloads(downloaded_files)
+    print(f"\n{len(downloaded_files)} weeks cached in {args.cache_dir}")
+    finish_run(args, metrics, args.metrics_json)
+
+
+def run_parse_stage(args):
+    """parse: Phase 2 only; weeks already in the parse cache are skipped unless --force."""
+    metrics = RunMetrics()
+    files = selected_cached_weeks(args)
+    pending = []
+    for file_tuple in files:
+        key = parse_cache.content_key(html_digest(file_tuple[0], load_metadata(file_tuple[1])))
+        if args.force:
+            parse_cache.discard(args.parse_cache_dir, key)
+        elif parse_cache.contains(args.parse_cache_dir, key):
+            continue
+        pending.append(file_tuple)
+    print(f"{len(files) - len(pending)} of {len(files)} selected weeks already parsed in {args.parse_cache_dir}")
+    
+    profile_dir = tempfile.mkdtemp(prefix='ubc_profile_') if args.profile else None
+    with metrics.phase('parse'):
+        # Results land in the parse cache; the bookings themselves are not kept
+        rooms = {}
+        for _ in stream_parsed_weeks(
+            pending, args.debug, rooms, args.parser, args.executor, args.parse_workers,
+            args.parse_cache_dir, metrics, profile_dir
+        ):
+            pass
+    finish_run(args, metrics, args.metrics_json, profile_dir)
+
+
+def run_export_stage(args):
+    """export: Phase 3 only, from the results the parse stage stored."""
+    metrics = RunMetrics()
+    files = selected_cached_weeks(args)
+    file_keys = [
+        (file_tuple, parse_cache.content_key(html_digest(file_tuple[0], load_metadata(file_tuple[1]))))
+        for file_tuple in files
+    ]
+    missing = [file_tuple[1] for file_tuple, key in file_keys if not parse_cache.contains(args.parse_cache_dir, key)]
+    if missing:
+        raise SystemExit(f"{len(missing)} of {len(files)} selected weeks are not parsed yet "
+                         f"(first: {missing[0]}); run the parse stage with the same week options first")
+    
+    columnar = columnar_writer(args)
+    rooms = {}
+    bookings = load_parsed_weeks(file_keys, args.parse_cache_dir, rooms)
+    if columnar is not None:
+        bookings = columnar.tee(bookings)
+    with metrics.phase('export'):
+        export_to_csv(bookings, rooms, args.rooms_csv, args.bookings_csv)
+        if columnar is not None:
+            columnar.close(room_tuples(rooms))
+    export_extras(args, metrics)
+    
+    outputs = [args.rooms_csv, args.bookings_csv, args.recurrences_csv, args.free_intervals_csv,
+               args.room_features_csv, args.sql_out]
+    finish_run(args, metrics, args.metrics_json or report_path(args.bookings_csv), outputs=outputs)
+
+
+def run_query_stage(args):
+    """query: the free-room RPC answers for one window, from a columnar export or the CSVs."""
+    from room_index import RoomIndex, rpc_answers
+    
+    began = time.perf_counter()
+    if args.columnar_dir:
+        from columnar_export import BookingColumns
+        columns = BookingColumns(args.columnar_dir)
+        index = RoomIndex(columns.rooms, columns.intervals())
+        source = args.columnar_dir
+    else:
+        if args.rooms_csv and args.bookings_csv:
+            rooms_csv, bookings_csv = args.rooms_csv, args.bookings_csv
+        else:
+            from snapshot_diff import latest_snapshots
+            snapshots = latest_snapshots(args.output_dir, count=1)
+            if not snapshots:
+                raise SystemExit(f"No snapshots found in {args.output_dir}")
+            rooms_csv, bookings_csv = snapshots[0]
+        index = RoomIndex.from_csv(rooms_csv, bookings_csv)
+        source = bookings_csv
+    load_seconds = time.perf_counter() - began
+    
+    print(json.dumps(rpc_answers(index, datetime.fromisoformat(args.start), datetime.fromisoformat(args.end)),
+                     indent=2))
+    print(f"Loaded {source} in {load_seconds:.2f} s")
+
+
+def run_all(args):
+    """Every phase in one run (no subcommand)."""
     print("\n" + "=" * 60)
     print("UBC TIMETABLE SCRAPER (CSV VERSION)")
     print("=" * 60)
     print(f"Cache directory: {args.cache_dir}")
     print(f"Rooms CSV: {args.rooms_csv}")
     print(f"Bookings CSV: {args.bookings_csv}")
+    print(f"Downloader: {args.downloader}")
     print(f"Debug mode: {'ENABLED' if args.debug else 'DISABLED'}")
     print("=" * 60 + "\n")
     
     # Create cache directory
     os.makedirs(args.cache_dir, exist_ok=True)
     
-    start_time = datetime.now()
+    metrics = RunMetrics()
+    report_file = args.metrics_json or report_path(args.bookings_csv)
     
-    # Phase 1: Download HTMLs (cannot be parallelized)
-    downloaded_files = download_week_htmls(args.cache_dir, args.debug)
+    parse_cache_dir = None if args.no_parse_cache else args.parse_cache_dir
+    profile_dir = None
+    if args.profile:
+        # Profile real parsing: cache hits would hide the hot paths
+        parse_cache_dir = None
+        profile_dir = tempfile.mkdtemp(prefix='ubc_profile_')
     
-    # Phase 2: Parse HTMLs (parallelized)
-    all_bookings, all_rooms_set = parse_all_weeks_parallel(downloaded_files, args.debug)
+    columnar = columnar_writer(args)
     
-    # Phase 3: Export to CSV
-    export_to_csv(all_bookings, all_rooms_set, args.rooms_csv, args.bookings_csv)
+    if args.pipeline:
+        # Phases 1-3 overlapped: each saved week is parsed and exported right away
+        pipeline = ParsePipeline(
+            args.bookings_csv, args.debug, args.parser, args.executor, args.parse_workers,
+            parse_cache_dir, metrics, profile_dir, columnar
+        )
+        began = time.perf_counter()
+        try:
+            metrics.add_downloads(run_download_phase(args, on_week_saved=pipeline.submit))
+        finally:
+            # Runs on Phase 1 failure too, so already-parsed weeks are kept
+            all_rooms = pipeline.close()
+            metrics.add_time('pipeline', time.perf_counter() - began)
+            with metrics.phase('export_rooms'):
+                export_rooms_to_csv(all_rooms, args.rooms_csv)
+                if columnar is not None:
+                    columnar.close(all_rooms)
+    else:
+        # Phase 1: Download HTMLs
+        with metrics.phase('download'):
+            downloaded_files = run_download_phase(args)
+        metrics.add_downloads(downloaded_files)
+        
+        # Phases 2-3: Parse HTMLs (parallelized), streaming rows into the CSV
+        rooms = {}
+        bookings = stream_parsed_weeks(
+            downloaded_files, args.debug, rooms, args.parser, args.executor, args.parse_workers,
+            parse_cache_dir, metrics, profile_dir
+        )
+        if columnar is not None:
+            # Each booking goes to the columns as it is written to the CSV
+            bookings = columnar.tee(bookings)
+        with metrics.phase('parse_export'):
+            export_to_csv(bookings, rooms, args.rooms_csv, args.bookings_csv)
+            if columnar is not None:
+                columnar.close(room_tuples(rooms))
+    
+    export_extras(args, metrics)
+    
+    outputs = [args.rooms_csv, args.bookings_csv, args.recurrences_csv, args.free_intervals_csv,
+               args.room_features_csv, args.sql_out]
+    finish_run(args, metrics, report_file, profile_dir, outputs)
+
+
+STAGES = {
+    'download': run_download_stage,
+    'parse': run_parse_stage,
+    'export': run_export_stage,
+    'query': run_query_stage,
+}
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    args = parse_arguments()
     
-    end_time = datetime.now()
-    duration = (end_time - start_time).total_seconds()
+    start_time = datetime.now()
+    STAGES.get(args.command, run_all)(args)
+    duration = (datetime.now() - start_time).total_seconds()
     
     print("\n" + "=" * 60)
     print(f"COMPLETE - Total time: {duration:.2f} seconds")
-    print("=" * 60)
\ No newline at end of file
+    print("=" * 60)
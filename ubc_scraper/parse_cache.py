@@ -0,0 +1,64 @@
+# ==========================================
+# Parse-result cache
+# Stores each week's parsed bookings and rooms keyed by a hash of the
+# HTML content plus PARSER_VERSION, so byte-identical weeks skip Phase 2
+# ==========================================
+
+import os
+import zlib
+import pickle
+import hashlib
+import threading
+
+from parse_common import Booking, PARSER_VERSION
+
+DEFAULT_PARSE_CACHE_DIR = 'parse_cache'
+
+
+def content_key(html_digest):
+    """Combine the HTML content hash (week_cache.html_digest) with the parser version."""
+    return hashlib.sha256(f"parser-v{PARSER_VERSION}\n{html_digest}".encode('utf-8')).hexdigest()
+
+
+def _entry_path(parse_cache_dir, key):
+    # Two-level fan-out keeps directories small over a long cache history
+    return os.path.join(parse_cache_dir, key[:2], f"{key}.bin")
+
+
+def contains(parse_cache_dir, key):
+    """True if a result is stored for key (without reading it)."""
+    return os.path.exists(_entry_path(parse_cache_dir, key))
+
+
+def discard(parse_cache_dir, key):
+    """Remove the result stored for key, if any, so the week is parsed again."""
+    try:
+        os.remove(_entry_path(parse_cache_dir, key))
+    except FileNotFoundError:
+        pass
+
+
+def load(parse_cache_dir, key):
+    """Return (bookings, rooms_set) for a key, or None on a miss or unreadable entry."""
+    try:
+        with open(_entry_path(parse_cache_dir, key), 'rb') as f:
+            rows, rooms = pickle.loads(zlib.decompress(f.read()))
+    except (OSError, zlib.error, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+    return [Booking(*row) for row in rows], set(rooms)
+
+
+def store(parse_cache_dir, key, bookings, rooms_set):
+    """Save a week's parse result; bookings are stored in their compact tuple form."""
+    path = _entry_path(parse_cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    rows = [booking.astuple() for booking in bookings]
+    data = zlib.compress(pickle.dumps((rows, list(rooms_set)), protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+    # Write then rename, so concurrent workers never see a partial entry. The
+    # thread executor stores from several threads of one process at once
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
@@ -0,0 +1,259 @@
+# ==========================================
+# Timetable parsing helpers
+# Patterns and decoding steps shared by every Phase 2 parser engine,
+# so each engine only differs in how it walks the HTML tree
+# ==========================================
+
+import re
+import sys
+from functools import lru_cache
+from datetime import datetime, timedelta
+
+# Bump whenever parsing output (or the Booking record layout) changes, so
+# cached parse results are not reused
+PARSER_VERSION = 2
+
+# Compile regex patterns once (significant speedup)
+ROOM_PATTERN = re.compile(r'Location Timetable:\s*([A-Z]+)\s*([A-Z]?\d+[A-Z]?)')
+WEEK_PATTERN = re.compile(r'Exported Weeks:\d+,\s*(\d{2}/\d{2}/\d{2})')
+CAPACITY_PATTERN = re.compile(r'Capacity:\s*(\d+)', re.IGNORECASE)
+DETAILS_PATTERN = re.compile(
+    r'(.+?)\s*/([A-Z0-9]+)\s*/(\d+)\s*\n([^\n]*)\n([A-Z]+)\n(\d+-\d+)',
+    re.DOTALL | re.MULTILINE
+)
+TIME_PATTERN = re.compile(r'^\d{1,2}:\d{2}$')
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+WEEKDAY_OFFSETS = {day: offset for offset, day in enumerate(WEEKDAYS)}
+
+# Booking dict keys, in CSV column order
+BOOKING_FIELDS = (
+    'room_number', 'building', 'start_time', 'end_time',
+    'course_code', 'instructor', 'booking_type'
+)
+
+# Timestamps are kept as whole minutes since this (naive, local) epoch
+EPOCH = datetime(1970, 1, 1)
+MINUTES_PER_DAY = 24 * 60
+SLOT_MINUTES = 30
+
+# Room table layout: the features <span> sits in the first cell of the
+# nested table in the room table's 4th row
+FEATURES_SELECTOR = 'tbody > tr:nth-of-type(4) > td > table > tbody > tr > td:nth-of-type(1) > span'
+
+
+# ==========================================
+# BOOKING RECORDS
+# ==========================================
+
+class Booking:
+    """
+    One booking, stored compactly while weeks are parsed.
+
+    start and end are minutes since EPOCH; the string fields are interned,
+    so the building, room and type strings are shared by every booking that
+    uses them. Timestamps are only formatted by row(), at export time.
+    """
+
+    __slots__ = ('room_number', 'building', 'start', 'end', 'course_code', 'instructor', 'booking_type')
+
+    def __init__(self, room_number, building, start, end, course_code, instructor, booking_type):
+        self.room_number = room_number
+        self.building = building
+        self.start = start
+        self.end = end
+        self.course_code = course_code
+        self.instructor = instructor
+        self.booking_type = booking_type
+
+    def astuple(self):
+        """Compact tuple form (integer timestamps), for pickling and the parse cache."""
+        return (self.room_number, self.building, self.start, self.end,
+                self.course_code, self.instructor, self.booking_type)
+
+    def row(self):
+        """Export row in BOOKING_FIELDS order, with formatted timestamps."""
+        return (self.room_number, self.building, format_minutes(self.start), format_minutes(self.end),
+                self.course_code, self.instructor, self.booking_type)
+
+    def __eq__(self, other):
+        if not isinstance(other, Booking):
+            return NotImplemented
+        return self.astuple() == other.astuple()
+
+    def __hash__(self):
+        return hash(self.astuple())
+
+    def __repr__(self):
+        return f"Booking{self.row()!r}"
+
+
+# 'HH:MM:SS' for every minute of the day
+_TIME_STRINGS = [f"{m // 60:02d}:{m % 60:02d}:00" for m in range(MINUTES_PER_DAY)]
+
+
+@lru_cache(maxsize=None)
+def _day_string(day):
+    return (EPOCH + timedelta(days=day)).strftime('%Y-%m-%d')
+
+
+def format_minutes(minutes):
+    """Format minutes since EPOCH as 'YYYY-MM-DD HH:MM:SS'."""
+    day, minute = divmod(minutes, MINUTES_PER_DAY)
+    return f"{_day_string(day)} {_TIME_STRINGS[minute]}"
+
+
+def to_minutes(moment):
+    """Minutes since EPOCH for a datetime."""
+    return (moment - EPOCH) // timedelta(minutes=1)
+
+
+def to_minutes_ceil(moment):
+    """Minutes since EPOCH for a datetime, rounded up to a whole minute."""
+    return -((EPOCH - moment) // timedelta(minutes=1))
+
+
+@lru_cache(maxsize=None)
+def slot_minutes(time_str):
+    """Minute of the day for a grid time label like '8:30', or None if it is not one."""
+    if not TIME_PATTERN.match(time_str):
+        return None
+    slot = datetime.strptime(time_str, "%H:%M")
+    return slot.hour * 60 + slot.minute
+
+# ==========================================
+# DECODING
+# ==========================================
+
+def week_start_from_match(match_week, week_text, debug):
+    """Return the Monday of the week named by a WEEK_PATTERN match."""
+    date_from_text = datetime.strptime(match_week.group(1), "%m/%d/%y")
+    days_since_monday = date_from_text.weekday()
+    week_start_date = date_from_text - timedelta(days=days_since_monday)
+    if week_start_date.weekday() != 0:
+        print(f"  WARNING: week_start_date is {week_start_date.strftime('%A')}, not Monday!")
+    if debug:
+        print(f"  Week text: {week_text}")
+        print(f"  Extracted date: {date_from_text.strftime('%Y-%m-%d %A')}")
+        print(f"  Week start (Monday): {week_start_date.strftime('%Y-%m-%d %A')}")
+    return week_start_date
+
+
+def split_features(features_text):
+    """Split the features span text, dropping 'Label:' prefixes."""
+    raw_features = [f.strip() for f in features_text.split(',') if f.strip()]
+    features = []
+    for raw_feature in raw_features:
+        parts = raw_feature.split(':', 1)
+        if len(parts) > 1:
+            features.append(parts[1].strip())
+        else:
+            features.append(raw_feature)
+    return features
+
+
+@lru_cache(maxsize=8192)
+def booking_details(cell_text):
+    """
+    Extract (course_code, instructor, booking_type) from a booking cell.
+
+    The same cell text recurs every week a course meets, so results are
+    memoized and returned as interned strings.
+    """
+    course_code = 'N/A'
+    instructor = 'Unknown'
+    booking_type = 'OTHER'
+    match_details = DETAILS_PATTERN.search(cell_text)
+    if match_details:
+        full_course_id = match_details.group(1).strip()
+        course_type_section = match_details.group(2).strip()
+        course_code = f"{full_course_id}/{course_type_section}/{match_details.group(3).strip()}"
+        instructor = match_details.group(4).strip() or 'Unknown'
+        booking_type = match_details.group(5).strip()
+    else:
+        if 'MAINT' in cell_text.upper():
+            booking_type = 'MAINT'
+            course_code = cell_text[:100]
+        elif 'LEC' in cell_text.upper():
+            booking_type = 'LEC'
+            course_code = cell_text[:100]
+    return sys.intern(course_code), sys.intern(instructor), sys.intern(booking_type)
+
+
+def decode_grid(rows, cell_text, cell_rowspan, current_room, week_start_date, bookings, debug):
+    """
+    Decode one timetable grid into bookings.
+
+    rows yields, per <tr>, the list of its direct <td> cells (possibly
+    empty). cell_text(cell) returns the stripped text of a cell and
+    cell_rowspan(cell) its rowspan, so any tree library can drive this.
+    Each booking is appended to bookings as a Booking record. Returns the
+    number of cells visited.
+    """
+    n_cells = 0
+    active_rowspans = []
+    weekday_headers = []
+    week_start = to_minutes(week_start_date)
+    building = sys.intern(current_room[0])
+    room_number = sys.intern(current_room[1])
+
+    for row_index, cells in enumerate(rows):
+        if not cells:
+            continue
+        n_cells += len(cells)
+
+        # First row is weekday headers
+        if row_index == 0:
+            weekday_headers = [cell_text(cell) for cell in cells[1:]]
+            active_rowspans = [0] * len(weekday_headers)
+            if debug:
+                print(f"  Found {len(weekday_headers)} weekday columns: {weekday_headers}")
+            continue
+
+        # First cell is time slot
+        slot = slot_minutes(cell_text(cells[0]))
+        if slot is None:
+            continue
+
+        # Build row_data mapping: text and rowspan
+        row_data = []
+        for cell in cells[1:]:
+            row_data.append((cell_text(cell), cell_rowspan(cell)))
+
+        col_ptr = 0  # index in weekday_headers
+        cell_index = 0  # index in row_data
+
+        while col_ptr < len(weekday_headers):
+            # If rowspan is active, just decrement and move on
+            if active_rowspans[col_ptr] > 0:
+                active_rowspans[col_ptr] -= 1
+                col_ptr += 1
+                continue
+
+            # Get current cell data if it exists
+            if cell_index < len(row_data):
+                text, rowspan = row_data[cell_index]
+                cell_index += 1
+            else:
+                text, rowspan = "", 1  # treat missing cell as empty
+
+            has_content = bool(text.strip())
+            is_main_booking_cell = has_content or rowspan > 1
+
+            if is_main_booking_cell:
+                weekday_offset = WEEKDAY_OFFSETS.get(weekday_headers[col_ptr], col_ptr)
+                start = week_start + weekday_offset * MINUTES_PER_DAY + slot
+
+                # Extract booking details
+                course_code, instructor, booking_type = booking_details(text)
+
+                bookings.append(Booking(
+                    room_number, building, start, start + SLOT_MINUTES * rowspan,
+                    course_code, instructor, booking_type
+                ))
+
+                active_rowspans[col_ptr] = rowspan - 1
+
+            col_ptr += 1
+
+    return n_cells
@@ -0,0 +1,326 @@
+# ==========================================
+# Free-room query service
+# Small asyncio HTTP server that answers the Supabase free-room RPCs from
+# the scraper's newest output, held in memory
+# ==========================================
+#
+# Routes follow PostgREST, so the web app's Supabase client can point at
+# this server (NEXT_PUBLIC_SUPABASE_URL=http://127.0.0.1:8766):
+#   POST /rest/v1/rpc/free_rooms_per_building      {"p_start": ..., "p_end": ...}
+#   POST /rest/v1/rpc/free_rooms_list              (the *_daily names too)
+#   POST /rest/v1/rpc/get_table_last_modified
+#   GET  /rest/v1/rpc/<name>?p_start=...&p_end=...
+#   GET  /health                                   snapshot and cache counters
+#
+# Answers come from room_index.RoomIndex, row for row like the SQL. Encoded
+# responses are kept in an LRU cache keyed on the window normalized to
+# whole minutes. The output directory is polled, and a new snapshot is
+# loaded once its files stop changing; the cache is dropped on reload.
+#
+# Usage:
+#   python query_service.py --output-dir output --port 8766
+#   python load_test.py --url http://127.0.0.1:8766 --requests 5000 --concurrency 32
+
+import os
+import json
+import asyncio
+import argparse
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qsl
+
+from parse_common import EPOCH
+from room_index import RoomIndex
+from snapshot_diff import latest_snapshots
+
+DEFAULT_PORT = 8766
+DEFAULT_CACHE_SIZE = 4096
+DEFAULT_POLL_SECONDS = 2.0
+MAX_BODY_BYTES = 64 * 1024
+
+RPC_PREFIX = '/rest/v1/rpc/'
+# RPC name -> RoomIndex method; the *_daily variants return the same rows
+WINDOW_RPCS = {
+    'free_rooms_per_building': 'free_rooms_per_building',
+    'free_rooms_per_building_daily': 'free_rooms_per_building',
+    'free_rooms_list': 'free_rooms_list',
+    'free_rooms_list_daily': 'free_rooms_list',
+}
+
+REASONS = {200: 'OK', 204: 'No Content', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large', 503: 'Service Unavailable'}
+CORS_HEADERS = (
+    "Access-Control-Allow-Origin: *\r\n"
+    "Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
+    "Access-Control-Allow-Headers: *\r\n"
+)
+
+
+class QueryError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def normalize_window(p_start, p_end):
+    """
+    Parse a window into whole minutes since parse_common.EPOCH: the start
+    rounded down and the end rounded up.
+
+    Bookings start and end on whole minutes, so the rounded window overlaps
+    exactly the same bookings as the original one.
+    """
+    try:
+        start = datetime.fromisoformat(str(p_start)).replace(tzinfo=None)
+        end = datetime.fromisoformat(str(p_end)).replace(tzinfo=None)
+    except ValueError:
+        raise QueryError(400, "p_start and p_end must be timestamps like '2025-12-02 10:00:00'")
+    minute = timedelta(minutes=1)
+    return (start - EPOCH) // minute, -((EPOCH - end) // minute)
+
+
+def _timestamp_json(moment):
+    return moment.isoformat() if moment is not None else None
+
+
+def encode_rows(rpc, rows):
+    """JSON body for an RPC result, with PostgREST column names."""
+    if rpc == 'free_rooms_per_building':
+        records = [{'building': building, 'free_room_count': count} for building, count in rows]
+    else:
+        records = [{'room_number': r[0], 'building': r[1], 'capacity': r[2], 'features': r[3],
+                    'earliest_booking': _timestamp_json(r[4])} for r in rows]
+    return json.dumps(records, separators=(',', ':')).encode('utf-8')
+
+
+class Snapshot:
+    """One loaded rooms/bookings CSV pair."""
+
+    def __init__(self, rooms_csv, bookings_csv):
+        self.rooms_csv = rooms_csv
+        self.bookings_csv = bookings_csv
+        self.signature = _signature(rooms_csv, bookings_csv)
+        self.index = RoomIndex.from_csv(rooms_csv, bookings_csv)
+        self.loaded_at = datetime.now()
+        self.modified_at = datetime.fromtimestamp(max(os.path.getmtime(rooms_csv), os.path.getmtime(bookings_csv)))
+
+
+def _signature(rooms_csv, bookings_csv):
+    stats = [os.stat(filename) for filename in (rooms_csv, bookings_csv)]
+    return (rooms_csv, bookings_csv) + tuple((s.st_size, s.st_mtime_ns) for s in stats)
+
+
+class QueryService:
+    """Snapshot, LRU response cache and request routing."""
+
+    def __init__(self, output_dir, cache_size=DEFAULT_CACHE_SIZE, poll_seconds=DEFAULT_POLL_SECONDS):
+        self.output_dir = output_dir
+        self.cache_size = cache_size
+        self.poll_seconds = poll_seconds
+        self.snapshot = None
+        self.cache = OrderedDict()
+        self.hits = self.misses = self.reloads = 0
+        self._pending = None  # signature seen on the last poll, loaded once it is unchanged
+
+    # --- Snapshot loading ---
+
+    def _newest(self):
+        snapshots = latest_snapshots(self.output_dir, count=1)
+        if not snapshots:
+            return None
+        try:
+            return _signature(*snapshots[0])
+        except FileNotFoundError:
+            return None
+
+    async def reload_if_changed(self, wait_until_stable=True):
+        """Load the newest snapshot if it differs from the current one; returns True on reload."""
+        signature = self._newest()
+        if signature is None or (self.snapshot and signature == self.snapshot.signature):
+            self._pending = None
+            return False
+        # An export may still be streaming rows: wait for one quiet poll interval
+        if wait_until_stable and signature != self._pending:
+            self._pending = signature
+            return False
+
+        snapshot = await asyncio.to_thread(Snapshot, signature[0], signature[1])
+        self.snapshot = snapshot
+        self.cache.clear()
+        self.reloads += 1
+        self._pending = None
+        print(f"Loaded {snapshot.bookings_csv} ({len(snapshot.index.rooms)} rooms)")
+        return True
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self.reload_if_changed()
+            except Exception as e:  # keep serving the previous snapshot
+                print(f"Reload failed: {e}")
+
+    # --- Queries ---
+
+    def query(self, rpc, params):
+        """Encoded JSON body for an RPC call."""
+        if self.snapshot is None:
+            raise QueryError(503, f"No snapshot loaded from {self.output_dir}")
+
+        if rpc == 'get_table_last_modified':
+            modified = _timestamp_json(self.snapshot.modified_at)
+            return json.dumps([{'last_autoanalyze': modified, 'last_autovacuum': modified}]).encode('utf-8')
+
+        method = WINDOW_RPCS.get(rpc)
+        if method is None:
+            raise QueryError(404, f"Unknown function {rpc}")
+        if 'p_start' not in params or 'p_end' not in params:
+            raise QueryError(400, "p_start and p_end are required")
+
+        key = (method,) + normalize_window(params['p_start'], params['p_end'])
+        body = self.cache.get(key)
+        if body is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return body
+
+        self.misses += 1
+        start, end = (EPOCH + timedelta(minutes=minutes) for minutes in key[1:])
+        body = encode_rows(method, getattr(self.snapshot.index, method)(start, end))
+        self.cache[key] = body
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return body
+
+    def health(self):
+        snapshot = self.snapshot
+        return json.dumps({
+            'bookings_csv': snapshot.bookings_csv if snapshot else None,
+            'rooms': len(snapshot.index.rooms) if snapshot else 0,
+            'loaded_at': _timestamp_json(snapshot.loaded_at) if snapshot else None,
+            'reloads': self.reloads,
+            'cache_entries': len(self.cache),
+            'cache_hits': self.hits,
+            'cache_misses': self.misses,
+        }).encode('utf-8')
+
+    def route(self, method, target, body):
+        """Return (status, body) for one request."""
+        url = urlsplit(target)
+        if url.path == '/health':
+            return 200, self.health()
+        if not url.path.startswith(RPC_PREFIX):
+            raise QueryError(404, f"No route for {url.path}")
+
+        rpc = url.path[len(RPC_PREFIX):]
+        if method == 'GET':
+            params = dict(parse_qsl(url.query))
+        elif method == 'POST':
+            try:
+                params = json.loads(body) if body else {}
+            except ValueError:
+                raise QueryError(400, "Request body must be JSON")
+            if not isinstance(params, dict):
+                raise QueryError(400, "Request body must be a JSON object")
+        else:
+            raise QueryError(405, f"{method} not allowed")
+        return 200, self.query(rpc, params)
+
+# ==========================================
+# HTTP
+# ==========================================
+
+def _response(status, body, keep_alive):
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"{CORS_HEADERS}"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+
+async def handle_connection(service, reader, writer):
+    """Serve HTTP/1.1 requests on one connection until the client closes it."""
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                break
+
+            lines = head.decode('latin-1').split('\r\n')
+            parts = lines[0].split()
+            if len(parts) != 3:
+                break
+            method, target, version = parts
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                if name:
+                    headers[name.strip().lower()] = value.strip()
+
+            connection = headers.get('connection', '').lower()
+            keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+            try:
+                length = int(headers.get('content-length', 0) or 0)
+            except ValueError:
+                length = -1
+            if not 0 <= length <= MAX_BODY_BYTES:
+                status = 413 if length > MAX_BODY_BYTES else 400
+                writer.write(_response(status, b'{"message":"Bad Content-Length"}', False))
+                await writer.drain()
+                break
+            body = await reader.readexactly(length) if length else b''
+
+            if method == 'OPTIONS':
+                status, payload = 204, b''
+            else:
+                try:
+                    status, payload = service.route(method, target, body)
+                except QueryError as e:
+                    status, payload = e.status, json.dumps({'message': str(e)}).encode('utf-8')
+
+            writer.write(_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(output_dir, host='127.0.0.1', port=DEFAULT_PORT, cache_size=DEFAULT_CACHE_SIZE,
+                poll_seconds=DEFAULT_POLL_SECONDS):
+    service = QueryService(output_dir, cache_size, poll_seconds)
+    await service.reload_if_changed(wait_until_stable=False)
+    if service.snapshot is None:
+        print(f"No snapshot in {output_dir} yet; waiting for one")
+
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port)
+    watcher = asyncio.create_task(service.watch())
+    print(f"Serving free-room queries on http://{host}:{port}{RPC_PREFIX}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        watcher.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve the free-room RPCs from the newest scraper output')
+    parser.add_argument('--output-dir', type=str, default='output',
+                        help='Directory with rooms_*.csv / bookings_*.csv snapshots (default: output)')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                        help=f'Responses kept in the LRU cache (default: {DEFAULT_CACHE_SIZE})')
+    parser.add_argument('--poll', type=float, default=DEFAULT_POLL_SECONDS,
+                        help=f'Seconds between checks for a new snapshot (default: {DEFAULT_POLL_SECONDS})')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.output_dir, args.host, args.port, args.cache_size, args.poll))
+    except KeyboardInterrupt:
+        pass
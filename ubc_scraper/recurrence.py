@@ -0,0 +1,254 @@
+# ==========================================
+# Recurring-booking compression
+# Collapses the weekly repeats of each section into recurrence rules,
+# and expands rules back into concrete bookings for any date window
+# ==========================================
+#
+# A rule is one room, weekday and time range with the same course,
+# instructor and type, repeating every 7 days from first_date to last_date
+# except on the listed exception dates. The scraper's bookings CSV shrinks
+# roughly by the number of weeks scraped.
+#
+# Usage:
+#   python recurrence.py --bookings-csv output/bookings_X.csv --out output/recurrences_X.csv
+#   python recurrence.py --bookings-csv output/bookings_X.csv --check   # round-trip check
+#   python recurrence.py --recurrences-csv output/recurrences_X.csv --expand 2025-09-01 2025-09-08
+
+import sys
+import csv
+import argparse
+from datetime import datetime, date, timedelta
+from collections import defaultdict, Counter
+
+from parse_common import Booking, BOOKING_FIELDS, EPOCH, MINUTES_PER_DAY, to_minutes
+
+RECURRENCE_FIELDS = (
+    'room_number', 'building', 'weekday', 'start_time', 'end_time', 'first_date', 'last_date',
+    'course_code', 'instructor', 'booking_type', 'exceptions'
+)
+
+# 1970-01-01 (day 0) was a Thursday
+EPOCH_WEEKDAY = EPOCH.weekday()
+
+
+class Recurrence:
+    """
+    One recurrence rule.
+
+    Days are counted from parse_common.EPOCH and times are minutes after
+    midnight, matching Booking; weekday is 0 for Monday.
+    """
+
+    __slots__ = ('room_number', 'building', 'start', 'end', 'first_day', 'last_day',
+                 'course_code', 'instructor', 'booking_type', 'exceptions')
+
+    def __init__(self, room_number, building, start, end, first_day, last_day,
+                 course_code, instructor, booking_type, exceptions=()):
+        self.room_number = room_number
+        self.building = building
+        self.start = start
+        self.end = end
+        self.first_day = first_day
+        self.last_day = last_day
+        self.course_code = course_code
+        self.instructor = instructor
+        self.booking_type = booking_type
+        self.exceptions = frozenset(exceptions)
+
+    @property
+    def weekday(self):
+        return (self.first_day + EPOCH_WEEKDAY) % 7
+
+    def days(self, first_day=None, last_day=None):
+        """Days (inclusive range, clipped to the rule) on which the booking occurs."""
+        day = self.first_day
+        if first_day is not None and first_day > day:
+            day += -(-(first_day - day) // 7) * 7  # first occurrence on or after first_day
+        stop = self.last_day if last_day is None else min(self.last_day, last_day)
+        while day <= stop:
+            if day not in self.exceptions:
+                yield day
+            day += 7
+
+    def expand(self, window_start=None, window_end=None):
+        """Yield Booking records overlapping [window_start, window_end) (minutes since EPOCH)."""
+        first_day = last_day = None
+        if window_start is not None:
+            first_day = (window_start - self.end) // MINUTES_PER_DAY
+        if window_end is not None:
+            last_day = (window_end - self.start) // MINUTES_PER_DAY
+        for day in self.days(first_day, last_day):
+            start = day * MINUTES_PER_DAY + self.start
+            end = day * MINUTES_PER_DAY + self.end
+            if (window_start is None or end > window_start) and (window_end is None or start < window_end):
+                yield Booking(self.room_number, self.building, start, end,
+                              self.course_code, self.instructor, self.booking_type)
+
+    def row(self):
+        """Export row in RECURRENCE_FIELDS order; exceptions use PostgreSQL array syntax."""
+        exceptions = ",".join(_date_string(day) for day in sorted(self.exceptions))
+        return (self.room_number, self.building, self.weekday,
+                _time_string(self.start), _time_string(self.end),
+                _date_string(self.first_day), _date_string(self.last_day),
+                self.course_code, self.instructor, self.booking_type, "{" + exceptions + "}")
+
+    @classmethod
+    def fromrow(cls, row):
+        room_number, building, _, start, end, first, last, course_code, instructor, booking_type, exceptions = row
+        return cls(room_number, building, _parse_time(start), _parse_time(end),
+                   _parse_date(first), _parse_date(last), course_code, instructor, booking_type,
+                   [_parse_date(d) for d in exceptions.strip('{}').split(',') if d])
+
+
+def _date_string(day):
+    return (EPOCH + timedelta(days=day)).strftime('%Y-%m-%d')
+
+
+def _time_string(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def _parse_date(text):
+    return (date.fromisoformat(text) - EPOCH.date()).days
+
+
+def _parse_time(text):
+    hours, minutes = text.split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+# ==========================================
+# COMPACTION
+# ==========================================
+
+class RecurrenceBuilder:
+    """
+    Collects bookings and groups them into recurrence rules.
+
+    Only the days each (room, time, course, ...) combination occurs on are
+    kept, so bookings can be added one at a time from a stream.
+    """
+
+    def __init__(self):
+        self.groups = defaultdict(Counter)
+        self.n_bookings = 0
+
+    def add(self, booking):
+        day, start = divmod(booking.start, MINUTES_PER_DAY)
+        key = (booking.room_number, booking.building, start, booking.end - day * MINUTES_PER_DAY,
+               booking.course_code, booking.instructor, booking.booking_type, (day + EPOCH_WEEKDAY) % 7)
+        self.groups[key][day] += 1
+        self.n_bookings += 1
+
+    def rules(self):
+        """
+        Return the recurrence rules, sorted by room, weekday and time.
+
+        Each group becomes one rule spanning its first to last week, with the
+        weeks in between that have no booking as exceptions. A booking that
+        occurs more than once on the same day adds a further rule per repeat,
+        so expanding the rules gives back exactly the bookings added.
+        """
+        rules = []
+        for key, day_counts in self.groups.items():
+            room_number, building, start, end, course_code, instructor, booking_type, _ = key
+            layer = 1
+            while True:
+                days = sorted(day for day, count in day_counts.items() if count >= layer)
+                if not days:
+                    break
+                occurring = set(days)
+                exceptions = [day for day in range(days[0], days[-1] + 1, 7) if day not in occurring]
+                rules.append(Recurrence(room_number, building, start, end, days[0], days[-1],
+                                        course_code, instructor, booking_type, exceptions))
+                layer += 1
+        rules.sort(key=lambda r: (r.building, r.room_number, r.weekday, r.start, r.end, r.first_day, r.course_code))
+        return rules
+
+
+def compact(bookings):
+    """Collapse Booking records into a sorted list of Recurrence rules."""
+    builder = RecurrenceBuilder()
+    for booking in bookings:
+        builder.add(booking)
+    return builder.rules()
+
+
+def expand(rules, window_start=None, window_end=None):
+    """
+    Yield concrete Booking records from rules.
+
+    window_start/window_end are datetimes (or None for unbounded); bookings
+    overlapping [window_start, window_end) are returned.
+    """
+    start = to_minutes(window_start) if window_start is not None else None
+    end = to_minutes(window_end) if window_end is not None else None
+    for rule in rules:
+        yield from rule.expand(start, end)
+
+# ==========================================
+# CSV I/O
+# ==========================================
+
+def read_bookings_csv(bookings_csv):
+    """Read the scraper's bookings CSV back into Booking records."""
+    with open(bookings_csv, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        for row in reader:
+            room_number, building, start, end, course_code, instructor, booking_type = row
+            yield Booking(room_number, building,
+                          to_minutes(datetime.strptime(start, '%Y-%m-%d %H:%M:%S')),
+                          to_minutes(datetime.strptime(end, '%Y-%m-%d %H:%M:%S')),
+                          course_code, instructor, booking_type)
+
+
+def write_recurrences_csv(rules, recurrences_csv):
+    with open(recurrences_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(RECURRENCE_FIELDS)
+        writer.writerows(rule.row() for rule in rules)
+    print(f"Exported {len(rules)} recurrence rules to {recurrences_csv}")
+
+
+def read_recurrences_csv(recurrences_csv):
+    with open(recurrences_csv, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        return [Recurrence.fromrow(row) for row in reader]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compress weekly repeats into recurrence rules')
+    parser.add_argument('--bookings-csv', type=str, help='Bookings CSV produced by the scraper')
+    parser.add_argument('--recurrences-csv', type=str, help='Recurrence rules CSV (input for --expand)')
+    parser.add_argument('--out', type=str, help='Write the compacted rules to this CSV')
+    parser.add_argument('--check', action='store_true',
+                        help='Verify that expanding the rules gives back exactly the bookings CSV')
+    parser.add_argument('--expand', nargs=2, metavar=('FROM', 'TO'), type=date.fromisoformat,
+                        help='Print the bookings in [FROM, TO) regenerated from the rules, as CSV')
+    args = parser.parse_args()
+
+    if args.recurrences_csv:
+        rules = read_recurrences_csv(args.recurrences_csv)
+    elif args.bookings_csv:
+        bookings = list(read_bookings_csv(args.bookings_csv))
+        rules = compact(bookings)
+        print(f"{len(bookings)} bookings -> {len(rules)} rules ({len(bookings) / max(len(rules), 1):.1f}x)")
+        if args.check:
+            expanded = sorted(b.astuple() for b in expand(rules))
+            ok = expanded == sorted(b.astuple() for b in bookings)
+            print("Round trip OK" if ok else "Round trip MISMATCH")
+            if not ok:
+                raise SystemExit(1)
+    else:
+        parser.error("one of --bookings-csv or --recurrences-csv is required")
+
+    if args.out:
+        write_recurrences_csv(rules, args.out)
+
+    if args.expand:
+        window_start, window_end = (datetime.combine(d, datetime.min.time()) for d in args.expand)
+        writer = csv.writer(sys.stdout)
+        writer.writerow(BOOKING_FIELDS)
+        for booking in sorted(expand(rules, window_start, window_end), key=lambda b: (b.start, b.building, b.room_number)):
+            writer.writerow(booking.row())
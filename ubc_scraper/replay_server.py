@@ -0,0 +1,287 @@
+# ==========================================
+# SWS Replay Server
+# Local stand-in for the UBC timetable site that replays recorded
+# pages, so the HTTP downloader can be exercised without VPN access
+# ==========================================
+#
+# Usage:
+#   python replay_server.py --cache-dir html_cache --port 8765
+#   python optimized_scraper.py --downloader http --url http://127.0.0.1:8765/ --cache-dir /tmp/replayed
+#
+# Recorded pages are read from --cache-dir:
+#   week_NNN.json (+ .html or blob) timetable pages (as written by Phase 1)
+#   default.html, zone.html        optional recorded start / General Teaching
+#                                  Spaces pages; synthesized when missing
+#   rooms.txt                      optional dlObject values, one per line
+#
+# A timetable request for only some dlObject rooms (the downloaders'
+# --room-shard-size) gets the recorded page cut down to those rooms' blocks.
+# That needs rooms.txt, so the values name the rooms in the pages; without
+# it such requests are rejected.
+
+import os
+import re
+import glob
+import uuid
+import html
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qsl
+
+from week_cache import load_metadata, is_cached, read_week_html
+from parse_common import ROOM_PATTERN
+
+DEFAULT_PORT = 8765
+SESSION_COOKIE = 'ASP.NET_SessionId'
+WEEK_FILE_PATTERN = re.compile(r'week_(\d{3})\.json$')
+LOCATION_HEADER = 'Location Timetable:'
+TAG_PATTERN = re.compile(r'<[^>]+>')
+
+# ==========================================
+# RECORDED PAGES
+# ==========================================
+
+class Recording:
+    """Recorded pages loaded from a cache directory."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.weeks = {}  # week index -> (week_text, html path, metadata)
+
+        for metadata_filename in sorted(glob.glob(os.path.join(cache_dir, 'week_*.json'))):
+            match = WEEK_FILE_PATTERN.search(metadata_filename)
+            if not match:
+                continue
+            html_filename = metadata_filename[:-len('.json')] + '.html'
+            if is_cached(html_filename, metadata_filename):
+                metadata = load_metadata(metadata_filename)
+                self.weeks[int(match.group(1))] = (metadata['week_text'], html_filename, metadata)
+
+        rooms_filename = os.path.join(cache_dir, 'rooms.txt')
+        if os.path.exists(rooms_filename):
+            with open(rooms_filename, 'r', encoding='utf-8') as f:
+                self.rooms = [line.strip() for line in f if line.strip()]
+            self.named_rooms = True
+        else:
+            self.rooms = [f"ROOM{n:03d}" for n in range(1, 31)]
+            self.named_rooms = False
+
+    def _recorded(self, name):
+        filename = os.path.join(self.cache_dir, name)
+        if os.path.exists(filename):
+            with open(filename, 'r', encoding='utf-8') as f:
+                return f.read()
+        return None
+
+    def week_options(self):
+        """lbWeeks options in index order; gaps are filled with non-week entries."""
+        last = max(self.weeks) if self.weeks else -1
+        options = []
+        for i in range(last + 1):
+            if i in self.weeks:
+                options.append((str(i), self.weeks[i][0]))
+            else:
+                options.append((f"term{i}", f"Term option {i}"))
+        return options
+
+    def week_html(self, week_value, rooms=None):
+        """A week's recorded page, cut down to the given dlObject rooms if any."""
+        try:
+            _, html_filename, metadata = self.weeks[int(week_value)]
+        except (KeyError, ValueError):
+            return None
+        page = read_week_html(html_filename, metadata)
+        if rooms is None:
+            return page
+        prefix, blocks, suffix = room_blocks(page)
+        selected = set(rooms)
+        return prefix + "".join(block for room, block in blocks if room in selected) + suffix
+
+    def default_page(self, viewstate):
+        return self._recorded('default.html') or _form_page(viewstate, """
+    <a id="LinkBtn_locationByZone" href="javascript:__doPostBack('LinkBtn_locationByZone','')">General Teaching Spaces</a>""")
+
+    def zone_page(self, viewstate):
+        recorded = self._recorded('zone.html')
+        if recorded:
+            return recorded
+        weeks = "\n".join(
+            f'      <option value="{html.escape(v)}">{html.escape(t)}</option>' for v, t in self.week_options()
+        )
+        rooms = "\n".join(
+            f'      <option value="{html.escape(r)}">{html.escape(r)}</option>' for r in self.rooms
+        )
+        return _form_page(viewstate, f"""
+    <select name="lbWeeks" id="lbWeeks" multiple="multiple">
+{weeks}
+    </select>
+    <select name="dlObject" id="dlObject" multiple="multiple">
+{rooms}
+    </select>
+    <select name="dlPeriod" id="dlPeriod">
+      <option value="1-4">Morning</option>
+      <option selected="selected" value="5-12">Afternoon</option>
+      <option value="0-30">All Day 07:00 - 22:00</option>
+    </select>
+    <input type="submit" name="bGetTimetable" value="View Timetable" id="bGetTimetable" />""")
+
+
+def room_blocks(page):
+    """
+    Split a timetable page into (prefix, [(room, block), ...], suffix).
+
+    A room's block runs from the table holding its "Location Timetable:"
+    header to the next room's header table; room reads like a dlObject
+    value, e.g. "FNH B146".
+    """
+    starts = []
+    position = page.find(LOCATION_HEADER)
+    while position != -1:
+        start = page.rfind('<table', 0, position)
+        starts.append(start if start != -1 else position)
+        position = page.find(LOCATION_HEADER, position + len(LOCATION_HEADER))
+    if not starts:
+        return page, [], ''
+
+    end = page.rfind('</body>')
+    if end < starts[-1]:
+        end = len(page)
+    blocks = []
+    for start, stop in zip(starts, starts[1:] + [end]):
+        block = page[start:stop]
+        header = html.unescape(TAG_PATTERN.sub(' ', block[:block.find(LOCATION_HEADER) + 200]))
+        match = ROOM_PATTERN.search(header)
+        blocks.append((f"{match.group(1)} {match.group(2)}" if match else None, block))
+    return page[:starts[0]], blocks, page[end:]
+
+
+def _form_page(viewstate, body):
+    return f"""<html><head><title>Scientia Web Server</title></head><body>
+  <form name="form1" method="post" action="./default.aspx" id="form1">
+    <input type="hidden" name="__EVENTTARGET" id="__EVENTTARGET" value="" />
+    <input type="hidden" name="__EVENTARGUMENT" id="__EVENTARGUMENT" value="" />
+    <input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{viewstate}" />
+    <input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="{viewstate[::-1]}" />{body}
+  </form>
+</body></html>"""
+
+# ==========================================
+# HTTP HANDLER
+# ==========================================
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Emulates the default.aspx postbacks and the showtimetable.aspx popup."""
+
+    recording = None
+    sessions = {}  # session id -> {'viewstate': str, 'week': str, 'rooms': list or None}
+    sessions_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _session(self):
+        cookie = self.headers.get('Cookie', '')
+        match = re.search(re.escape(SESSION_COOKIE) + r'=([\w-]+)', cookie)
+        with self.sessions_lock:
+            if match and match.group(1) in self.sessions:
+                return match.group(1), self.sessions[match.group(1)], False
+            session_id = uuid.uuid4().hex
+            state = {'viewstate': uuid.uuid4().hex, 'week': None, 'rooms': None}
+            self.sessions[session_id] = state
+            return session_id, state, True
+
+    def _send(self, status, body='', session_id=None, location=None):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        if session_id:
+            self.send_header('Set-Cookie', f"{SESSION_COOKIE}={session_id}; path=/")
+        if location:
+            self.send_header('Location', location)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        session_id, state, is_new = self._session()
+        cookie = session_id if is_new else None
+
+        if self.path.split('?')[0].endswith('showtimetable.aspx'):
+            page = self.recording.week_html(state['week'], state['rooms']) if state['week'] is not None else None
+            if page is None:
+                self._send(404, 'No timetable selected', cookie)
+            else:
+                self._send(200, page, cookie)
+            return
+
+        self._send(200, self.recording.default_page(state['viewstate']), cookie)
+
+    def do_POST(self):
+        session_id, state, is_new = self._session()
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qsl(self.rfile.read(length).decode('utf-8'), keep_blank_values=True)
+        fields = {}
+        for key, value in form:
+            fields.setdefault(key, []).append(value)
+
+        # Reject postbacks that did not carry the page's viewstate, like ASP.NET does
+        if is_new or fields.get('__VIEWSTATE', [None])[0] != state['viewstate']:
+            self._send(500, 'Validation of viewstate MAC failed.', session_id if is_new else None)
+            return
+
+        state['viewstate'] = uuid.uuid4().hex
+
+        if fields.get('__EVENTTARGET', [''])[0] == 'LinkBtn_locationByZone':
+            self._send(200, self.recording.zone_page(state['viewstate']))
+            return
+
+        if 'bGetTimetable' in fields:
+            if fields.get('dlPeriod', [''])[0] != '0-30' or not fields.get('dlObject'):
+                self._send(400, 'Incomplete timetable request')
+                return
+            rooms = [" ".join(value.split()) for value in fields['dlObject']]
+            if not set(rooms) <= set(self.recording.rooms):
+                self._send(400, 'Unknown dlObject value')
+                return
+            if set(rooms) == set(self.recording.rooms):
+                rooms = None
+            elif not self.recording.named_rooms:
+                self._send(400, 'Timetables for a subset of rooms need rooms.txt in the recording')
+                return
+            state['week'] = fields.get('lbWeeks', [None])[0]
+            state['rooms'] = rooms
+            popup = "<script>window.open('showtimetable.aspx');</script>"
+            self._send(200, self.recording.zone_page(state['viewstate']).replace('</body>', popup + '</body>'))
+            return
+
+        self._send(200, self.recording.default_page(state['viewstate']))
+
+
+def make_server(cache_dir, host='127.0.0.1', port=DEFAULT_PORT):
+    """Create (but do not start) a replay server for a recorded cache directory."""
+    handler = type('BoundReplayHandler', (ReplayHandler,), {
+        'recording': Recording(cache_dir),
+        'sessions': {},
+        'sessions_lock': threading.Lock(),
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay recorded SWS timetable pages over HTTP')
+    parser.add_argument('--cache-dir', type=str, default='html_cache',
+                        help='Directory of recorded week pages (default: html_cache)')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    server = make_server(args.cache_dir, args.host, args.port)
+    print(f"Replaying {len(server.RequestHandlerClass.recording.weeks)} weeks from {args.cache_dir} "
+          f"on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
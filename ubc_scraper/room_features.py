@@ -0,0 +1,240 @@
+# ==========================================
+# Room feature vocabulary and bitmasks
+# Normalizes the free-text features string of each room into feature IDs
+# and a per-room bitmask, so feature filters are bitwise ANDs
+# ==========================================
+#
+# The features span mixes equipment ("Projector/Large Screen") with the
+# department codes allowed to book the room ("MATH", often repeating the
+# building code). Both become vocabulary entries, told apart by `kind`.
+# Feature IDs are kept stable across runs: an existing vocabulary CSV is
+# extended, never renumbered, so stored masks stay valid.
+#
+# Usage:
+#   python room_features.py --output-dir output --out output/room_features.csv
+#   python room_features.py --output-dir output --require "Projector/Large Screen" Whiteboard --min-capacity 40
+#   python room_features.py --output-dir output --require "Room PC" --free "2025-12-02 10:00" "2025-12-02 11:30"
+
+import os
+import re
+import csv
+import argparse
+from datetime import datetime
+
+VOCABULARY_FIELDS = ('feature_id', 'feature', 'kind')
+ROOM_FEATURE_FIELDS = ('room_number', 'building', 'capacity', 'feature_mask')
+DEFAULT_VOCABULARY_CSV = 'features.csv'
+
+DEPARTMENT_PATTERN = re.compile(r'^[A-Z]{2,5}$')
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_feature(text):
+    """Collapse whitespace; returns '' for empty entries."""
+    return WHITESPACE.sub(' ', text).strip()
+
+
+def feature_kind(feature):
+    return 'department' if DEPARTMENT_PATTERN.match(feature) else 'equipment'
+
+
+def parse_features(features_string):
+    """Split a rooms CSV features string into normalized, de-duplicated features (first occurrence order)."""
+    seen = {}
+    for raw_feature in (features_string or '').split(','):
+        feature = normalize_feature(raw_feature)
+        if feature:
+            seen.setdefault(feature.casefold(), feature)
+    return list(seen.values())
+
+
+class FeatureVocabulary:
+    """Feature labels numbered 0, 1, 2, ...; lookups ignore case and extra whitespace."""
+
+    def __init__(self, features=()):
+        self.features = []
+        self.ids = {}
+        for feature in features:
+            self.add(feature)
+
+    def __len__(self):
+        return len(self.features)
+
+    def add(self, feature):
+        """Return the ID of feature, appending it if new."""
+        key = normalize_feature(feature).casefold()
+        feature_id = self.ids.get(key)
+        if feature_id is None:
+            feature_id = self.ids[key] = len(self.features)
+            self.features.append(normalize_feature(feature))
+        return feature_id
+
+    def id(self, feature):
+        """ID of a known feature; raises KeyError for unknown ones."""
+        return self.ids[normalize_feature(feature).casefold()]
+
+    def mask(self, features, add=False):
+        """Bitmask with bit feature_id set for every feature."""
+        lookup = self.add if add else self.id
+        mask = 0
+        for feature in features:
+            mask |= 1 << lookup(feature)
+        return mask
+
+    def decode(self, mask):
+        """Feature labels whose bits are set in mask, in ID order."""
+        return [feature for feature_id, feature in enumerate(self.features) if mask >> feature_id & 1]
+
+    @classmethod
+    def load(cls, vocabulary_csv):
+        """Read a vocabulary CSV; a missing file gives an empty vocabulary."""
+        if not os.path.exists(vocabulary_csv):
+            return cls()
+        with open(vocabulary_csv, 'r', newline='', encoding='utf-8') as f:
+            rows = sorted((int(row['feature_id']), row['feature']) for row in csv.DictReader(f))
+        if [feature_id for feature_id, _ in rows] != list(range(len(rows))):
+            raise ValueError(f"{vocabulary_csv}: feature IDs must be 0..{len(rows) - 1} without gaps")
+        return cls(feature for _, feature in rows)
+
+    def save(self, vocabulary_csv):
+        with open(vocabulary_csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(VOCABULARY_FIELDS)
+            writer.writerows((i, feature, feature_kind(feature)) for i, feature in enumerate(self.features))
+
+
+class RoomFeatures:
+    """
+    Rooms with their capacity and feature bitmask, for cheap filtering.
+
+    Masks are Python ints (the vocabulary has a few hundred entries), so a
+    room matches a set of required features iff mask & required == required.
+    """
+
+    def __init__(self, vocabulary, rooms):
+        """rooms: (room_number, building, capacity or None, mask) tuples."""
+        self.vocabulary = vocabulary
+        self.rooms = sorted(rooms, key=lambda room: (room[1], room[0]))
+        self.index = {(room[0], room[1]): i for i, room in enumerate(self.rooms)}
+
+    @classmethod
+    def from_rooms_csv(cls, rooms_csv, vocabulary=None):
+        """Build from a scraper rooms CSV, adding new features to vocabulary."""
+        vocabulary = vocabulary if vocabulary is not None else FeatureVocabulary()
+        rooms = []
+        with open(rooms_csv, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                capacity = int(row['capacity']) if row['capacity'] else None
+                mask = vocabulary.mask(parse_features(row['features']), add=True)
+                rooms.append((row['room_number'], row['building'], capacity, mask))
+        return cls(vocabulary, rooms)
+
+    @classmethod
+    def load(cls, room_features_csv, vocabulary_csv):
+        vocabulary = FeatureVocabulary.load(vocabulary_csv)
+        with open(room_features_csv, 'r', newline='', encoding='utf-8') as f:
+            rooms = [(row['room_number'], row['building'], int(row['capacity']) if row['capacity'] else None,
+                      int(row['feature_mask'], 16)) for row in csv.DictReader(f)]
+        return cls(vocabulary, rooms)
+
+    def save(self, room_features_csv, vocabulary_csv):
+        self.vocabulary.save(vocabulary_csv)
+        with open(room_features_csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(ROOM_FEATURE_FIELDS)
+            writer.writerows((room_number, building, '' if capacity is None else capacity, f"{mask:x}")
+                             for room_number, building, capacity, mask in self.rooms)
+        print(f"Exported feature masks of {len(self.rooms)} rooms to {room_features_csv} "
+              f"({len(self.vocabulary)} features in {vocabulary_csv})")
+
+    def _required_mask(self, required):
+        try:
+            return self.vocabulary.mask(required)
+        except KeyError:
+            return None  # a feature no room has
+
+    def matches(self, required=(), min_capacity=None):
+        """Booleans in self.rooms order: room has every required feature and at least min_capacity seats."""
+        required_mask = self._required_mask(required)
+        if required_mask is None:
+            return [False] * len(self.rooms)
+        return [mask & required_mask == required_mask
+                and (min_capacity is None or (capacity is not None and capacity >= min_capacity))
+                for _, _, capacity, mask in self.rooms]
+
+    def filter(self, required=(), min_capacity=None):
+        """(room_number, building) of every matching room, sorted by building then room."""
+        return [room[:2] for room, match in zip(self.rooms, self.matches(required, min_capacity)) if match]
+
+    def mask_for(self, rooms, required=(), min_capacity=None):
+        """
+        NumPy boolean array over another room list (e.g. Availability.rooms),
+        so it can be ANDed with a free-room mask; unknown rooms never match.
+        """
+        import numpy as np
+
+        matches = self.matches(required, min_capacity)
+        return np.array([matches[self.index[key]] if key in self.index else False
+                         for key in ((room[0], room[1]) for room in rooms)], dtype=bool)
+
+
+def export_room_features(rooms_csv, room_features_csv, vocabulary_csv):
+    """Extend the vocabulary with rooms_csv's features and write both CSVs."""
+    room_features = RoomFeatures.from_rooms_csv(rooms_csv, FeatureVocabulary.load(vocabulary_csv))
+    room_features.save(room_features_csv, vocabulary_csv)
+    return room_features
+
+
+if __name__ == "__main__":
+    # Imported here: only the CLI needs the snapshot lookup
+    from snapshot_diff import latest_snapshots
+
+    parser = argparse.ArgumentParser(description='Normalize room features into IDs and filter rooms by bitmask')
+    parser.add_argument('--output-dir', type=str, default='output',
+                        help='Use the newest rooms/bookings CSV pair in this directory (default: output)')
+    parser.add_argument('--rooms-csv', type=str)
+    parser.add_argument('--bookings-csv', type=str)
+    parser.add_argument('--vocabulary', type=str, default=None,
+                        help=f'Feature vocabulary CSV, extended in place (default: <output-dir>/{DEFAULT_VOCABULARY_CSV})')
+    parser.add_argument('--out', type=str, help='Write room feature masks to this CSV')
+    parser.add_argument('--require', nargs='+', default=[], metavar='FEATURE', help='Features every room must have')
+    parser.add_argument('--min-capacity', type=int, default=None)
+    parser.add_argument('--free', nargs=2, metavar=('START', 'END'),
+                        help='Only rooms free for the whole window (uses availability.py, needs numpy)')
+    parser.add_argument('--list', action='store_true', help='Print the vocabulary')
+    args = parser.parse_args()
+
+    if args.rooms_csv:
+        rooms_csv, bookings_csv = args.rooms_csv, args.bookings_csv
+    else:
+        snapshots = latest_snapshots(args.output_dir, count=1)
+        if not snapshots:
+            raise SystemExit(f"No snapshots found in {args.output_dir}")
+        rooms_csv, bookings_csv = snapshots[0]
+    vocabulary_csv = args.vocabulary or os.path.join(args.output_dir, DEFAULT_VOCABULARY_CSV)
+
+    if args.out:
+        room_features = export_room_features(rooms_csv, args.out, vocabulary_csv)
+    else:
+        room_features = RoomFeatures.from_rooms_csv(rooms_csv, FeatureVocabulary.load(vocabulary_csv))
+
+    if args.list:
+        for feature_id, feature in enumerate(room_features.vocabulary.features):
+            print(f"  {feature_id:4d}  {feature_kind(feature):<10} {feature}")
+
+    if args.require or args.min_capacity is not None or args.free:
+        if args.free:
+            from availability import Availability
+
+            if not bookings_csv:
+                parser.error("--free needs --bookings-csv (or --output-dir)")
+            availability = Availability.from_csv(rooms_csv, bookings_csv)
+            p_start, p_end = (datetime.fromisoformat(value) for value in args.free)
+            selected = availability.free_mask(p_start, p_end) & room_features.mask_for(
+                availability.rooms, args.require, args.min_capacity)
+            matches = [availability.rooms[i] for i in selected.nonzero()[0]]
+        else:
+            matches = room_features.filter(args.require, args.min_capacity)
+        for room_number, building in matches:
+            print(f"  {building} {room_number}")
+        print(f"{len(matches)} rooms match")
@@ -0,0 +1,288 @@
+# ==========================================
+# Local free-room queries
+# Answers the free_rooms_per_building / free_rooms_list RPCs from
+# supabase_setup.sql straight from the scraper's CSV output
+# ==========================================
+#
+# Each room keeps its bookings as sorted start times plus a running maximum
+# of end times, so "is this room booked anywhere in [A, B)" and "first
+# booking after B" are each one binary search instead of a table scan.
+#
+# Usage:
+#   python room_index.py --output-dir output --start "2025-12-02 10:00" --end "2025-12-02 11:00"
+#   python room_index.py --output-dir output --check    # compare with the SQL, run in SQLite
+
+import csv
+import json
+import time
+import sqlite3
+import argparse
+from bisect import bisect_left
+from itertools import accumulate
+from datetime import datetime, timedelta
+
+from parse_common import EPOCH, MINUTES_PER_DAY, to_minutes, to_minutes_ceil
+from snapshot_diff import latest_snapshots
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _minutes(text):
+    return to_minutes(datetime.strptime(text, TIMESTAMP_FORMAT))
+
+
+class RoomIndex:
+    """
+    Rooms and their bookings, indexed for free-room queries.
+
+    Query results match the Supabase RPCs row for row, including ordering;
+    times are naive datetimes, like the TIMESTAMP columns.
+    """
+
+    def __init__(self, rooms, bookings):
+        """
+        rooms: (room_number, building, capacity, features) tuples.
+        bookings: (room_number, building, start, end) with start/end in
+        minutes since parse_common.EPOCH.
+        """
+        # Sorted by building then room_number, the tie-break order of both RPCs
+        self.rooms = sorted(rooms, key=lambda room: (room[1], room[0]))
+
+        intervals = {(room[1], room[0]): [] for room in self.rooms}
+        for room_number, building, start, end in bookings:
+            room_intervals = intervals.get((building, room_number))
+            # Like the RPCs' joins, bookings for unknown rooms are ignored
+            if room_intervals is not None:
+                room_intervals.append((start, end))
+
+        self.starts = []
+        self.max_ends = []
+        for room in self.rooms:
+            room_intervals = sorted(intervals[(room[1], room[0])])
+            self.starts.append([start for start, _ in room_intervals])
+            # max_ends[i] = latest end among the first i + 1 bookings by start
+            self.max_ends.append(list(accumulate((end for _, end in room_intervals), max)))
+
+    @classmethod
+    def from_csv(cls, rooms_csv, bookings_csv):
+        with open(rooms_csv, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # header
+            rooms = [(r[0], r[1], int(r[2]) if r[2] else None, r[3] or None) for r in reader]
+        with open(bookings_csv, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # header
+            bookings = [(r[0], r[1], _minutes(r[2]), _minutes(r[3])) for r in reader if r[2] and r[3]]
+        return cls(rooms, bookings)
+
+    @staticmethod
+    def _window(p_start, p_end):
+        # Bookings start and end on whole minutes, so flooring the start and
+        # rounding the end up keeps the RPCs' start/end comparisons exact
+        return to_minutes(p_start), to_minutes_ceil(p_end)
+
+    def _is_free(self, i, start, end):
+        # Bookings starting before end are starts[:k]; one overlaps iff its end is after start
+        k = bisect_left(self.starts[i], end)
+        return k == 0 or self.max_ends[i][k - 1] <= start
+
+    def _earliest_booking(self, i, start, end):
+        # MIN(start_time) with start_time >= end on the same date as start
+        day_start = start - start % MINUTES_PER_DAY
+        starts = self.starts[i]
+        k = bisect_left(starts, max(end, day_start))
+        if k < len(starts) and starts[k] < day_start + MINUTES_PER_DAY:
+            return starts[k]
+        return None
+
+    def _free_rooms(self, start, end):
+        return [i for i in range(len(self.rooms)) if self._is_free(i, start, end)]
+
+    def _counts(self, free):
+        counts = {}
+        for i in free:
+            building = self.rooms[i][1]
+            counts[building] = counts.get(building, 0) + 1
+        return counts
+
+    def free_rooms_per_building(self, p_start, p_end):
+        """[(building, free_room_count)], most free rooms first, then by building."""
+        counts = self._counts(self._free_rooms(*self._window(p_start, p_end)))
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+    def free_rooms_list(self, p_start, p_end):
+        """
+        [(room_number, building, capacity, features, earliest_booking)] for free rooms.
+
+        Ordered like the RPC: buildings with the most free rooms first, then
+        building, earliest_booking (None first), room_number.
+        """
+        start, end = self._window(p_start, p_end)
+        free = self._free_rooms(start, end)
+        counts = self._counts(free)
+
+        rows = []
+        for i in free:
+            room_number, building, capacity, features = self.rooms[i]
+            earliest = self._earliest_booking(i, start, end)
+            rows.append((-counts[building], building, earliest is not None, earliest or 0, room_number,
+                         (room_number, building, capacity, features,
+                          EPOCH + timedelta(minutes=earliest) if earliest is not None else None)))
+        rows.sort(key=lambda row: row[:5])
+        return [row[5] for row in rows]
+
+
+def rpc_answers(index, p_start, p_end):
+    """Both RPC results for a window, shaped like the PostgREST JSON responses."""
+    return {
+        'free_rooms_per_building': [
+            {'building': b, 'free_room_count': n} for b, n in index.free_rooms_per_building(p_start, p_end)
+        ],
+        'free_rooms_list': [
+            {'room_number': r[0], 'building': r[1], 'capacity': r[2], 'features': r[3],
+             'earliest_booking': r[4].isoformat() if r[4] else None}
+            for r in index.free_rooms_list(p_start, p_end)
+        ],
+    }
+
+# ==========================================
+# SQL CROSS-CHECK
+# ==========================================
+
+# The RPC bodies from supabase_setup.sql, with only the parameter syntax
+# changed for SQLite; TIMESTAMP text compares correctly as strings
+PER_BUILDING_SQL = """
+  SELECT r.building, COUNT(*) AS free_room_count
+  FROM Rooms r
+  WHERE NOT EXISTS (
+    SELECT 1 FROM Bookings b
+    WHERE b.room_number = r.room_number AND b.building = r.building
+      AND b.start_time < :p_end AND b.end_time > :p_start
+  )
+  GROUP BY r.building
+  ORDER BY free_room_count DESC, building ASC
+"""
+
+FREE_LIST_SQL = """
+  WITH free_count AS (
+    SELECT r.building, COUNT(*) AS free_room_count
+    FROM Rooms r
+    WHERE NOT EXISTS (
+      SELECT 1 FROM Bookings b
+      WHERE b.room_number = r.room_number AND b.building = r.building
+        AND b.start_time < :p_end AND b.end_time > :p_start
+    )
+    GROUP BY r.building
+  )
+  SELECT
+    r.room_number, r.building, r.capacity, r.features,
+    (
+      SELECT MIN(b.start_time) FROM Bookings b
+      WHERE b.room_number = r.room_number AND b.building = r.building
+        AND b.start_time >= :p_end
+        AND DATE(b.start_time) = DATE(:p_start)
+    ) AS earliest_booking
+  FROM Rooms r
+  JOIN free_count fc ON r.building = fc.building
+  WHERE NOT EXISTS (
+    SELECT 1 FROM Bookings b
+    WHERE b.room_number = r.room_number AND b.building = r.building
+      AND b.start_time < :p_end AND b.end_time > :p_start
+  )
+  ORDER BY fc.free_room_count DESC, r.building ASC, earliest_booking ASC NULLS FIRST, r.room_number ASC
+"""
+
+
+def _sqlite_reference(rooms_csv, bookings_csv):
+    db = sqlite3.connect(':memory:')
+    db.execute("CREATE TABLE Rooms (room_number TEXT, building TEXT, capacity INT, features TEXT,"
+               " PRIMARY KEY (room_number, building))")
+    db.execute("CREATE TABLE Bookings (room_number TEXT, building TEXT, start_time TEXT, end_time TEXT,"
+               " course_code TEXT, instructor TEXT, booking_type TEXT)")
+    for table, filename in (('Rooms', rooms_csv), ('Bookings', bookings_csv)):
+        with open(filename, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            db.executemany(
+                f"INSERT INTO {table} ({', '.join(header)}) VALUES ({', '.join('?' * len(header))})",
+                ([value if value != '' else None for value in row] for row in reader)
+            )
+    return db
+
+
+def check_against_sql(rooms_csv, bookings_csv):
+    """
+    Run both RPC queries in SQLite and through RoomIndex for many windows.
+
+    Windows cover every half hour from 07:00 to 22:00 on each booked day,
+    lasting 30 minutes to 3 hours, plus windows crossing midnight. Returns
+    the number of windows where the answers differ.
+    """
+    index = RoomIndex.from_csv(rooms_csv, bookings_csv)
+    db = _sqlite_reference(rooms_csv, bookings_csv)
+
+    days = sorted({row[0][:10] for row in db.execute("SELECT start_time FROM Bookings")})
+    windows = []
+    for day in days:
+        midnight = datetime.strptime(day, '%Y-%m-%d')
+        for slot in range(14, 45):
+            for length in (1, 2, 3, 6):
+                start = midnight + timedelta(minutes=30 * slot)
+                windows.append((start, start + timedelta(minutes=30 * length)))
+        windows.append((midnight + timedelta(hours=21), midnight + timedelta(hours=32)))
+
+    mismatches = 0
+    for p_start, p_end in windows:
+        params = {'p_start': p_start.strftime(TIMESTAMP_FORMAT), 'p_end': p_end.strftime(TIMESTAMP_FORMAT)}
+        expected_counts = [tuple(row) for row in db.execute(PER_BUILDING_SQL, params)]
+        expected_list = [
+            (r[0], r[1], r[2], r[3], datetime.strptime(r[4], TIMESTAMP_FORMAT) if r[4] else None)
+            for r in db.execute(FREE_LIST_SQL, params)
+        ]
+        if (index.free_rooms_per_building(p_start, p_end) != expected_counts
+                or index.free_rooms_list(p_start, p_end) != expected_list):
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"MISMATCH for [{p_start}, {p_end})")
+
+    print(f"{len(windows) - mismatches}/{len(windows)} windows identical "
+          f"({len(index.rooms)} rooms, {len(days)} booked days)")
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Answer the free-room RPCs locally from scraper CSVs')
+    parser.add_argument('--output-dir', type=str, default='output',
+                        help='Use the newest rooms/bookings CSV pair in this directory (default: output)')
+    parser.add_argument('--rooms-csv', type=str, help='Rooms CSV (overrides --output-dir)')
+    parser.add_argument('--bookings-csv', type=str, help='Bookings CSV (overrides --output-dir)')
+    parser.add_argument('--start', type=str, help='Window start, YYYY-MM-DD HH:MM')
+    parser.add_argument('--end', type=str, help='Window end, YYYY-MM-DD HH:MM')
+    parser.add_argument('--check', action='store_true',
+                        help='Compare the answers with the RPC SQL (run in SQLite) over many windows')
+    args = parser.parse_args()
+
+    if args.rooms_csv and args.bookings_csv:
+        rooms_csv, bookings_csv = args.rooms_csv, args.bookings_csv
+    else:
+        snapshots = latest_snapshots(args.output_dir, count=1)
+        if not snapshots:
+            raise SystemExit(f"No snapshots found in {args.output_dir}")
+        rooms_csv, bookings_csv = snapshots[0]
+
+    if args.check:
+        raise SystemExit(1 if check_against_sql(rooms_csv, bookings_csv) else 0)
+
+    if not (args.start and args.end):
+        parser.error("--start and --end are required unless --check is given")
+
+    index = RoomIndex.from_csv(rooms_csv, bookings_csv)
+    p_start = datetime.fromisoformat(args.start)
+    p_end = datetime.fromisoformat(args.end)
+
+    began = time.perf_counter()
+    answers = rpc_answers(index, p_start, p_end)
+    elapsed = time.perf_counter() - began
+
+    print(json.dumps(answers, indent=2))
+    print(f"Answered in {elapsed * 1e6:.0f} µs")
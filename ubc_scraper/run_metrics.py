@@ -0,0 +1,270 @@
+# ==========================================
+# Run metrics
+# Collects per-week download and parse figures, phase timings and peak
+# memory for one scraper run, and writes them as a JSON run report
+# ==========================================
+#
+# Download figures come from the week metadata: write_week_cache records
+# html_bytes and download_seconds, and the report keeps the weeks saved
+# during this run. Parse figures are the per-week stats returned by the
+# Phase 2 jobs (optimized_scraper.parse_week_job). Phase timings are
+# wall-clock seconds of the main thread.
+#
+# With --profile every Phase 2 job runs under cProfile; the per-week
+# profiles are merged into one pstats file next to the report, and the
+# report lists the top functions plus the usual suspects (HOTSPOTS).
+#
+# Usage:
+#   python optimized_scraper.py --rooms-csv output/rooms.csv --bookings-csv output/bookings.csv --profile
+#   python run_metrics.py output/run_report.json
+#   python -m pstats output/run_report.prof
+
+import os
+import sys
+import glob
+import json
+import time
+import pstats
+import cProfile
+import argparse
+import threading
+import statistics
+from contextlib import contextmanager
+from datetime import datetime
+
+from week_cache import load_metadata
+
+# Functions the profile summary always reports, matched by name
+HOTSPOTS = ('get_text', 'select_one', 'strptime', 'find_all', 'decode_grid', 'booking_details')
+PROFILE_TOP = 25
+
+try:
+    import resource
+except ImportError:  # Windows: no getrusage, peak memory is not reported
+    resource = None
+
+
+def peak_rss_mb(who='self'):
+    """Peak resident set size of this process (or its waited-for children) in MB."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    return round(usage.ru_maxrss / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+
+def report_path(bookings_csv):
+    """Default report file: run_report*.json next to the bookings CSV, with the same suffix."""
+    directory, name = os.path.split(bookings_csv)
+    stem = os.path.splitext(name)[0]
+    suffix = stem[len('bookings'):] if stem.startswith('bookings') else f"_{stem}"
+    return os.path.join(directory, f"run_report{suffix}.json")
+
+
+def _distribution(values):
+    values = sorted(value for value in values if value is not None)
+    if not values:
+        return None
+    return {
+        'total': sum(values),
+        'mean': statistics.fmean(values),
+        'p50': values[len(values) // 2],
+        'max': values[-1],
+    }
+
+
+class RunMetrics:
+    """Figures for one run; the add_* methods are safe to call from worker threads."""
+
+    def __init__(self):
+        self.started = datetime.now()
+        self.phases = {}
+        self.downloads = []
+        self.parsed_weeks = []
+        self.profile = None
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """Add the wall time of a with-block to phase name."""
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - began)
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_parsed(self, week_stats):
+        """Record parse_week_job stats dicts."""
+        with self.lock:
+            self.parsed_weeks.extend(week_stats)
+
+    def add_downloads(self, file_tuples):
+        """Record the weeks among file_tuples that were saved during this run."""
+        for _, metadata_filename in file_tuples:
+            try:
+                metadata = load_metadata(metadata_filename)
+                downloaded = datetime.fromisoformat(metadata['download_time'])
+            except (OSError, ValueError, KeyError):
+                continue
+            if downloaded < self.started:
+                continue
+            self.downloads.append({
+                'week': os.path.basename(metadata_filename)[:-len('.json')],
+                'week_text': metadata.get('week_text'),
+                'seconds': metadata.get('download_seconds'),
+                'html_bytes': metadata.get('html_bytes'),
+            })
+
+    def report(self, settings=None, outputs=()):
+        """The run report as a JSON-ready dict."""
+        phases = dict(self.phases)
+        if 'parse_export' in phases and 'parse_wait' in phases:
+            # Main-thread time not spent waiting on parse workers: writing the bookings CSV
+            phases['export_bookings'] = max(0.0, phases['parse_export'] - phases['parse_wait'])
+
+        parsed = [week for week in self.parsed_weeks if 'seconds' in week]
+        n_bookings = sum(week.get('bookings', 0) for week in parsed)
+        parse_wall = phases.get('parse_export') or phases.get('pipeline') or phases.get('parse')
+        worker_seconds = sum(week['seconds'] for week in parsed)
+        slowest = max(parsed, key=lambda week: week['seconds'], default=None)
+
+        finished = datetime.now()
+        return {
+            'started': self.started.isoformat(timespec='seconds'),
+            'finished': finished.isoformat(timespec='seconds'),
+            'duration_seconds': (finished - self.started).total_seconds(),
+            'settings': settings or {},
+            'phases': phases,
+            'download': {
+                'weeks': len(self.downloads),
+                'html_bytes': sum(week['html_bytes'] or 0 for week in self.downloads),
+                'latency_seconds': _distribution(week['seconds'] for week in self.downloads),
+                'per_week': self.downloads,
+            },
+            'parse': {
+                'weeks': len(parsed),
+                'cache_hits': sum(1 for week in parsed if week.get('cache_hit')),
+                'bookings': n_bookings,
+                'html_bytes': sum(week.get('html_bytes') or 0 for week in parsed),
+                'tables': sum(week.get('tables', 0) for week in parsed),
+                'cells': sum(week.get('cells', 0) for week in parsed),
+                'bookings_per_second': n_bookings / parse_wall if parse_wall else None,
+                'worker_seconds': worker_seconds,
+                'seconds_per_week': _distribution(week['seconds'] for week in parsed),
+                'slowest_week': slowest['week'] if slowest else None,
+                'per_week': sorted(parsed, key=lambda week: week['week']),
+            },
+            'memory': {
+                'peak_rss_mb': peak_rss_mb(),
+                'peak_rss_children_mb': peak_rss_mb('children'),
+            },
+            'outputs': {filename: os.path.getsize(filename) for filename in outputs if os.path.exists(filename)},
+            'profile': self.profile,
+        }
+
+    def write(self, filename, settings=None, outputs=()):
+        report = self.report(settings, outputs)
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Run report: {filename}")
+        return report
+
+# ==========================================
+# PROFILING
+# ==========================================
+
+def profile_call(profile_dir, name, function, *args):
+    """Run function(*args) under cProfile and save the stats as profile_dir/<name>.prof."""
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args)
+    finally:
+        profiler.dump_stats(os.path.join(profile_dir, f"{name}.prof"))
+
+
+def _is_function(function, name):
+    # Python functions are listed by name, C ones as "<built-in method name>" or "<method 'name' of ...>"
+    return function == name or function.endswith(f" {name}>") or f"'{name}'" in function
+
+
+def _function_label(key):
+    filename, line, function = key
+    return function if filename == '~' else f"{os.path.basename(filename)}:{line}({function})"
+
+
+def merge_profiles(profile_dir, out_file, top=PROFILE_TOP):
+    """
+    Merge the per-week profiles in profile_dir into out_file (pstats format).
+
+    Returns a summary for the run report: the top functions by own time and
+    the HOTSPOTS totals, or None when nothing was profiled.
+    """
+    files = sorted(glob.glob(os.path.join(profile_dir, '*.prof')))
+    if not files:
+        return None
+    stats = pstats.Stats(*files)
+    stats.dump_stats(out_file)
+
+    entries = [(key, calls, own, cumulative) for key, (_, calls, own, cumulative, _) in stats.stats.items()]
+    entries.sort(key=lambda entry: entry[2], reverse=True)
+    hotspots = {}
+    for name in HOTSPOTS:
+        matching = [entry for entry in entries if _is_function(entry[0][2], name)]
+        if matching:
+            hotspots[name] = {
+                'calls': sum(entry[1] for entry in matching),
+                'tottime': sum(entry[2] for entry in matching),
+                'cumtime': max(entry[3] for entry in matching),
+            }
+    return {
+        'file': out_file,
+        'weeks': len(files),
+        'total_seconds': stats.total_tt,
+        'hotspots': hotspots,
+        'top': [{'function': _function_label(key), 'calls': calls, 'tottime': own, 'cumtime': cumulative}
+                for key, calls, own, cumulative in entries[:top]],
+    }
+
+
+def print_profile(summary, top=15):
+    print(f"\nPhase 2 profile ({summary['weeks']} weeks, {summary['total_seconds']:.2f} s profiled): {summary['file']}")
+    print(f"  {'calls':>10} {'tottime':>9} {'cumtime':>9}  function")
+    for entry in summary['top'][:top]:
+        print(f"  {entry['calls']:>10} {entry['tottime']:>9.3f} {entry['cumtime']:>9.3f}  {entry['function']}")
+    if summary['hotspots']:
+        print("  Hotspots: " + ", ".join(f"{name} {figures['cumtime']:.3f} s cumulative"
+                                         for name, figures in summary['hotspots'].items()))
+
+
+def print_summary(report):
+    print(f"Run {report['started']} - {report['duration_seconds']:.1f} s")
+    for name, seconds in report['phases'].items():
+        print(f"  {name:<16} {seconds:9.2f} s")
+    download = report['download']
+    if download['weeks']:
+        latency = download['latency_seconds']
+        print(f"  downloaded {download['weeks']} weeks, {download['html_bytes'] / 1e6:.1f} MB"
+              + (f", latency p50 {latency['p50']:.2f} s, max {latency['max']:.2f} s" if latency else ""))
+    parse = report['parse']
+    if parse['weeks']:
+        rate = f", {parse['bookings_per_second']:,.0f} bookings/s" if parse['bookings_per_second'] else ""
+        print(f"  parsed {parse['weeks']} weeks ({parse['cache_hits']} cached): {parse['bookings']} bookings, "
+              f"{parse['tables']} tables, {parse['cells']} cells{rate}")
+    memory = report['memory']
+    if memory['peak_rss_mb'] is not None:
+        print(f"  peak RSS {memory['peak_rss_mb']} MB (workers {memory['peak_rss_children_mb']} MB)")
+    if report.get('profile'):
+        print_profile(report['profile'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Print the summary of a saved scraper run report')
+    parser.add_argument('report', type=str, help='run_report*.json written by optimized_scraper.py')
+    args = parser.parse_args()
+
+    with open(args.report, 'r', encoding='utf-8') as f:
+        print_summary(json.load(f))
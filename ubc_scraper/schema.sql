@@ -21,9 +21,29 @@ CREATE TABLE Bookings (
     end_time    TIMESTAMP,
     course_code VARCHAR(50),
     instructor VARCHAR(100),
-    booking_type VARCHAR(20) -- e.g., LEC, MAINT
+    booking_type VARCHAR(20), -- e.g., LEC, MAINT
+    -- [start_time, end_time] as a range, for GiST overlap lookups; closed so
+    -- zero-length bookings still overlap, and the exact start/end test runs after
+    period TSRANGE GENERATED ALWAYS AS (
+        tsrange(LEAST(start_time, end_time), GREATEST(start_time, end_time), '[]')
+    ) STORED
 );
 
+-- INDICIES FOR QUERY OPTIMIZATION (same as supabase_setup.sql)
+
+-- For the Anti-Join (Overlap Check): all bookings overlapping a window
+-- in one index scan, instead of one probe per room
+CREATE INDEX IF NOT EXISTS idx_bookings_period
+ON public.bookings USING gist (period);
+
+-- For the Earliest Booking Lookup: bookings on the same day
+CREATE INDEX IF NOT EXISTS idx_bookings_start_time
+ON public.bookings (start_time);
+
+-- Per-room lookups and the Rooms foreign key
+CREATE INDEX IF NOT EXISTS idx_bookings_next_time
+ON public.bookings (building, room_number, start_time);
+
 -- SELECT R.room_number, R.building, R.capacity, R.feautures
 -- FROM Rooms R
 -- LEFT JOIN Bookings B
@@ -38,6 +58,11 @@ CREATE TABLE Bookings (
 DROP FUNCTION IF EXISTS public.free_rooms_per_building(timestamp, timestamp) CASCADE;
 DROP FUNCTION IF EXISTS public.free_rooms_list(timestamp, timestamp) CASCADE;
 
+-- Both functions find the busy rooms once, with a single GiST scan of the
+-- bookings overlapping [p_start, p_end), and anti-join Rooms against them.
+-- The range is widened to '[]' so empty or reversed windows still match
+-- every row the exact start/end test below accepts.
+
 -- Function: free_rooms_per_building
 CREATE OR REPLACE FUNCTION public.free_rooms_per_building(
   p_start timestamp,
@@ -49,20 +74,21 @@ SECURITY DEFINER
 AS $$
 BEGIN
   RETURN QUERY
-  SELECT 
-    r.building::text,
-    COUNT(*)::bigint AS free_room_count
-  FROM Rooms r
-  WHERE NOT EXISTS (
-    SELECT 1
+  WITH busy AS (
+    SELECT DISTINCT b.building, b.room_number
     FROM Bookings b
-    WHERE b.room_number = r.room_number
-      AND b.building = r.building
+    WHERE b.period && tsrange(LEAST(p_start, p_end), GREATEST(p_start, p_end), '[]')
       AND b.start_time < p_end
       AND b.end_time > p_start
   )
+  SELECT 
+    r.building::text,
+    COUNT(*)::bigint AS free_room_count
+  FROM Rooms r
+  LEFT JOIN busy ON busy.building = r.building AND busy.room_number = r.room_number
+  WHERE busy.room_number IS NULL
   GROUP BY r.building
-  ORDER BY free_room_count DESC, building ASC;
+  ORDER BY free_room_count DESC, r.building ASC;
 END;
 $$;
 
@@ -83,45 +109,40 @@ SECURITY DEFINER
 AS $$
 BEGIN
   RETURN QUERY
-  WITH free_count AS (
-    SELECT 
-      r.building,
-      COUNT(*) AS free_room_count
-    FROM Rooms r
-    WHERE NOT EXISTS (
-      SELECT 1
-      FROM Bookings b
-      WHERE b.room_number = r.room_number
-        AND b.building = r.building
-        AND b.start_time < p_end
-        AND b.end_time > p_start
-    )
-    GROUP BY r.building
-  )
-  SELECT
-    r.room_number,
-    r.building::text,
-    r.capacity,
-    r.features::text,
-    (
-      SELECT MIN(b.start_time)
-      FROM Bookings b
-      WHERE b.room_number = r.room_number
-        AND b.building = r.building
-        AND b.start_time::date = p_start::date
-    ) AS earliest_booking
-  FROM Rooms r
-  JOIN free_count fc ON r.building = fc.building
-  WHERE NOT EXISTS (
-    SELECT 1
+  WITH busy AS (
+    SELECT DISTINCT b.building, b.room_number
     FROM Bookings b
-    WHERE b.room_number = r.room_number
-      AND b.building = r.building
+    WHERE b.period && tsrange(LEAST(p_start, p_end), GREATEST(p_start, p_end), '[]')
       AND b.start_time < p_end
       AND b.end_time > p_start
+  ),
+  free AS (
+    SELECT
+      r.room_number,
+      r.building,
+      r.capacity,
+      r.features,
+      COUNT(*) OVER (PARTITION BY r.building) AS free_room_count
+    FROM Rooms r
+    LEFT JOIN busy ON busy.building = r.building AND busy.room_number = r.room_number
+    WHERE busy.room_number IS NULL
+  ),
+  first_booking AS (
+    -- first booking on p_start's day, found with one range scan for all rooms
+    SELECT b.building, b.room_number, MIN(b.start_time) AS first_start
+    FROM Bookings b
+    WHERE b.start_time >= p_start::date
+      AND b.start_time < p_start::date + 1
+    GROUP BY b.building, b.room_number
   )
-  ORDER BY fc.free_room_count DESC, r.building ASC, r.room_number ASC;
+  SELECT
+    f.room_number,
+    f.building::text,
+    f.capacity,
+    f.features::text,
+    fb.first_start
+  FROM free f
+  LEFT JOIN first_booking fb ON fb.building = f.building AND fb.room_number = f.room_number
+  ORDER BY f.free_room_count DESC, f.building ASC, f.room_number ASC;
 END;
 $$;
-
-
@@ -0,0 +1,302 @@
+# ==========================================
+# UBC Online Timetable - Selenium Downloader
+# Phase 1 backend that drives Chrome through the timetable form and
+# saves each week's popup page to the HTML cache
+# ==========================================
+#
+# Imported only when --downloader selenium runs, so the other stages
+# need neither selenium nor Chrome.
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import Select
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import WebDriverException
+
+from week_cache import (
+    WeekPlan, is_week_option, room_shards, week_label, cache_paths, write_week_cache, discard_stale_shards
+)
+from html_store import DEFAULT_CODEC
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+
+DOWNLOAD_RETRIES = 3  # Attempts per week in a download worker
+
+# ==========================================
+# FORM AND DOWNLOAD
+# ==========================================
+
+def open_timetable_form(base_url, debug, verbose=True):
+    """Start a Chrome driver and fill in the room and period selections."""
+
+    driver = webdriver.Chrome()
+
+    try:
+        # Open website
+        driver.get(base_url)
+        if verbose:
+            print(f"Opened: {driver.title}")
+
+        # Click General Teaching Spaces
+        gts_button = driver.find_element(by='xpath', value='//*[@id="LinkBtn_locationByZone"]')
+        driver.execute_script("arguments[0].click();", gts_button)
+
+        # Select all rooms
+        room_list = driver.find_element(By.ID, "dlObject")
+        if debug:
+            # Select first 30 rooms for debug mode
+            driver.execute_script("""
+                var select = arguments[0];
+                for (var i = 0; i < Math.min(30, select.options.length); i++) {
+                    select.options[i].selected = true;
+                }
+            """, room_list)
+            if verbose:
+                print("Selected 30 rooms (DEBUG mode)")
+        else:
+            driver.execute_script("""
+                var select = arguments[0];
+                for (var i = 0; i < select.options.length; i++) {
+                    select.options[i].selected = true;
+                }
+            """, room_list)
+            if verbose:
+                print("Selected all rooms")
+
+        # Select "All Day" period
+        period_dropdown = driver.find_element(By.ID, "dlPeriod")
+        period_select = Select(period_dropdown)
+        period_select.select_by_value("0-30")
+        if verbose:
+            print("Selected 'All Day 07:00 - 22:00'")
+
+        return driver
+
+    except Exception:
+        driver.quit()
+        raise
+
+
+def select_room_range(driver, start, stop):
+    """Select only the dlObject options in [start, stop) for a room shard."""
+    room_list = driver.find_element(By.ID, "dlObject")
+    driver.execute_script("""
+        var select = arguments[0];
+        for (var i = 0; i < select.options.length; i++) {
+            select.options[i].selected = (i >= arguments[1] && i < arguments[2]);
+        }
+    """, room_list, start, stop)
+
+
+def list_pending_weeks(driver, cache_dir, debug, room_shard_size=0, plan=None):
+    """
+    Read the lbWeeks options and split the selected weeks into cached and pending.
+
+    plan (a week_cache.WeekPlan) decides which weeks are selected and which
+    cached ones are downloaded again. Returns (cached, pending): cached maps (week index, shard) -> cache file
+    pair, pending is a list of (index, week_text, shard) still to download.
+    shard is None unless room_shard_size splits the room list.
+    """
+    week_list = driver.find_element(by='xpath', value='//*[@id="lbWeeks"]')
+    week_options = week_list.find_elements(By.TAG_NAME, "option")
+
+    room_list = driver.find_element(By.ID, "dlObject")
+    n_rooms = driver.execute_script("return arguments[0].options.length;", room_list)
+    if debug:
+        n_rooms = min(30, n_rooms)
+    shards = room_shards(n_rooms, room_shard_size)
+    if shards[0] is not None:
+        print(f"Splitting {n_rooms} rooms into {len(shards)} shards of up to {room_shard_size}")
+
+    if plan is None:
+        plan = WeekPlan(debug)
+
+    cached = {}
+    pending = []
+
+    for i, week in enumerate(week_options):
+        week_text = week.text
+
+        # Skip non-week entries
+        if not is_week_option(week_text):
+            continue
+
+        # WEEK LIMITERS (see week_cache.WeekPlan)
+        if not plan.selects(i, week_text):
+            continue
+
+        discard_stale_shards(cache_dir, i, shards)
+        for shard in shards:
+            cache_filename, metadata_filename = cache_paths(cache_dir, i, shard)
+
+            # Skip if cached and the refresh policy keeps it
+            download, reason = plan.needs_download(cache_filename, metadata_filename, week_text)
+            if not download:
+                print(f"[{week_label(i, shard)}] Cached ({reason}): {week_text}")
+                cached[(i, shard)] = (cache_filename, metadata_filename)
+                continue
+
+            if reason != "not cached":
+                print(f"[{week_label(i, shard)}] Refreshing ({reason}): {week_text}")
+            pending.append((i, week_text, shard))
+
+    return cached, pending
+
+
+def fetch_week(driver, week_text, shard=None):
+    """
+    Submit the timetable form for one week (or room shard).
+
+    Returns the popup's page source and how long the request took; saving
+    it is left to the caller, so only the browser round-trip is retried.
+    """
+
+    if shard is not None:
+        select_room_range(driver, shard[1], shard[2])
+
+    # Refetch to avoid stale references
+    week_list = driver.find_element(By.XPATH, '//*[@id="lbWeeks"]')
+    week_select = Select(week_list)
+
+    week_select.deselect_all()
+    week_select.select_by_visible_text(week_text)
+    WebDriverWait(driver, 2).until(lambda d: True)
+
+    # Click "Get Timetable"
+    began = time.perf_counter()
+    main_window = driver.current_window_handle
+    get_button = driver.find_element(By.XPATH, '//*[@id="bGetTimetable"]')
+    driver.execute_script("arguments[0].click();", get_button)
+
+    # Wait for new window
+    WebDriverWait(driver, 5).until(lambda d: len(d.window_handles) > 1)
+
+    # Switch to new window
+    new_window = [w for w in driver.window_handles if w != main_window][0]
+    driver.switch_to.window(new_window)
+
+    try:
+        return driver.page_source, time.perf_counter() - began
+    finally:
+        # Close new window and return to main
+        driver.close()
+        driver.switch_to.window(main_window)
+
+
+def download_week_shard(shard, cache_dir, debug, base_url, worker_id=None, on_week_saved=None,
+                        codec=DEFAULT_CODEC, driver=None):
+    """
+    Download a slice of weeks with one Chrome driver.
+
+    A failed week is retried up to DOWNLOAD_RETRIES times on a fresh driver,
+    since a timed-out popup usually leaves the session in an unknown state.
+    Saving the page and on_week_saved run after the retries; an error there
+    is reported for that week and the slice carries on. driver, if given, is
+    used first and quit at the end like the drivers opened here.
+    """
+    results = {}
+    worker = f" (worker {worker_id})" if worker_id is not None else ""
+
+    try:
+        for i, week_text, room_shard in shard:
+            label = week_label(i, room_shard)
+            for attempt in range(1, DOWNLOAD_RETRIES + 1):
+                try:
+                    if driver is None:
+                        driver = open_timetable_form(base_url, debug, verbose=False)
+                    print(f"[{label}] Downloading: {week_text}{worker}"
+                          + (f" (retry {attempt - 1})" if attempt > 1 else ""))
+                    html, download_seconds = fetch_week(driver, week_text, room_shard)
+                    break
+                except WebDriverException as e:
+                    print(f"[{label}] Browser error{worker}: {e.__class__.__name__}")
+                    if driver is not None:
+                        driver.quit()
+                        driver = None
+            else:
+                print(f"[{label}] Giving up after {DOWNLOAD_RETRIES} attempts")
+                continue
+
+            try:
+                file_tuple = write_week_cache(cache_dir, i, week_text, html, room_shard, codec, download_seconds)
+                if on_week_saved:
+                    on_week_saved(file_tuple)
+                results[(i, room_shard)] = file_tuple
+            except Exception as e:
+                print(f"[{label}] Error saving week: {e}")
+    finally:
+        if driver is not None:
+            driver.quit()
+
+    return results
+
+
+def download_week_htmls(cache_dir, debug, base_url, workers=1, room_shard_size=0,
+                        on_week_saved=None, codec=DEFAULT_CODEC, plan=None):
+    """
+    Download all week HTMLs using Selenium.
+
+    Each week is an independent form submission, so with workers > 1 the
+    pending weeks are sharded across that many Chrome drivers, each
+    handling a disjoint slice of the lbWeeks indices.
+
+    With room_shard_size set, each week is requested as several smaller
+    timetables of that many rooms, each saved as its own cache pair, which
+    keeps page_source (and Chrome's memory) small.
+
+    on_week_saved(file_tuple), if given, is called for every cached or newly
+    saved week as soon as it is on disk (possibly from worker threads).
+
+    plan (a week_cache.WeekPlan) selects the weeks and the refresh policy;
+    by default only missing weeks are downloaded. The caller caps workers
+    (optimized_scraper.MAX_DOWNLOAD_WORKERS).
+    """
+    
+    print("=" * 60)
+    print(f"PHASE 1: Downloading HTML pages ({workers} browser{'s' if workers != 1 else ''})")
+    print("=" * 60)
+    
+    driver = open_timetable_form(base_url, debug)
+    
+    try:
+        downloaded, pending = list_pending_weeks(driver, cache_dir, debug, room_shard_size, plan)
+        if on_week_saved:
+            for key in sorted(downloaded, key=lambda k: (k[0], k[1] or ())):
+                on_week_saved(downloaded[key])
+
+        if workers <= 1 or len(pending) <= 1:
+            # Single browser: hand the driver that listed the weeks to the same retrying loop
+            listing_driver, driver = driver, None
+            downloaded.update(download_week_shard(pending, cache_dir, debug, base_url, None, on_week_saved,
+                                                  codec, driver=listing_driver))
+        else:
+            driver.quit()
+            driver = None
+
+            # Round-robin so each browser gets a mix of early and late weeks
+            n_workers = min(workers, len(pending))
+            shards = [pending[w::n_workers] for w in range(n_workers)]
+
+            with ThreadPoolExecutor(max_workers=n_workers) as executor:
+                futures = {
+                    executor.submit(download_week_shard, shard, cache_dir, debug, base_url, w, on_week_saved, codec): w
+                    for w, shard in enumerate(shards)
+                }
+                for future in as_completed(futures):
+                    try:
+                        downloaded.update(future.result())
+                    except Exception as e:
+                        print(f"Worker {futures[future]} error: {e}")
+        
+        downloaded_files = [downloaded[key] for key in sorted(downloaded, key=lambda k: (k[0], k[1] or ()))]
+        print(f"\nDownloaded {len(downloaded_files)} weeks" + (" (room shards)" if room_shard_size else ""))
+        return downloaded_files
+        
+    finally:
+        if driver is not None:
+            driver.quit()
@@ -0,0 +1,231 @@
+# ==========================================
+# Snapshot delta export
+# Compares two scraper snapshots (rooms + bookings CSVs) and writes only
+# what changed, so Supabase can be updated without a full reload
+# ==========================================
+#
+# Bookings are matched on (building, room_number, start_time, course_code).
+# Any key whose rows differ is deleted and re-inserted as a whole;
+# rooms are matched on (building, room_number). delta.sql also refreshes
+# Free_Intervals (see free_intervals.py) for the days the changes touch.
+#
+# Usage:
+#   python snapshot_diff.py --output-dir output          # newest two snapshots
+#   python snapshot_diff.py --old-rooms A.csv --old-bookings B.csv \
+#                           --new-rooms C.csv --new-bookings D.csv --out-dir delta
+
+import os
+import csv
+import glob
+import argparse
+from collections import defaultdict
+
+from parse_common import BOOKING_FIELDS
+from sql_file_handler import (
+    SQLFileHandler, SQL_STYLES, DEFAULT_SQL_STYLE, DEFAULT_BATCH_SIZE,
+    ROOMS_TABLE, ROOM_COLUMNS, BOOKINGS_TABLE
+)
+from free_intervals import busy_by_day, covered_days, touched_days, write_refresh_sql
+
+BOOKING_KEY_FIELDS = ('building', 'room_number', 'start_time', 'course_code')
+BOOKING_KEY_INDEXES = tuple(BOOKING_FIELDS.index(field) for field in BOOKING_KEY_FIELDS)
+
+DELTA_BOOKINGS_CSV = 'delta_bookings.csv'
+DELTA_ROOMS_CSV = 'delta_rooms.csv'
+DELTA_SQL = 'delta.sql'
+
+
+def _read_rows(filename):
+    if not os.path.exists(filename):
+        return []
+    with open(filename, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        return [tuple(row) for row in reader]
+
+
+def booking_key(row):
+    return tuple(row[i] for i in BOOKING_KEY_INDEXES)
+
+
+def _group_bookings(rows):
+    groups = defaultdict(list)
+    for row in rows:
+        groups[booking_key(row)].append(row)
+    return groups
+
+
+def diff_bookings(old_rows, new_rows):
+    """
+    Return (deleted, inserted) booking rows between two snapshots.
+
+    For every key whose set of rows changed, all old rows with that key are
+    deleted and all new rows with that key inserted, so applying the delta
+    key by key reproduces the new snapshot exactly.
+    """
+    old_groups = _group_bookings(old_rows)
+    new_groups = _group_bookings(new_rows)
+
+    deleted = []
+    inserted = []
+    for key in sorted(old_groups.keys() | new_groups.keys()):
+        old = old_groups.get(key, [])
+        new = new_groups.get(key, [])
+        if sorted(old) != sorted(new):
+            deleted.extend(old)
+            inserted.extend(new)
+    return deleted, inserted
+
+
+def diff_rooms(old_rows, new_rows):
+    """Return (upserted, removed) room rows; upserted covers added and changed rooms."""
+    old_rooms = {(row[1], row[0]): row for row in old_rows}
+    new_rooms = {(row[1], row[0]): row for row in new_rows}
+
+    upserted = [new_rooms[key] for key in sorted(new_rooms) if old_rooms.get(key) != new_rooms[key]]
+    removed = [old_rooms[key] for key in sorted(old_rooms) if key not in new_rooms]
+    return upserted, removed
+
+
+def latest_snapshots(output_dir, count=2):
+    """Return the newest (rooms_csv, bookings_csv) pairs in output_dir, oldest first."""
+    pairs = []
+    for rooms_csv in sorted(glob.glob(os.path.join(output_dir, 'rooms_*.csv'))):
+        stamp = os.path.basename(rooms_csv)[len('rooms_'):]
+        bookings_csv = os.path.join(output_dir, 'bookings_' + stamp)
+        if os.path.exists(bookings_csv):
+            pairs.append((rooms_csv, bookings_csv))
+    return pairs[-count:]
+
+# ==========================================
+# DELTA OUTPUT
+# ==========================================
+
+def write_delta_csvs(out_dir, deleted, inserted, upserted, removed):
+    """Write the booking and room changes as CSVs with a leading 'change' column."""
+    with open(os.path.join(out_dir, DELTA_BOOKINGS_CSV), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(('change',) + BOOKING_FIELDS)
+        writer.writerows(('delete',) + row for row in deleted)
+        writer.writerows(('insert',) + row for row in inserted)
+
+    with open(os.path.join(out_dir, DELTA_ROOMS_CSV), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(('change',) + ROOM_COLUMNS)
+        writer.writerows(('upsert',) + row for row in upserted)
+        writer.writerows(('delete',) + row for row in removed)
+
+
+def _batches(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def write_delta_sql(sql_file, deleted, inserted, upserted, removed,
+                    style=DEFAULT_SQL_STYLE, batch_size=DEFAULT_BATCH_SIZE, snapshots=None):
+    """
+    Write the delta as one transaction.
+
+    Order matters for the Bookings -> Rooms foreign key: rooms are upserted
+    first, then changed booking keys deleted and re-inserted, and removed
+    rooms are deleted last.
+
+    snapshots, the (old_rooms, old_bookings, new_rooms, new_bookings) rows,
+    adds a Free_Intervals refresh of only the days whose bookings changed,
+    plus days the new snapshot newly covers.
+    """
+    key_columns = ", ".join(BOOKING_KEY_FIELDS)
+
+    with SQLFileHandler(sql_file, style, batch_size) as sql:
+        for batch in _batches(upserted, batch_size):
+            values = ",\n".join(sql.sql_values(ROOM_COLUMNS, row) for row in batch)
+            sql.write_sql(
+                f"INSERT INTO {ROOMS_TABLE} ({', '.join(ROOM_COLUMNS)}) VALUES\n{values}\n"
+                f"ON CONFLICT (room_number, building) DO UPDATE\n"
+                f"SET capacity = EXCLUDED.capacity, features = EXCLUDED.features;"
+            )
+
+        # One DELETE per batch of keys, joined against a VALUES list
+        deleted_keys = sorted({booking_key(row) for row in deleted})
+        for batch in _batches(deleted_keys, batch_size):
+            values = ",\n".join(sql.sql_values(BOOKING_KEY_FIELDS, key) for key in batch)
+            sql.write_sql(
+                f"DELETE FROM {BOOKINGS_TABLE} b USING (VALUES\n{values}\n) AS d({key_columns})\n"
+                f"WHERE b.building = d.building AND b.room_number = d.room_number\n"
+                f"  AND b.start_time = d.start_time::timestamp AND b.course_code = d.course_code;"
+            )
+
+        if inserted:
+            sql.export_bookings_to_sql(inserted)
+
+        if snapshots is not None:
+            _write_free_intervals_refresh(sql, deleted, inserted, *snapshots)
+
+        for batch in _batches(removed, batch_size):
+            values = ",\n".join(sql.sql_values(('room_number', 'building'), row[:2]) for row in batch)
+            sql.write_sql(
+                f"DELETE FROM {ROOMS_TABLE} r USING (VALUES\n{values}\n) AS d(room_number, building)\n"
+                f"WHERE r.room_number = d.room_number AND r.building = d.building;"
+            )
+
+
+def _write_free_intervals_refresh(sql, deleted, inserted, old_rooms, old_bookings, new_rooms, new_bookings):
+    new_covered = covered_days(new_bookings)
+    days = touched_days(deleted, inserted)
+    days.update(set(new_covered) - set(covered_days(old_bookings)))
+
+    old_keys = {(row[0], row[1]) for row in old_rooms}
+    rooms = [(row[0], row[1]) for row in new_rooms]
+    added = [room for room in rooms if room not in old_keys]
+    write_refresh_sql(sql, rooms, busy_by_day(new_bookings), days, added, new_covered)
+
+
+def export_delta(old_rooms_csv, old_bookings_csv, new_rooms_csv, new_bookings_csv, out_dir,
+                 style=DEFAULT_SQL_STYLE, batch_size=DEFAULT_BATCH_SIZE):
+    """Diff two snapshots and write delta CSVs and delta.sql into out_dir; returns the change counts."""
+    snapshots = (_read_rows(old_rooms_csv), _read_rows(old_bookings_csv),
+                 _read_rows(new_rooms_csv), _read_rows(new_bookings_csv))
+    old_rooms, old_bookings, new_rooms, new_bookings = snapshots
+    deleted, inserted = diff_bookings(old_bookings, new_bookings)
+    upserted, removed = diff_rooms(old_rooms, new_rooms)
+
+    os.makedirs(out_dir, exist_ok=True)
+    write_delta_csvs(out_dir, deleted, inserted, upserted, removed)
+    write_delta_sql(os.path.join(out_dir, DELTA_SQL), deleted, inserted, upserted, removed, style, batch_size,
+                    snapshots)
+
+    print(f"Bookings: {len(deleted)} deleted, {len(inserted)} inserted")
+    print(f"Rooms: {len(upserted)} added or changed, {len(removed)} removed")
+    print(f"Delta written to {out_dir}/ ({DELTA_BOOKINGS_CSV}, {DELTA_ROOMS_CSV}, {DELTA_SQL})")
+    return {'deleted': len(deleted), 'inserted': len(inserted), 'upserted': len(upserted), 'removed': len(removed)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export only the changes between two scraper snapshots')
+    parser.add_argument('--output-dir', type=str, default='output',
+                        help='Compare the newest two snapshots in this directory (default: output)')
+    parser.add_argument('--old-rooms', type=str, help='Previous rooms CSV')
+    parser.add_argument('--old-bookings', type=str, help='Previous bookings CSV')
+    parser.add_argument('--new-rooms', type=str, help='New rooms CSV')
+    parser.add_argument('--new-bookings', type=str, help='New bookings CSV')
+    parser.add_argument('--out-dir', type=str, default=None,
+                        help='Where to write the delta (default: <output-dir>/delta)')
+    parser.add_argument('--style', choices=SQL_STYLES, default=DEFAULT_SQL_STYLE,
+                        help=f'How inserted bookings are written in delta.sql (default: {DEFAULT_SQL_STYLE})')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.new_rooms and args.new_bookings:
+        old = (args.old_rooms or '', args.old_bookings or '')
+        new = (args.new_rooms, args.new_bookings)
+    else:
+        snapshots = latest_snapshots(args.output_dir)
+        if not snapshots:
+            raise SystemExit(f"No snapshots found in {args.output_dir}")
+        new = snapshots[-1]
+        old = snapshots[0] if len(snapshots) > 1 else ('', '')
+        print(f"Old snapshot: {old[1] or '(none)'}")
+        print(f"New snapshot: {new[1]}")
+
+    export_delta(old[0], old[1], new[0], new[1],
+                 args.out_dir or os.path.join(args.output_dir, 'delta'), args.style, args.batch_size)
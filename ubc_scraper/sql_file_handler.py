@@ -1,99 +1,199 @@
 from datetime import datetime
 import os
 import re
+import csv
+import argparse
+
+from parse_common import BOOKING_FIELDS
+
+# Output styles:
+#   insert  one INSERT per row (slowest to load, works anywhere)
+#   batch   multi-row INSERTs of batch_size rows (Supabase SQL editor)
+#   copy    COPY ... FROM stdin blocks (fastest; needs psql -f)
+SQL_STYLES = ('insert', 'batch', 'copy')
+DEFAULT_SQL_STYLE = 'batch'
+DEFAULT_BATCH_SIZE = 1000
+
+ROOMS_TABLE = "Rooms"
+ROOM_COLUMNS = ("room_number", "building", "capacity", "features")
+BOOKINGS_TABLE = "Bookings"
+
+# Columns written as bare numbers rather than quoted strings
+NUMERIC_COLUMNS = frozenset(("capacity",))
+
+COPY_ESCAPES = str.maketrans({'\\': '\\\\'})
+
 
 class SQLFileHandler:
     """
-    Manages the output SQL file using hardcoded modes based on expected call order:
-    1. export_bookings_to_sql uses 'w' (create/overwrite).
-    2. export_rooms_to_sql uses 'a' (append).
-    
-    NOTE: This implementation requires 'export_bookings_to_sql' to always be 
-    called before 'export_rooms_to_sql' for the desired 'w' then 'a' sequence.
+    Streams Rooms and Bookings into a SQL file that loads in one transaction.
+
+    The file lifecycle is explicit: open() writes the header and BEGIN,
+    close() writes COMMIT (or ROLLBACK after a failure). As a context
+    manager:
+
+        with SQLFileHandler('data.sql', style='copy') as sql:
+            sql.export_rooms_to_sql(rooms)
+            sql.export_bookings_to_sql(bookings)
+
+    Rows are written as they are read from the iterators, at most
+    batch_size at a time, so nothing is held in memory. Rooms must be
+    written before bookings, which reference them.
     """
-    def __init__(self, filename):
+    def __init__(self, filename, style=DEFAULT_SQL_STYLE, batch_size=DEFAULT_BATCH_SIZE):
+        if style not in SQL_STYLES:
+            raise ValueError(f"Unknown SQL style '{style}', expected one of {SQL_STYLES}")
         self.filename = filename
-            
+        self.style = style
+        self.batch_size = max(1, batch_size)
+        self.file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None)
+
+    def open(self):
+        """Create (or overwrite) the file and start the transaction."""
+        self.file = open(self.filename, 'w', encoding='utf-8')
+        self.file.write(f"-- UBC timetable data generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        self.file.write(f"-- Style: {self.style}\n\n")
+        self.file.write("BEGIN;\n")
+        return self
+
+    def close(self, commit=True):
+        """End the transaction and close the file."""
+        if self.file is None:
+            return
+        self.file.write("\nCOMMIT;\n" if commit else "\nROLLBACK;\n")
+        self.file.close()
+        self.file = None
+
     def escape_sql_string(self, text):
-        # (escape_sql_string content remains the same)
         if text is None:
             return ''
         cleaned_text = str(text)
         cleaned_text = re.sub(r'[\n\r\t]+', ' ', cleaned_text)
         return cleaned_text.replace("'", "''")
 
-    def export_rooms_to_sql(self, rooms_data_set):
-        """Generates SQL INSERT statements for Rooms and APPENDS them to the file."""
-
-        sql_statements = []
-        TABLE_NAME = "Rooms"
-        COLUMNS = ["room_number", "building", "capacity", "features"]
-        column_list = ", ".join(COLUMNS)
-        
-        for room_tuple in rooms_data_set:
-            room_number, building, capacity, features = room_tuple
-            values = [
-                f"'{self.escape_sql_string(str(room_number))}'" if room_number is not None else 'NULL', 
-                f"'{self.escape_sql_string(building)}'",
-                f"{capacity}" if capacity is not None else 'NULL',
-                f"'{self.escape_sql_string(features)}'",
-            ]
-            values_list = ", ".join(values)
-            sql = f"INSERT INTO {TABLE_NAME} ({column_list}) VALUES ({values_list});"
-            sql_statements.append(sql)
-
-        try:
-            file_mode = 'w'
-            
-            with open(self.filename, file_mode, encoding='utf-8') as f: 
-                
-                # Add separators before writing Room data
-                f.write("\n\n") 
-                    
-                f.write(f"-- SQL INSERT Statements for Rooms generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"-- Target Table: {TABLE_NAME}\n\n")
-                f.write("\n".join(sql_statements))
-                
-            print(f"✅ Successfully exported {len(sql_statements)} unique Room details to '{os.path.abspath(self.filename)}' (Mode: '{file_mode}')")
-
-        except IOError as e:
-            print(f"❌ Error writing to file {self.filename}: {e}")
-
-    # --- BOOKINGS EXPORT METHOD (Always uses 'w' - OVERWRITE/CREATE) ---
+    def write_sql(self, text):
+        """Write raw SQL (one or more complete statements) inside the transaction."""
+        if self.file is None:
+            raise RuntimeError(f"{self.filename} is not open; call open() or use SQLFileHandler as a context manager")
+        self.file.write(text if text.endswith("\n") else text + "\n")
+
+    def sql_values(self, columns, row):
+        """Format one row as a parenthesized VALUES tuple."""
+        return "(" + ", ".join([self._sql_value(c, v) for c, v in zip(columns, row)]) + ")"
+
+    def _sql_value(self, column, value):
+        if column in NUMERIC_COLUMNS:
+            return 'NULL' if value is None or value == '' else str(int(value))
+        if value is None:
+            return 'NULL'
+        return f"'{self.escape_sql_string(value)}'"
+
+    def _copy_value(self, value):
+        if value is None:
+            return '\\N'
+        # Same whitespace cleanup as the INSERT styles, then COPY text escaping
+        return re.sub(r'[\n\r\t]+', ' ', str(value)).translate(COPY_ESCAPES)
+
+    def write_rows(self, table, columns, rows):
+        """Write an iterable of value tuples (in columns order) to table; returns the row count."""
+        if self.file is None:
+            raise RuntimeError(f"{self.filename} is not open; call open() or use SQLFileHandler as a context manager")
+
+        f = self.file
+        column_list = ", ".join(columns)
+        f.write(f"\n-- Target Table: {table}\n")
+
+        count = 0
+        if self.style == 'copy':
+            f.write(f"COPY {table} ({column_list}) FROM stdin;\n")
+            for row in rows:
+                f.write("\t".join([self._copy_value(value) for value in row]) + "\n")
+                count += 1
+            f.write("\\.\n")
+            return count
+
+        batch = []
+        for row in rows:
+            batch.append(self.sql_values(columns, row))
+            count += 1
+            if self.style == 'insert' or len(batch) >= self.batch_size:
+                self._write_insert(table, column_list, batch)
+                batch = []
+        if batch:
+            self._write_insert(table, column_list, batch)
+        return count
+
+    def _write_insert(self, table, column_list, batch):
+        if len(batch) == 1:
+            self.file.write(f"INSERT INTO {table} ({column_list}) VALUES {batch[0]};\n")
+        else:
+            self.file.write(f"INSERT INTO {table} ({column_list}) VALUES\n" + ",\n".join(batch) + ";\n")
+
+    def export_rooms_to_sql(self, rooms):
+        """Write room tuples (room_number, building, capacity, features)."""
+        count = self.write_rows(ROOMS_TABLE, ROOM_COLUMNS, rooms)
+        print(f"✅ Exported {count} Rooms to '{os.path.abspath(self.filename)}' ({self.style})")
+        return count
 
     def export_bookings_to_sql(self, bookings):
-        """Generates SQL INSERT statements and WRITES/OVERWRITES the file."""
-        
-        sql_statements = []
-        TABLE_NAME = "Bookings"
-        COLUMNS = ["room_number", "building", "start_time", "end_time", "course_code", "instructor", "booking_type"]
-        column_list = ", ".join(COLUMNS)
-        
-        for booking in bookings:
-            # (Booking loop code is the same)
-            values = [ 
-                f"'{self.escape_sql_string(booking['room_number'])}'", f"'{self.escape_sql_string(booking['building'])}'",
-                f"'{booking['start_time']}'", f"'{booking['end_time']}'", 
-                f"'{self.escape_sql_string(booking['course_code'])}'",
-                f"'{self.escape_sql_string(booking['instructor'])}'", f"'{self.escape_sql_string(booking['booking_type'])}'",
-            ]
-            values_list = ", ".join(values)
-            sql = f"INSERT INTO {TABLE_NAME} ({column_list}) VALUES ({values_list});"
-            sql_statements.append(sql)
-
-        try:
-            
-            file_mode = 'a' 
-
-            with open(self.filename, file_mode, encoding='utf-8') as f: 
-                
-                # Write the Bookings header (this clears any previous content)
-                f.write(f"-- SQL INSERT Statements for Bookings generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"-- Target Table: {TABLE_NAME}\n\n")
-                
-                f.write("\n".join(sql_statements))
-                
-            print(f"✅ Successfully exported {len(sql_statements)} SQL INSERT statements to '{os.path.abspath(self.filename)}' (Mode: '{file_mode}')")
-
-        except IOError as e:
-            print(f"\n❌ Error writing to file {self.filename}: {e}")
\ No newline at end of file
+        """Write bookings: Booking records, dicts, or tuples in BOOKING_FIELDS order."""
+        count = self.write_rows(BOOKINGS_TABLE, BOOKING_FIELDS, map(_booking_values, bookings))
+        print(f"✅ Exported {count} Bookings to '{os.path.abspath(self.filename)}' ({self.style})")
+        return count
+
+
+def _booking_values(booking):
+    if isinstance(booking, dict):
+        return tuple(booking[field] for field in BOOKING_FIELDS)
+    if isinstance(booking, (tuple, list)):
+        return booking
+    return booking.row()
+
+
+def _read_csv_rows(filename):
+    with open(filename, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        yield from reader
+
+
+def export_csvs_to_sql(rooms_csv, bookings_csv, sql_file, style=DEFAULT_SQL_STYLE, batch_size=DEFAULT_BATCH_SIZE,
+                      free_intervals=True):
+    """
+    Convert the scraper's rooms and bookings CSVs into one SQL load file, streaming both.
+
+    With free_intervals, the file also refreshes Free_Intervals for every
+    day the bookings cover (see free_intervals.py).
+    """
+    with SQLFileHandler(sql_file, style, batch_size) as sql:
+        sql.export_rooms_to_sql(_read_csv_rows(rooms_csv))
+        sql.export_bookings_to_sql(_read_csv_rows(bookings_csv))
+        if free_intervals:
+            # Imported here: free_intervals builds on this module
+            from free_intervals import busy_by_day, write_snapshot_sql
+            # One more streaming pass: only the per-room, per-day busy intervals are kept
+            write_snapshot_sql(sql, _read_csv_rows(rooms_csv), busy_by_day(_read_csv_rows(bookings_csv)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert scraper CSVs into a SQL file for Supabase/PostgreSQL')
+    parser.add_argument('--rooms-csv', type=str, default='rooms.csv')
+    parser.add_argument('--bookings-csv', type=str, default='bookings.csv')
+    parser.add_argument('--out', type=str, default='data.sql', help='Output SQL file (default: data.sql)')
+    parser.add_argument('--style', choices=SQL_STYLES, default=DEFAULT_SQL_STYLE,
+                        help=f'insert: one row per statement; batch: multi-row INSERTs; '
+                             f'copy: COPY FROM stdin for psql (default: {DEFAULT_SQL_STYLE})')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'Rows per INSERT in batch style (default: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--no-free-intervals', action='store_true',
+                        help='Do not refresh the precomputed Free_Intervals table')
+    args = parser.parse_args()
+
+    export_csvs_to_sql(args.rooms_csv, args.bookings_csv, args.out, args.style, args.batch_size,
+                       not args.no_free_intervals)
@@ -1,4 +1,7 @@
 -- DROPING TABLES
+DROP TABLE IF EXISTS Free_Interval_Days CASCADE;
+DROP TABLE IF EXISTS Free_Intervals CASCADE;
+DROP TABLE IF EXISTS Recurring_Bookings CASCADE;
 DROP TABLE IF EXISTS Bookings CASCADE;
 DROP TABLE IF EXISTS Rooms CASCADE;
 
@@ -21,7 +24,47 @@ CREATE TABLE Bookings (
     end_time    TIMESTAMP,
     course_code VARCHAR(100),
     instructor VARCHAR(100),
-    booking_type VARCHAR(20) -- e.g., LEC, MAINT
+    booking_type VARCHAR(20), -- e.g., LEC, MAINT
+    -- [start_time, end_time] as a range, for GiST overlap lookups; closed so
+    -- zero-length bookings still overlap, and the exact start/end test runs after
+    period TSRANGE GENERATED ALWAYS AS (
+        tsrange(LEAST(start_time, end_time), GREATEST(start_time, end_time), '[]')
+    ) STORED
+);
+
+-- Table for Recurring Bookings (optional compact alternative to Bookings,
+-- loaded from recurrence.py output; expand with expand_recurring_bookings)
+CREATE TABLE Recurring_Bookings (
+    rule_id SERIAL PRIMARY KEY,
+    room_number VARCHAR(50),
+    building VARCHAR(50),
+    FOREIGN KEY (room_number,building) REFERENCES Rooms,
+    weekday SMALLINT,      -- 0 = Monday
+    start_time TIME,
+    end_time TIME,
+    first_date DATE,
+    last_date DATE,        -- inclusive, same weekday as first_date
+    course_code VARCHAR(100),
+    instructor VARCHAR(100),
+    booking_type VARCHAR(20),
+    exceptions DATE[] DEFAULT '{}' -- weeks in [first_date, last_date] without the booking
+);
+
+-- Table for Free Intervals (precomputed by free_intervals.py and loaded
+-- with the bookings: every stretch of each day a room has no booking)
+CREATE TABLE Free_Intervals (
+    room_number VARCHAR(50),
+    building VARCHAR(50),
+    FOREIGN KEY (room_number,building) REFERENCES Rooms ON DELETE CASCADE,
+    day DATE,
+    free_start TIMESTAMP,
+    free_end TIMESTAMP      -- next booking that day, or midnight
+);
+
+-- Days whose Free_Intervals rows are complete for every room
+CREATE TABLE Free_Interval_Days (
+    day DATE PRIMARY KEY,
+    refreshed_at TIMESTAMP DEFAULT now()
 );
 
 
@@ -35,18 +78,46 @@ create policy "Allow public read access" on Bookings
 for select
 using (true);
 
+alter table Recurring_Bookings enable row level security;
+create policy "Allow public read access" on Recurring_Bookings
+for select
+using (true);
+
+alter table Free_Intervals enable row level security;
+create policy "Allow public read access" on Free_Intervals
+for select
+using (true);
+
+alter table Free_Interval_Days enable row level security;
+create policy "Allow public read access" on Free_Interval_Days
+for select
+using (true);
+
 --------------------------------------------------------------------
 -- INDICIES FOR QUERY OPTIMIZATION
 --------------------------------------------------------------------
 
--- 1. For the Anti-Join (Overlap Check)
-CREATE INDEX IF NOT EXISTS idx_bookings_overlap 
-ON public.bookings (building, room_number, start_time, end_time);
+-- 1. For the Anti-Join (Overlap Check): all bookings overlapping a window
+-- in one index scan, instead of one probe per room
+CREATE INDEX IF NOT EXISTS idx_bookings_period
+ON public.bookings USING gist (period);
+
+-- 2. For the Next Booking Lookup: bookings later on the same day
+CREATE INDEX IF NOT EXISTS idx_bookings_start_time
+ON public.bookings (start_time);
 
--- 2. For the Lateral Join (Next Booking Lookup)
+-- 3. Per-room lookups and the Rooms foreign key
 CREATE INDEX IF NOT EXISTS idx_bookings_next_time 
 ON public.bookings (building, room_number, start_time);
 
+-- 4. For expanding recurring bookings over a date window
+CREATE INDEX IF NOT EXISTS idx_recurring_bookings_room_dates
+ON public.recurring_bookings (building, room_number, first_date, last_date);
+
+-- 5. For the *_daily functions: one day's intervals starting before the window
+CREATE INDEX IF NOT EXISTS idx_free_intervals_day_start
+ON public.free_intervals (day, free_start) INCLUDE (free_end, building, room_number);
+
 -- Optional but recommended for the main table lookup
 CREATE INDEX IF NOT EXISTS idx_rooms_pk ON public.rooms (building, room_number);
 
@@ -57,7 +128,15 @@ CREATE INDEX IF NOT EXISTS idx_rooms_pk ON public.rooms (building, room_number);
 -- Drop old functions if they exist
 DROP FUNCTION IF EXISTS public.free_rooms_per_building(timestamp, timestamp) CASCADE;
 DROP FUNCTION IF EXISTS public.free_rooms_list(timestamp, timestamp) CASCADE;
+DROP FUNCTION IF EXISTS public.free_rooms_per_building_daily(timestamp, timestamp) CASCADE;
+DROP FUNCTION IF EXISTS public.free_rooms_list_daily(timestamp, timestamp) CASCADE;
 DROP FUNCTION IF EXISTS public.get_table_last_modified() CASCADE;
+DROP FUNCTION IF EXISTS public.expand_recurring_bookings(timestamp, timestamp) CASCADE;
+
+-- Both functions find the busy rooms once, with a single GiST scan of the
+-- bookings overlapping [p_start, p_end), and anti-join Rooms against them.
+-- The range is widened to '[]' so empty or reversed windows still match
+-- every row the exact start/end test below accepts.
 
 -- Function: Gets free rooms per building
 CREATE OR REPLACE FUNCTION public.free_rooms_per_building(
@@ -70,20 +149,21 @@ SECURITY DEFINER
 AS $function$
 BEGIN
   RETURN QUERY
-  SELECT 
-    r.building::text,
-    COUNT(*)::bigint AS free_room_count
-  FROM Rooms r
-  WHERE NOT EXISTS (
-    SELECT 1
+  WITH busy AS (
+    SELECT DISTINCT b.building, b.room_number
     FROM Bookings b
-    WHERE b.room_number = r.room_number
-      AND b.building = r.building
+    WHERE b.period && tsrange(LEAST(p_start, p_end), GREATEST(p_start, p_end), '[]')
       AND b.start_time < p_end
       AND b.end_time > p_start
   )
+  SELECT 
+    r.building::text,
+    COUNT(*)::bigint AS free_room_count
+  FROM Rooms r
+  LEFT JOIN busy ON busy.building = r.building AND busy.room_number = r.room_number
+  WHERE busy.room_number IS NULL
   GROUP BY r.building
-  ORDER BY free_room_count DESC, building ASC;
+  ORDER BY free_room_count DESC, r.building ASC;
 END;
 $function$;
 
@@ -104,45 +184,124 @@ SECURITY DEFINER
 AS $$
 BEGIN
   RETURN QUERY
-  WITH free_count AS (
-    SELECT 
+  WITH busy AS (
+    SELECT DISTINCT b.building, b.room_number
+    FROM Bookings b
+    WHERE b.period && tsrange(LEAST(p_start, p_end), GREATEST(p_start, p_end), '[]')
+      AND b.start_time < p_end
+      AND b.end_time > p_start
+  ),
+  free AS (
+    SELECT
+      r.room_number,
       r.building,
-      COUNT(*) AS free_room_count
+      r.capacity,
+      r.features,
+      COUNT(*) OVER (PARTITION BY r.building) AS free_room_count
     FROM Rooms r
-    WHERE NOT EXISTS (
-      SELECT 1
-      FROM Bookings b
-      WHERE b.room_number = r.room_number
-        AND b.building = r.building
-        AND b.start_time < p_end
-        AND b.end_time > p_start
-    )
-    GROUP BY r.building
+    LEFT JOIN busy ON busy.building = r.building AND busy.room_number = r.room_number
+    WHERE busy.room_number IS NULL
+  ),
+  next_booking AS (
+    -- only same day bookings, found with one range scan for all rooms
+    SELECT b.building, b.room_number, MIN(b.start_time) AS first_start
+    FROM Bookings b
+    WHERE b.start_time >= p_end
+      AND b.start_time >= p_start::date
+      AND b.start_time < p_start::date + 1
+    GROUP BY b.building, b.room_number
   )
   SELECT
-    r.room_number::text,  -- Added ::text cast for safety
+    f.room_number::text,  -- Added ::text cast for safety
+    f.building::text,
+    f.capacity,
+    f.features::text,
+    nb.first_start
+  FROM free f
+  LEFT JOIN next_booking nb ON nb.building = f.building AND nb.room_number = f.room_number
+  ORDER BY f.free_room_count DESC, f.building ASC, nb.first_start ASC NULLS FIRST, f.room_number ASC;
+END;
+$$;
+
+-- The *_daily functions return exactly what the two functions above return,
+-- but read Free_Intervals: a room is free iff one of its intervals that day
+-- contains the window, and the interval's end is its next booking. Windows
+-- crossing midnight, and days not in Free_Interval_Days, use the functions
+-- above instead.
+
+-- Function: Gets free rooms per building from the precomputed intervals
+CREATE OR REPLACE FUNCTION public.free_rooms_per_building_daily(
+  p_start timestamp,
+  p_end timestamp
+)
+RETURNS TABLE(building text, free_room_count bigint)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $function$
+BEGIN
+  IF p_start >= p_end OR p_end > p_start::date + 1
+     OR NOT EXISTS (SELECT 1 FROM Free_Interval_Days d WHERE d.day = p_start::date) THEN
+    RETURN QUERY SELECT * FROM public.free_rooms_per_building(p_start, p_end);
+    RETURN;
+  END IF;
+
+  RETURN QUERY
+  SELECT
+    f.building::text,
+    COUNT(*)::bigint AS free_room_count
+  FROM Free_Intervals f
+  WHERE f.day = p_start::date
+    AND f.free_start <= p_start
+    AND f.free_end >= p_end
+  GROUP BY f.building
+  ORDER BY free_room_count DESC, f.building ASC;
+END;
+$function$;
+
+-- Function: Gets the free rooms given a time, from the precomputed intervals
+CREATE OR REPLACE FUNCTION public.free_rooms_list_daily(
+  p_start timestamp,
+  p_end timestamp
+)
+RETURNS TABLE(
+  room_number text,
+  building text,
+  capacity int,
+  features text,
+  earliest_booking timestamp
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  IF p_start >= p_end OR p_end > p_start::date + 1
+     OR NOT EXISTS (SELECT 1 FROM Free_Interval_Days d WHERE d.day = p_start::date) THEN
+    RETURN QUERY SELECT * FROM public.free_rooms_list(p_start, p_end);
+    RETURN;
+  END IF;
+
+  RETURN QUERY
+  WITH free AS (
+    SELECT
+      f.room_number,
+      f.building,
+      -- an interval ending at midnight has no later booking that day
+      CASE WHEN f.free_end < p_start::date + 1 THEN f.free_end END AS next_start,
+      COUNT(*) OVER (PARTITION BY f.building) AS free_room_count
+    FROM Free_Intervals f
+    WHERE f.day = p_start::date
+      AND f.free_start <= p_start
+      AND f.free_end >= p_end
+  )
+  SELECT
+    r.room_number::text,
     r.building::text,
     r.capacity,
     r.features::text,
-    (
-      SELECT MIN(b.start_time)
-      FROM Bookings b
-      WHERE b.room_number = r.room_number
-        AND b.building = r.building
-        AND b.start_time >= p_end
-        AND DATE(b.start_time) = DATE(p_start)  -- only same day bookings
-    ) AS earliest_booking
-  FROM Rooms r
-  JOIN free_count fc ON r.building = fc.building
-  WHERE NOT EXISTS (
-    SELECT 1
-    FROM Bookings b
-    WHERE b.room_number = r.room_number
-      AND b.building = r.building
-      AND b.start_time < p_end
-      AND b.end_time > p_start
-  )
-  ORDER BY fc.free_room_count DESC, r.building ASC, earliest_booking ASC NULLS FIRST, r.room_number ASC;
+    free.next_start
+  FROM free
+  JOIN Rooms r ON r.building = free.building AND r.room_number = free.room_number
+  ORDER BY free.free_room_count DESC, r.building ASC, free.next_start ASC NULLS FIRST, r.room_number ASC;
 END;
 $$;
 
@@ -157,3 +316,44 @@ AS $function$
   WHERE schemaname = 'public' 
   AND relname = 'bookings';
 $function$;
+
+-- Function: Regenerates concrete bookings from Recurring_Bookings for a window
+-- (same columns as Bookings; rows overlapping [p_start, p_end) are returned)
+CREATE OR REPLACE FUNCTION public.expand_recurring_bookings(
+  p_start timestamp,
+  p_end timestamp
+)
+RETURNS TABLE(
+  room_number text,
+  building text,
+  start_time timestamp,
+  end_time timestamp,
+  course_code text,
+  instructor text,
+  booking_type text
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $function$
+  SELECT
+    rb.room_number::text,
+    rb.building::text,
+    d.day::date + rb.start_time,
+    d.day::date + rb.end_time,
+    rb.course_code::text,
+    rb.instructor::text,
+    rb.booking_type::text
+  FROM Recurring_Bookings rb
+  CROSS JOIN LATERAL generate_series(
+    -- first occurrence on or after the window's first day, keeping the weekly phase
+    (rb.first_date + 7 * GREATEST(0, CEIL((p_start::date - 1 - rb.first_date) / 7.0))::int)::timestamp,
+    LEAST(rb.last_date, p_end::date)::timestamp,
+    interval '7 days'
+  ) AS d(day)
+  WHERE rb.first_date <= p_end::date
+    AND rb.last_date >= p_start::date - 1
+    AND NOT (d.day::date = ANY(rb.exceptions))
+    AND d.day::date + rb.start_time < p_end
+    AND d.day::date + rb.end_time > p_start;
+$function$;
@@ -0,0 +1,231 @@
+# ==========================================
+# Synthetic SWS timetable pages
+# Generates week pages laid out like the live "showtimetable.aspx" popup,
+# at any scale, so Phase 2 and the exporters can be measured offline
+# ==========================================
+#
+# Each room sits in its own <div> (an enclosing table would itself contain
+# "Location Timetable:" and be parsed as one more room): a nested
+# "Location Timetable:" header table (room, exported week, capacity, and
+# the features span in the 4th row's nested table) followed by a rowspan
+# grid with a weekday header row and one row per half hour from 7:00 to
+# 21:30. Booking cells are a mix of the forms seen in real pages: text
+# matching parse_common.DETAILS_PATTERN, the <br>-separated form the live
+# site mostly returns, MAINT blocks and free-form events.
+#
+# Every room keeps a base weekly schedule and each week only perturbs a
+# few cells, so the parse cache, delta export and recurrence compaction
+# see realistic repetition. Output is deterministic for a given seed.
+#
+# Pages are written with week_cache.write_week_cache, so they load like a
+# real html_cache (and replay_server.py can serve them).
+#
+# Usage:
+#   python synthetic_timetable.py --cache-dir /tmp/synthetic --rooms 400 --weeks 15
+#   python replay_server.py --cache-dir /tmp/synthetic --port 8765
+#   python optimized_scraper.py --downloader http --url http://127.0.0.1:8765/ --cache-dir /tmp/replayed
+
+import os
+import html
+import random
+import argparse
+from datetime import date, timedelta
+
+from html_store import CODECS, check_codec
+from week_cache import write_week_cache
+from parse_common import WEEKDAYS, SLOT_MINUTES
+
+FIRST_WEEK_INDEX = 17  # first lbWeeks index the WEEK LIMITERS select
+FIRST_MONDAY = date(2025, 9, 1)
+DEFAULT_FILL = 0.35  # share of weekday slots that are booked
+WEEK_CHURN = 0.05  # share of a room's bookings that change from week to week
+
+DAY_START_MINUTES = 7 * 60
+SLOTS_PER_DAY = 30  # 7:00 - 22:00
+
+BUILDINGS = (
+    'ALRD', 'ANGU', 'ANSO', 'BIOL', 'BUCH', 'CEME', 'CHBE', 'CHEM', 'CIRS', 'DMP', 'ESB', 'FNH', 'FSC',
+    'GEOG', 'HEBB', 'HENN', 'IBLC', 'IRSC', 'LASR', 'LSK', 'MATH', 'MCLD', 'MCML', 'ORCH', 'PHRM',
+    'SCRF', 'SOWK', 'SPPH', 'SWNG', 'WESB', 'WOOD',
+)
+SUBJECTS = (
+    'CPSC', 'MATH', 'PHYS', 'CHEM', 'BIOL', 'ECON', 'ENGL', 'HIST', 'PSYC', 'STAT', 'COMM', 'APSC',
+    'EOSC', 'GEOG', 'LAW_V', 'MECH', 'ELEC', 'CIVL', 'PHIL', 'SOCI',
+)
+SECTION_TYPES = ('LEC', 'LEC', 'LEC', 'TUT', 'LAB', 'SEM', 'DIS')
+INSTRUCTORS = (
+    'Smith, John', 'Nguyen, Linh', 'Patel, Priya', 'Chen, Wei', 'Garcia, Maria', 'Kim, Soo-Jin',
+    'Brown, Emily', 'Singh, Arjun', 'Aloni, Erez', 'Hilland, Andrea', '',
+)
+EQUIPMENT = (
+    'Projector/Large Screen', 'Document Camera', 'Room PC', 'Whiteboard', 'Chalkboard',
+    'Lecture Capture', 'Assistive Listening', 'Wireless Microphone', 'Tables - Any', 'Tiered Seating',
+)
+
+
+def synthetic_rooms(n_rooms, seed=0):
+    """(building, room_number, capacity, features span text) for n_rooms distinct rooms."""
+    rng = random.Random(seed)
+    rooms = []
+    seen = set()
+    while len(rooms) < n_rooms:
+        building = rng.choice(BUILDINGS)
+        room_number = f"{rng.choice(('', '', '', 'A', 'B'))}{rng.randint(1, 4) * 100 + rng.randint(0, 60)}"
+        if (building, room_number) in seen:
+            continue
+        seen.add((building, room_number))
+        capacity = rng.choice((12, 20, 24, 30, 40, 48, 60, 80, 100, 150, 200, 300, 450))
+        departments = rng.sample(SUBJECTS, rng.randint(0, 3)) + [building]
+        features = (['Type: General Teaching Space'] + rng.sample(EQUIPMENT, rng.randint(1, 5))
+                    + [f'Dept: {department}' for department in departments])
+        rooms.append((building, room_number, capacity, ', '.join(features)))
+    return rooms
+
+
+def _cell_text(rng, weeks):
+    """Contents of one booking cell (HTML) in one of the forms real pages use."""
+    subject = rng.choice(SUBJECTS)
+    section_type = rng.choice(SECTION_TYPES)
+    course = f"{subject} {rng.randint(100, 599)}-W/{section_type}/{rng.randint(1, 120):03d}"
+    instructor = rng.choice(INSTRUCTORS)
+    form = rng.random()
+    if form < 0.45:
+        # Single text node with line breaks: matches DETAILS_PATTERN
+        return html.escape(f"{course}\n{instructor}\n{section_type}\n{weeks}")
+    if form < 0.85:
+        # Live-site form: separate elements, joined without newlines by get_text(strip=True)
+        return (f"<span>{html.escape(course)}</span><br/><span>{html.escape(instructor)}</span><br/>"
+                f"<span>{section_type}</span><br/><span>{weeks}</span>")
+    if form < 0.93:
+        return f"MAINT - {rng.choice(('Facilities', 'AV upgrade', 'Cleaning'))}"
+    return html.escape(rng.choice(('Private event', 'Exam hold', 'Department meeting', 'Orientation')))
+
+
+def base_schedule(rng, n_days, fill):
+    """A room's weekly bookings: {(day, slot): (rowspan, cell html)}, non-overlapping."""
+    schedule = {}
+    for day in range(n_days):
+        slot = 0
+        while slot < SLOTS_PER_DAY:
+            if rng.random() < fill / 2:
+                rowspan = min(rng.choice((1, 2, 2, 3, 3, 4, 6)), SLOTS_PER_DAY - slot)
+                schedule[(day, slot)] = (rowspan, _cell_text(rng, rng.choice(('1-13', '3-16', '1-6', '8-13'))))
+                slot += rowspan
+            else:
+                slot += 1
+    return schedule
+
+
+def perturb(rng, schedule, churn, n_days):
+    """Copy of schedule with about churn of its bookings dropped and as many added."""
+    week = {key: value for key, value in schedule.items() if rng.random() >= churn}
+    taken = set()
+    for (day, slot), (rowspan, _) in week.items():
+        taken.update((day, s) for s in range(slot, slot + rowspan))
+    for _ in range(len(schedule) - len(week)):
+        day, slot = rng.randrange(n_days), rng.randrange(SLOTS_PER_DAY - 1)
+        if (day, slot) not in taken and (day, slot + 1) not in taken:
+            week[(day, slot)] = (2, _cell_text(rng, '1-1'))
+            taken.update(((day, slot), (day, slot + 1)))
+    return week
+
+
+def _slot_label(slot):
+    minutes = DAY_START_MINUTES + slot * SLOT_MINUTES
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
+def room_html(room, sws_week, monday, week_schedule, n_days):
+    """Header table and rowspan grid for one room in one week."""
+    building, room_number, capacity, features = room
+    parts = [
+        "<table class=\"header-border-args\"><tbody>",
+        f"<tr><td><span class=\"header-0-0-0\">Location Timetable: {building} {room_number}</span></td></tr>",
+        f"<tr><td><span class=\"header-1-0-0\">Exported Weeks:{sws_week}, {monday.strftime('%m/%d/%y')}</span></td></tr>",
+        f"<tr><td><span class=\"header-2-0-0\">Capacity: {capacity}</span></td></tr>",
+        "<tr><td><table><tbody><tr>"
+        f"<td><span class=\"header-3-0-0\">{html.escape(features)}</span></td><td>&nbsp;</td>"
+        "</tr></tbody></table></td></tr>",
+        "</tbody></table>",
+        "<table class=\"grid-border-args\"><tbody>",
+        "<tr><td></td>" + "".join(f"<td class=\"col-label-one\">{day}</td>" for day in WEEKDAYS[:n_days]) + "</tr>",
+    ]
+    covered = [0] * n_days
+    for slot in range(SLOTS_PER_DAY):
+        cells = [f"<td class=\"row-label-one\">{_slot_label(slot)}</td>"]
+        for day in range(n_days):
+            if covered[day]:
+                covered[day] -= 1
+                continue
+            booking = week_schedule.get((day, slot))
+            if booking is None:
+                cells.append("<td class=\"cell-border\"></td>")
+            else:
+                rowspan, text = booking
+                cells.append(f"<td class=\"object-cell-border\" rowspan=\"{rowspan}\">{text}</td>")
+                covered[day] = rowspan - 1
+        parts.append("<tr>" + "".join(cells) + "</tr>")
+    parts.append("</tbody></table>")
+    return "\n".join(parts)
+
+
+def week_html(rooms, schedules, sws_week, monday, n_days):
+    """
+    A full timetable page: one <div> per room.
+
+    Not a layout table: a table enclosing the rooms would contain
+    "Location Timetable:" itself and be parsed as one more room.
+    """
+    body = "\n".join(
+        f"<div>\n{room_html(room, sws_week, monday, schedule, n_days)}\n</div>"
+        for room, schedule in zip(rooms, schedules)
+    )
+    return ("<html><head><title>Timetable</title>\n<style>td { font-size: 8pt; }</style></head>\n"
+            f"<body>\n{body}\n</body></html>")
+
+
+def generate_cache(cache_dir, n_rooms, n_weeks, fill=DEFAULT_FILL, seed=0, codec='none',
+                   first_week=FIRST_WEEK_INDEX, first_monday=FIRST_MONDAY, n_days=5):
+    """
+    Write n_weeks synthetic week pages of n_rooms rooms to cache_dir.
+
+    Returns the (html, json) file pairs in week order, like Phase 1 does.
+    """
+    check_codec(codec)
+    os.makedirs(cache_dir, exist_ok=True)
+    rng = random.Random(seed)
+    rooms = synthetic_rooms(n_rooms, seed)
+    schedules = [base_schedule(rng, n_days, fill) for _ in rooms]
+
+    # dlObject values for replay_server.py
+    with open(os.path.join(cache_dir, 'rooms.txt'), 'w', encoding='utf-8') as f:
+        f.writelines(f"{building} {room_number}\n" for building, room_number, _, _ in rooms)
+
+    files = []
+    for week in range(n_weeks):
+        monday = first_monday + timedelta(weeks=week)
+        week_schedules = [perturb(rng, schedule, WEEK_CHURN, n_days) for schedule in schedules]
+        page = week_html(rooms, week_schedules, week + 1, monday, n_days)
+        files.append(write_week_cache(cache_dir, first_week + week, f"w/c {monday.strftime('%d %b %Y')}", page,
+                                      codec=codec))
+    return files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate synthetic SWS week pages into an html_cache directory')
+    parser.add_argument('--cache-dir', type=str, required=True)
+    parser.add_argument('--rooms', type=int, default=400, help='Rooms per page (default: 400)')
+    parser.add_argument('--weeks', type=int, default=15, help='Week pages to write (default: 15)')
+    parser.add_argument('--fill', type=float, default=DEFAULT_FILL,
+                        help=f'Share of slots booked (default: {DEFAULT_FILL})')
+    parser.add_argument('--days', type=int, default=5, choices=range(1, 8), help='Weekday columns (default: 5)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--codec', choices=CODECS, default='none',
+                        help='Cache codec, as --cache-codec in optimized_scraper.py (default: none)')
+    args = parser.parse_args()
+
+    files = generate_cache(args.cache_dir, args.rooms, args.weeks, args.fill, args.seed, args.codec,
+                           n_days=args.days)
+    size = sum(os.path.getsize(f[0]) for f in files if os.path.exists(f[0]))
+    print(f"Wrote {len(files)} weeks of {args.rooms} rooms to {args.cache_dir}"
+          + (f" ({size / 1e6:.1f} MB of HTML)" if size else ""))
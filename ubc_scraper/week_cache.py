@@ -0,0 +1,359 @@
+# ==========================================
+# Week HTML cache helpers
+# Shared by every Phase 1 backend so they all write the
+# same week_NNN.html / week_NNN.json cache pairs
+# ==========================================
+#
+# With a compression codec the page itself lives in the content-addressed
+# store (html_store.py) and week_NNN.json points at it; week_NNN.html is
+# only written for the 'none' codec. Readers go through open_week_html()
+# and do not need to know which form a week is in.
+
+import os
+import io
+import re
+import json
+import hashlib
+import threading
+from datetime import datetime, date, timedelta
+
+import html_store
+from html_store import DEFAULT_CODEC
+
+
+def is_week_option(week_text):
+    """Return True if a lbWeeks option is an actual week (not a term/range entry)."""
+    return "w/c" in week_text.lower()
+
+
+def is_week_selected(i, debug):
+    """Apply the WEEK LIMITERS to a lbWeeks option index."""
+    # WEEK LIMITERS
+    # Change these indices to adjust what weeks are scraped
+    if debug and (i != 18):
+        return False
+    if not debug and i < 17:
+        return False
+    return True
+
+
+# ==========================================
+# WEEK SELECTION AND REFRESH POLICY
+# ==========================================
+
+REFRESH_POLICIES = ('cached', 'changing', 'all')
+DEFAULT_REFRESH_POLICY = 'cached'
+
+# lbWeeks option texts look like "w/c 01 Sep 2025"; accept a few variants
+WEEK_DATE_PATTERN = re.compile(r'w/c\s*(.+)$', re.IGNORECASE)
+WEEK_DATE_FORMATS = ('%d %b %Y', '%d %B %Y', '%d/%m/%Y', '%d/%m/%y', '%Y-%m-%d', '%d-%b-%Y')
+
+MANIFEST_FILE = 'manifest.json'
+CACHE_METADATA_PATTERN = re.compile(r'^week_\d{3}(_s\d{3})?\.json$')
+_manifest_lock = threading.Lock()
+
+
+def week_start_date(week_text):
+    """Return the date in a 'w/c ...' option text, or None if it cannot be read."""
+    match = WEEK_DATE_PATTERN.search(week_text.strip())
+    if not match:
+        return None
+    for fmt in WEEK_DATE_FORMATS:
+        try:
+            return datetime.strptime(match.group(1).strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_week_spec(spec):
+    """Parse an index spec like '17-30,35,40-' into a list of (low, high) ranges."""
+    ranges = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            low, high = part.split('-', 1)
+            ranges.append((int(low) if low else 0, int(high) if high else None))
+        else:
+            ranges.append((int(part), int(part)))
+    return ranges
+
+
+class WeekPlan:
+    """
+    Which lbWeeks options to scrape, and which cached ones to download again.
+
+    Weeks are selected by index spec (--weeks) and/or date range
+    (--from-date/--to-date); with neither, the WEEK LIMITERS in
+    is_week_selected apply. Refresh policies:
+      cached    reuse any cached week (never re-download)
+      changing  past weeks are immutable; current and future weeks are
+                re-downloaded once their copy is older than ttl_hours
+      all       re-download every selected week
+    """
+
+    def __init__(self, debug=False, weeks=None, from_date=None, to_date=None,
+                 refresh=DEFAULT_REFRESH_POLICY, ttl_hours=0, today=None):
+        self.debug = debug
+        self.week_ranges = parse_week_spec(weeks) if weeks else None
+        self.from_date = from_date
+        self.to_date = to_date
+        self.refresh = refresh
+        self.ttl = timedelta(hours=ttl_hours)
+        self.today = today or date.today()
+
+    def selects(self, i, week_text):
+        """Return True if the week at lbWeeks index i should be scraped."""
+        if self.week_ranges is None and self.from_date is None and self.to_date is None:
+            return is_week_selected(i, self.debug)
+
+        if self.week_ranges is not None:
+            if not any(low <= i and (high is None or i <= high) for low, high in self.week_ranges):
+                return False
+
+        if self.from_date is not None or self.to_date is not None:
+            start = week_start_date(week_text)
+            if start is None:
+                print(f"[{i}] WARNING: cannot read a date from '{week_text}', skipping")
+                return False
+            # A week matches if any of its days falls inside the range
+            if self.from_date is not None and start + timedelta(days=6) < self.from_date:
+                return False
+            if self.to_date is not None and start > self.to_date:
+                return False
+
+        return True
+
+    def needs_download(self, cache_filename, metadata_filename, week_text):
+        """Return (download?, reason) for one week or week shard."""
+        if not is_cached(cache_filename, metadata_filename):
+            return True, "not cached"
+        if self.refresh == 'cached':
+            return False, "cached"
+        if self.refresh == 'all':
+            return True, "refresh all"
+
+        start = week_start_date(week_text)
+        if start is not None and start + timedelta(days=7) <= self.today:
+            return False, "past week"
+
+        downloaded = datetime.fromisoformat(load_metadata(metadata_filename)['download_time'])
+        if datetime.now() - downloaded < self.ttl:
+            return False, "fresh"
+        return True, "current/future week"
+
+
+def update_manifest(cache_dir, key, week_text, fingerprint, download_time):
+    """
+    Record a week's content fingerprint in manifest.json.
+
+    Returns True if the content changed since the previous download (or the
+    week is new), so refreshes can report which weeks actually moved.
+    """
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    with _manifest_lock:
+        manifest = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+
+        previous = manifest.get(key)
+        changed = previous is None or previous['fingerprint'] != fingerprint
+        manifest[key] = {
+            'week_text': week_text,
+            'fingerprint': fingerprint,
+            'downloaded': download_time,
+            'changed': download_time if changed else previous['changed'],
+            'downloads': (previous['downloads'] + 1) if previous else 1,
+        }
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+    return changed
+
+
+def room_shards(n_rooms, shard_size):
+    """
+    Split the dlObject options into contiguous room shards.
+
+    Returns [(shard, start, stop), ...] index ranges, or [None] when sharding
+    is off (shard_size of 0/None, or not smaller than the room list).
+    """
+    if not shard_size or shard_size >= n_rooms:
+        return [None]
+    return [
+        (shard, start, min(start + shard_size, n_rooms))
+        for shard, start in enumerate(range(0, n_rooms, shard_size))
+    ]
+
+
+def week_label(i, shard):
+    """Log label for a week or week shard, e.g. '18' or '18/s002'."""
+    return f"{i}" if shard is None else f"{i}/s{shard[0]:03d}"
+
+
+def cache_paths(cache_dir, i, shard=None):
+    """Return the (html, json) cache file pair for week index i (and room shard)."""
+    stem = f"week_{i:03d}" if shard is None else f"week_{i:03d}_s{shard[0]:03d}"
+    cache_filename = os.path.join(cache_dir, f"{stem}.html")
+    metadata_filename = os.path.join(cache_dir, f"{stem}.json")
+    return cache_filename, metadata_filename
+
+
+def discard_stale_shards(cache_dir, i, shards):
+    """
+    Delete week i's cache files that do not belong to the current room shards.
+
+    Left behind by a run with a different --room-shard-size (or room list):
+    the other form of the week, shard numbers past the current count, and
+    shards whose saved room_range differs from the current one. Called
+    before a week's shards are checked, so they are downloaded again.
+    """
+    current = {os.path.basename(cache_paths(cache_dir, i, shard)[1]): shard for shard in shards}
+    prefix = f"week_{i:03d}"
+    for name in os.listdir(cache_dir) if os.path.isdir(cache_dir) else ():
+        if not (name.startswith(prefix) and CACHE_METADATA_PATTERN.match(name)):
+            continue
+        metadata_filename = os.path.join(cache_dir, name)
+        if name in current:
+            shard = current[name]
+            if shard is None or load_metadata(metadata_filename).get('room_range') == [shard[1], shard[2]]:
+                continue
+        print(f"[{i}] Discarding {name[:-len('.json')]} from a different room sharding")
+        for filename in (metadata_filename, metadata_filename[:-len('.json')] + '.html'):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+
+def write_week_cache(cache_dir, i, week_text, html, shard=None, codec=DEFAULT_CODEC, download_seconds=None):
+    """
+    Save a downloaded week page and its metadata, returning the file pair.
+
+    The metadata also records the page size and, when given, how long the
+    download took, for the run report (see run_metrics.py).
+    """
+    cache_filename, metadata_filename = cache_paths(cache_dir, i, shard)
+    data = html.encode('utf-8')
+
+    metadata = {
+        'week_index': i,
+        'week_text': week_text,
+        'download_time': datetime.now().isoformat(),
+        'html_bytes': len(data)
+    }
+    if download_seconds is not None:
+        metadata['download_seconds'] = round(download_seconds, 3)
+    if shard is not None:
+        metadata['room_shard'] = shard[0]
+        metadata['room_range'] = [shard[1], shard[2]]
+
+    if codec == 'none':
+        # Save HTML to cache
+        with open(cache_filename, 'w', encoding='utf-8') as f:
+            f.write(html)
+        fingerprint = html_store.content_digest(data)
+    else:
+        # Save HTML to the compressed store (deduplicated by content)
+        metadata['blob'] = html_store.put_blob(cache_dir, data, codec)
+        metadata['codec'] = codec
+        html_store.record_history(cache_dir, metadata)
+        if os.path.exists(cache_filename):
+            os.remove(cache_filename)  # stale uncompressed copy
+        fingerprint = metadata['blob']
+
+    changed = update_manifest(
+        cache_dir, os.path.basename(metadata_filename)[:-len('.json')], week_text,
+        fingerprint, metadata['download_time']
+    )
+    if not changed:
+        print(f"[{week_label(i, shard)}] Unchanged since last download")
+
+    # Save metadata
+    with open(metadata_filename, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2)
+
+    return cache_filename, metadata_filename
+
+
+def cached_weeks(cache_dir, plan=None):
+    """
+    Return the (html, json) pairs of the cached weeks plan selects, in week order.
+
+    Weeks are selected from their saved index and week_text, so Phase 2 and
+    3 can run on an existing cache without the live site. If a week was
+    cached both whole and in room shards, the form downloaded last is used,
+    and a shard overlapping the rooms of a newer shard is dropped.
+    """
+    if plan is None:
+        plan = WeekPlan()
+    weeks = {}
+    for name in sorted(os.listdir(cache_dir)) if os.path.isdir(cache_dir) else ():
+        if not CACHE_METADATA_PATTERN.match(name):
+            continue
+        metadata_filename = os.path.join(cache_dir, name)
+        cache_filename = metadata_filename[:-len('.json')] + '.html'
+        metadata = load_metadata(metadata_filename)
+        if not plan.selects(metadata['week_index'], metadata['week_text']):
+            continue
+        if not is_cached(cache_filename, metadata_filename):
+            continue
+        form = weeks.setdefault(metadata['week_index'], {}).setdefault(metadata.get('room_shard') is not None, [])
+        form.append((metadata.get('room_shard', -1), metadata['download_time'],
+                     (cache_filename, metadata_filename), metadata.get('room_range')))
+
+    files = []
+    for i in sorted(weeks):
+        latest = max(weeks[i].values(), key=lambda entries: max(entry[1] for entry in entries))
+        kept, ranges = [], []
+        for entry in sorted(latest, key=lambda entry: entry[1], reverse=True):
+            room_range = entry[3]
+            if room_range and any(room_range[0] < stop and start < room_range[1] for start, stop in ranges):
+                continue  # left over from a run with a different --room-shard-size
+            if room_range:
+                ranges.append(room_range)
+            kept.append(entry[:3])
+        files.extend(entry[2] for entry in sorted(kept))
+    return files
+
+
+def load_metadata(metadata_filename):
+    with open(metadata_filename, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def is_cached(cache_filename, metadata_filename):
+    """Return True if a week's page is available, in either cache form."""
+    if os.path.exists(metadata_filename):
+        metadata = load_metadata(metadata_filename)
+        if metadata.get('blob'):
+            cache_dir = os.path.dirname(metadata_filename)
+            return os.path.exists(html_store.blob_path(cache_dir, metadata['blob'], metadata['codec']))
+    return os.path.exists(cache_filename)
+
+
+def open_week_html(cache_filename, metadata):
+    """Open a week's page as a binary stream, decompressing as it is read."""
+    if metadata.get('blob'):
+        return html_store.open_blob(os.path.dirname(cache_filename), metadata['blob'], metadata['codec'])
+    return open(cache_filename, 'rb')
+
+
+def read_week_html(cache_filename, metadata):
+    """Read a week's page as text (universal newlines, like the original text-mode read)."""
+    with open_week_html(cache_filename, metadata) as f:
+        return io.TextIOWrapper(f, encoding='utf-8').read()
+
+
+def html_digest(cache_filename, metadata):
+    """SHA-256 of a week's page; free for stored pages, hashed for raw files."""
+    if metadata.get('blob'):
+        return metadata['blob']
+    digest = hashlib.sha256()
+    with open(cache_filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()